@@ -7,7 +7,14 @@ from textual.widgets import RichLog
 from time import sleep
 from threading import Thread
 
-from system import console, fs, boot
+from system import console
+from system.tracing import span, traced
+from system.util.lazy_import import lazy_import
+
+# The rest of the system is imported once the boot log is showing, so the first thing on screen appears sooner
+fs = lazy_import("system.fs")
+boot = lazy_import("system.boot")
+session = lazy_import("system.session")
 
 
 class SwiftOS(App):
@@ -32,6 +39,10 @@ class SwiftOS(App):
             
         self.__halted = True
         
+    def exit(self, *args, **kwargs) -> None:
+        session.save_all() # Save the windows while they're still open
+        super().exit(*args, **kwargs)
+        
     def action_toggle_dark(self) -> None:
         self.dark = not self.dark
         
@@ -42,6 +53,7 @@ class SwiftOS(App):
             
             self.safe_mode = True
 
+    @traced("Start")
     def on_ready(self) -> None:
         """
         Begin the boot process.
@@ -54,16 +66,18 @@ class SwiftOS(App):
         boot_log: RichLog = self.query_one("#boot_log")
         print = boot_log.write
 
-        logo = console.ascii_logo_rainbow()
-        
-        print(console.center_text(logo))
-        print(console.center_text("[bold]Swift[/bold]\n"))
+        with span("Show logo"):
+            logo = console.ascii_logo_rainbow()
+            
+            print(console.center_text(logo))
+            print(console.center_text("[bold]Swift[/bold]\n"))
         
         console.rule_line(boot_log, "bold blue")
         
         console.log(boot_log, "Searching for [bold]boot.ini[/bold]..")
         
-        boot_ini_path = fs.find_file("boot.ini", "system")
+        with span("Find boot.ini"):
+            boot_ini_path = fs.find_file("boot.ini", "system")
         
         if boot_ini_path == None: # We didn't find boot.ini :(
             console.log(boot_log, "[bold gold1]boot.ini[/bold gold1] was not found!", console.LogLevel.FATAL)
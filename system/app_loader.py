@@ -0,0 +1,143 @@
+import os
+import sys
+import threading
+
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_file_location, module_from_spec
+from types import ModuleType
+
+
+# Loaded app modules, keyed by their absolute path.
+# Each entry is a tuple of (source mtime, module).
+_loaded_apps: dict[str, tuple[int, ModuleType]] = {}
+
+# Apps can be preloaded from worker threads, so only one thread loads an app at a time.
+_load_lock = threading.RLock()
+
+
+def get_app_name(app_path: str) -> str:
+    """Get the module name of an app from its file path.
+
+    Args:
+        app_path (str): The path to the app's `.py` file.
+
+    Returns:
+        str: The name of the app, e.g. `system/apps/Notepad.py` -> `Notepad`.
+    """
+
+    return os.path.splitext(os.path.basename(app_path))[0]
+
+def load_app(app_path: str) -> ModuleType:
+    """Load an app module, reusing the already loaded module if its source hasn't changed.
+
+    The module is compiled through `SourceFileLoader`, so its bytecode is cached in
+    `__pycache__` and only recompiled when the source file is edited.
+
+    Args:
+        app_path (str): The path to the app's `.py` file.
+
+    Raises:
+        FileNotFoundError: Raised if the app doesn't exist.
+
+    Returns:
+        ModuleType: The loaded app module.
+    """
+
+    path = os.path.abspath(app_path)
+    mtime = os.stat(path).st_mtime_ns # Raises FileNotFoundError for us
+
+    cached = _loaded_apps.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _load_lock:
+        cached = _loaded_apps.get(path)
+        if cached and cached[0] == mtime: # Another thread loaded it while we were waiting
+            return cached[1]
+
+        return _exec_app(path, mtime)
+
+def _exec_app(path: str, mtime: int) -> ModuleType:
+    name = get_app_name(path)
+    loader = SourceFileLoader(name, path)
+    spec = spec_from_file_location(name, path, loader=loader)
+
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+
+    try:
+        loader.exec_module(module)
+    except BaseException:
+        sys.modules.pop(name, None)
+        raise
+
+    _loaded_apps[path] = (mtime, module)
+    return module
+
+def is_app_loaded(app_path: str) -> bool:
+    """Check if an app is loaded and up to date with its source file.
+
+    Args:
+        app_path (str): The path to the app's `.py` file.
+
+    Returns:
+        bool: Whether the app can be run without being loaded again.
+    """
+
+    path = os.path.abspath(app_path)
+    cached = _loaded_apps.get(path)
+
+    if not cached:
+        return False
+
+    try:
+        return cached[0] == os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def find_app_path(module_name: str) -> str | None:
+    """Find which app a module was loaded from, e.g. to work out which app made a window.
+
+    Args:
+        module_name (str): The name of the module, e.g. `type(window).__module__`.
+
+    Returns:
+        str | None: The absolute path to the app's `.py` file, or `None` if the module isn't a loaded app.
+    """
+
+    for path, (_, module) in list(_loaded_apps.items()):
+        if module.__name__ == module_name:
+            return path
+    return None
+
+def unload_app(app_path: str):
+    """Forget a loaded app, so it's loaded from scratch next time it's run.
+
+    Args:
+        app_path (str): The path to the app's `.py` file.
+    """
+
+    cached = _loaded_apps.pop(os.path.abspath(app_path), None)
+
+    if cached and sys.modules.get(cached[1].__name__) is cached[1]:
+        del sys.modules[cached[1].__name__]
+
+def preload_apps(app_paths: list[str]) -> list[str]:
+    """Load a list of apps ahead of time, so they open instantly when they're first run.
+
+    Args:
+        app_paths (list[str]): The paths to the apps' `.py` files.
+
+    Returns:
+        list[str]: The apps that failed to load.
+    """
+
+    failed = []
+
+    for app_path in app_paths:
+        try:
+            load_app(app_path)
+        except Exception:
+            failed.append(app_path)
+
+    return failed
@@ -0,0 +1,118 @@
+import os
+
+from system.gui.desktop_screen import Desktop
+from system.gui.custom_widgets import window
+from system.disk_usage import get_disk_usage, format_size, DirUsage
+
+from textual.widgets import DataTable, Static, Footer
+from textual.binding import Binding
+
+from textual import work
+
+
+class DiskUsageWindow(window.Window):
+    DEFAULT_CSS = """
+    DiskUsageWindow #usage-summary {
+        margin-left: 1;
+        height: 1;
+    }
+
+    DiskUsageWindow DataTable {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        Binding("ctrl+r", "rescan", "Rescan"),
+        Binding("enter", "open_dir", "Open folder"),
+        Binding("backspace", "parent_dir", "Up")
+    ]
+
+    def show_usage(self, children: list[DirUsage], status: str):
+        table = self.query_one(DataTable)
+        table.clear()
+
+        total = sum(child.size for child in children) or 1
+
+        for child in children:
+            name = "(files)" if child.path == self.root else child.name
+            table.add_row(name, format_size(child.size), f"{child.size / total * 100:.1f}%", child.files, key=child.path)
+
+        self.query_one("#usage-summary", Static).update(f"[bold]{self.root}[/bold] {status}")
+
+    @work(group="disk-usage", exclusive=True)
+    async def scan(self, full_rescan: bool = False):
+        usage_service = get_disk_usage()
+
+        # Show the last scan straight away, then replace it as the new scan finds things
+        cached = usage_service.get_cached(self.root)
+        if cached is not None:
+            self.show_usage(cached.children, f"{format_size(cached.size)} (scanning..)")
+
+        def on_progress(partial: list[DirUsage]):
+            self.show_usage(partial, f"{format_size(sum(child.size for child in partial))} so far (scanning..)")
+
+        try:
+            usage = await usage_service.scan_async(self.root, on_progress, full_rescan)
+        except OSError as e:
+            self.query_one("#usage-summary", Static).update(f"[red]Couldn't scan {self.root}: {e}[/red]")
+            return
+
+        if usage is None:
+            return
+
+        children = list(usage.children)
+        own_size = usage.size - sum(child.size for child in children)
+        if own_size:
+            children.append(DirUsage(self.root, own_size, usage.files - sum(child.files for child in children)))
+        children.sort(key=lambda child: child.size, reverse=True)
+
+        self.show_usage(children, f"{format_size(usage.size)} in {usage.files} files")
+
+    def action_rescan(self):
+        self.scan(full_rescan=True) # Asked for, so measure every file again rather than trusting directories that haven't changed
+
+    def action_open_dir(self):
+        table = self.query_one(DataTable)
+
+        if table.row_count == 0:
+            return
+
+        path = table.coordinate_to_cell_key(table.cursor_coordinate).row_key.value
+
+        if path != self.root:
+            self.root = path
+            self.scan()
+
+    def action_parent_dir(self):
+        parent = os.path.dirname(self.root)
+
+        if parent != self.root:
+            self.root = parent
+            self.scan()
+
+    def on_mount(self):
+        self.scan()
+
+    def on_ready(self):
+        self.root = os.path.abspath(self.ARGS[0])
+
+        table = DataTable(cursor_type="row")
+        table.add_columns("Name", "Size", "Share", "Files")
+
+        yield Static("", id="usage-summary")
+        yield table
+        yield Footer()
+
+
+async def execute(desktop: Desktop, args: list[str]):
+    windows = desktop.query_one("#windows")
+    window_bar = desktop.query_one("#window-bar")
+
+    root = args[0] if len(args) > 0 else f"home/{desktop.logged_in_user}"
+
+    usage_window = DiskUsageWindow(title=f"Disk Usage | {os.path.basename(os.path.abspath(root))}", size=[60, 18])
+    usage_window.ARGS = [root]
+
+    await desktop.add_to_window_bar(usage_window, window_bar)
+    windows.mount(usage_window)
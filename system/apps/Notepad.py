@@ -2,7 +2,8 @@ import os
 
 from system.gui.desktop_screen import Desktop
 from system.gui.custom_widgets import window, dialog
-from system.fs import get_file_extension
+from system.fs import take_prefetched, decode_text, read_text, write_atomic
+from system.file_types import get_language
 
 from rich.syntax import Syntax
 
@@ -41,9 +42,7 @@ class NotepadWindow(window.Window):
         window_bar = self.screen.query_one("#window-bar")
         text_area = self.query_one(TextArea)
         
-        f = open(file_path, "r")
-        text_area.load_text(f.read())
-        f.close()
+        text_area.load_text(await read_text(file_path))
         
         self.open_file = file_path
         
@@ -60,9 +59,7 @@ class NotepadWindow(window.Window):
             return
         
         try:
-            f = open(self.open_file, "w")
-            f.write(text_area.text)
-            f.close()
+            await write_atomic(self.open_file, text_area.text)
         except Exception as e:
             await dialog.create_dialog(
                 str(e),
@@ -75,10 +72,9 @@ class NotepadWindow(window.Window):
         text_area = self.query_one(TextArea)
         chosen_file = None
         
-        def save_dialog(answer: str):
+        async def save_dialog(answer: str):
             if answer == "Yes" and chosen_file:
-                with open(str(chosen_file), "w") as f:
-                    f.write(text_area.text)
+                await write_atomic(str(chosen_file), text_area.text)
         
         async def on_save(file):
             nonlocal chosen_file
@@ -88,8 +84,7 @@ class NotepadWindow(window.Window):
                 if os.path.isfile(chosen_file): # If the user chose an existing file
                     await create_dialog("This file already exists! Do you want to overwrite it?", self.screen, "Save as", buttons=DialogButtons.YES_NO, icon=DialogIcon.QUESTION, callback=save_dialog)
                 else:
-                    with open(str(chosen_file), "w") as f:
-                        f.write(text_area.text)
+                    await write_atomic(str(chosen_file), text_area.text)
                 
         
         file_save_dialog = FileSave()
@@ -104,8 +99,7 @@ class NotepadWindow(window.Window):
                 return
             
             if answer == "Yes": # Save the changes
-                with open(self.open_file, "w") as f:
-                    f.write(text_area.text)
+                await write_atomic(self.open_file, text_area.text)
 
             await self.read_file(chosen_file)
         
@@ -128,8 +122,7 @@ class NotepadWindow(window.Window):
         
         async def unsaved_changes_dialog(answer: str):
             if answer == "Yes": # Save the changes
-                with open(self.open_file, "w") as f:
-                    f.write(text_area.text)
+                await write_atomic(self.open_file, text_area.text)
                     
             text_area.text = ""
             self.unsaved_changes = True
@@ -174,28 +167,7 @@ class NotepadWindow(window.Window):
         #self.set_title(str(os.path.basename(event.path)))"""
     
     def file_path_to_lang(self, file_path: str):
-        ext = get_file_extension(file_path)
-        
-        extensions = {
-            "py": "python",
-            "md": "markdown",
-            "json": "json",
-            "css": "css",
-            "tcss": "css",
-            "html": "html",
-            "htm": "html",
-            "js": "javascript",
-            "java": "java",
-            "sh": "bash",
-            "go": "go"
-        }
-        
-        try:
-            ext = extensions[ext]
-        except KeyError:
-            ext = None
-            
-        return ext
+        return get_language(file_path)
     
     
     
@@ -211,9 +183,14 @@ class NotepadWindow(window.Window):
             if os.path.isfile(self.ARGS[0]):
                 self.open_file = self.ARGS[0]
                 
-                f = open(self.open_file)
-                TEXT = f.read()
-                f.close()
+                prefetched = take_prefetched(self.open_file)
+                
+                if prefetched is not None: # The file was read while we were being opened
+                    TEXT = decode_text(prefetched)
+                else:
+                    f = open(self.open_file, "r", encoding="utf-8")
+                    TEXT = f.read()
+                    f.close()
         
                 ext = self.file_path_to_lang(self.ARGS[0])
         
@@ -0,0 +1,161 @@
+import hmac
+import hashlib
+import secrets
+
+from system import users
+from system.jobs import run_blocking, JobPriority
+
+
+PBKDF2 = "pbkdf2_sha256"
+SCRYPT = "scrypt"
+
+DEFAULT_ALGORITHM = PBKDF2
+DEFAULT_ITERATIONS = 600_000 # PBKDF2 rounds
+DEFAULT_SCRYPT_N = 2 ** 14   # scrypt CPU/memory cost
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_SIZE = 16
+
+
+class KDFSettings:
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM, iterations: int = DEFAULT_ITERATIONS, scrypt_n: int = DEFAULT_SCRYPT_N) -> None:
+        """How passwords are hashed. A higher cost makes passwords harder to crack, and logging in slower.
+
+        Args:
+            algorithm (str, optional): `PBKDF2` or `SCRYPT`. Defaults to DEFAULT_ALGORITHM.
+            iterations (int, optional): How many rounds of PBKDF2 are used. Defaults to DEFAULT_ITERATIONS.
+            scrypt_n (int, optional): The cost of scrypt, a power of 2. Defaults to DEFAULT_SCRYPT_N.
+        """
+
+        if algorithm not in (PBKDF2, SCRYPT):
+            raise ValueError(f"\"{algorithm}\" is not a supported password hashing algorithm.")
+
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.scrypt_n = scrypt_n
+
+    @classmethod
+    def from_config(cls, section) -> "KDFSettings":
+        """Create KDF settings from a section of a config file, like `[auth]` in `boot.ini`.
+
+        Args:
+            section (SectionProxy): The config section.
+
+        Returns:
+            KDFSettings: The settings.
+        """
+
+        return cls(
+            algorithm=section.get("algorithm", DEFAULT_ALGORITHM).strip(),
+            iterations=section.getint("iterations", DEFAULT_ITERATIONS),
+            scrypt_n=section.getint("scrypt_n", DEFAULT_SCRYPT_N)
+        )
+
+
+_settings = KDFSettings()
+
+
+def set_kdf_settings(settings: KDFSettings):
+    """Set how new password hashes are made. This is done by the boot process."""
+    global _settings
+    _settings = settings
+
+def get_kdf_settings() -> KDFSettings:
+    return _settings
+
+def hash_password(password: str, settings: KDFSettings | None = None) -> str:
+    """Hash a password. This is slow on purpose, so run it off the event loop (see `hash_password_async`).
+
+    Args:
+        password (str): The password.
+        settings (KDFSettings | None, optional): How to hash it. Defaults to the system's settings.
+
+    Returns:
+        str: The hash, which includes the algorithm, cost and salt, e.g. `pbkdf2_sha256$600000$<salt>$<hash>`.
+    """
+
+    settings = settings if settings is not None else _settings
+    salt = secrets.token_bytes(SALT_SIZE)
+
+    if settings.algorithm == SCRYPT:
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=settings.scrypt_n, r=SCRYPT_R, p=SCRYPT_P, maxmem=256 * settings.scrypt_n * SCRYPT_R)
+        return f"{SCRYPT}${settings.scrypt_n}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, settings.iterations)
+    return f"{PBKDF2}${settings.iterations}${salt.hex()}${digest.hex()}"
+
+def is_legacy_hash(password_hash: str) -> bool:
+    """Check if a hash is an old unsalted `sha256` hash."""
+    return "$" not in password_hash
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Check a password against a hash. Old `sha256` hashes are supported. This is slow on purpose, so run it off the event loop.
+
+    Args:
+        password (str): The password.
+        password_hash (str): The hash it's checked against.
+
+    Returns:
+        bool: Whether the password is correct.
+    """
+
+    if is_legacy_hash(password_hash):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), password_hash)
+
+    parts = password_hash.split("$")
+
+    try:
+        if parts[0] == PBKDF2:
+            _, iterations, salt, expected = parts
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+        elif parts[0] == SCRYPT:
+            _, n, r, p, salt, expected = parts
+            n, r, p = int(n), int(r), int(p)
+            digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p, maxmem=256 * n * r)
+        else:
+            return False
+    except ValueError: # The hash is formatted incorrectly
+        return False
+
+    return hmac.compare_digest(digest.hex(), expected)
+
+def needs_rehash(password_hash: str, settings: KDFSettings | None = None) -> bool:
+    """Check if a hash was made with an old algorithm or a different cost to the current settings."""
+    settings = settings if settings is not None else _settings
+
+    if is_legacy_hash(password_hash):
+        return True
+
+    parts = password_hash.split("$")
+
+    if settings.algorithm == PBKDF2:
+        return parts[0] != PBKDF2 or parts[1] != str(settings.iterations)
+    return parts[0] != SCRYPT or parts[1] != str(settings.scrypt_n)
+
+async def hash_password_async(password: str) -> str:
+    """The same as `hash_password`, but runs in a worker thread so the desktop keeps rendering."""
+    return await run_blocking(hash_password, password, _settings, priority=JobPriority.HIGH, name="hash-password")
+
+async def authenticate(username: str, password: str) -> bool:
+    """Check a user's password in a worker thread.
+
+    If the password is correct and the user's hash is out of date (an old `sha256` hash, or a
+    different cost to the current settings) it's replaced with a new hash.
+
+    Args:
+        username (str): The user.
+        password (str): The password they entered.
+
+    Returns:
+        bool: Whether the password is correct.
+    """
+
+    password_hash = (await users.get_user_details_async(username))["password_hash"]
+
+    if not await run_blocking(verify_password, password, password_hash, priority=JobPriority.HIGH, name="verify-password"):
+        return False
+
+    if needs_rehash(password_hash):
+        await users.change_user_async(username, password=password)
+
+    return True
@@ -1,29 +1,34 @@
 import os
-import sys
-import time
 
 from textual import work
 from textual.app import ComposeResult
-from textual.widgets import Static, Footer
-from textual_fspicker import FileOpen
 
 from configparser import ConfigParser
 
 from system.gui import loading_screen
-from system.gui import login_screen
-from system.gui import setup_screen
-from system.gui.custom_widgets.window import Window
 from system.gui.desktop_screen import Desktop
 from system.users import get_valid_users, get_user_details
-from system import fs
-from system.proc_manager import ProcessManager, Process
+from system.app_loader import preload_apps
+from system.jobs import JobExecutor, set_executor, run_blocking, Lane, JobPriority
+from system.proc_manager import ResourceLimits
+from system import recycle_bin, search_index, users, auth
+from system.preload import ProfilePreload
+from system.user_sessions import SessionManager
+from system.user_db import UserDatabase
+from system.tracing import span, traced, get_tracer
+from system.util.lazy_import import lazy_import
 from main import SwiftOS
 
+# Only needed the first time SwiftOS is started, or when someone logs in
+setup_screen = lazy_import("system.gui.setup_screen")
+login_screen = lazy_import("system.gui.login_screen")
+
 
 def on_ready(desktop: Desktop) -> ComposeResult:
     pass
 
 @work
+@traced("Boot")
 async def boot(app : SwiftOS, ini_path: str):
     """
     Boot SwiftOS.
@@ -34,18 +39,57 @@ async def boot(app : SwiftOS, ini_path: str):
     app.log("Booting SwiftOS..\n")
     app.log("Showing loading screen..")
     
-    loading = loading_screen.LoadingScreen()
-    app.push_screen(loading)
+    with span("Show loading screen"):
+        loading = loading_screen.LoadingScreen()
+        app.push_screen(loading)
     
     app.log("Parsing config..")
-    parser = ConfigParser()
-    parser.read(ini_path)
+    with span("Parse config"):
+        parser = ConfigParser()
+        parser.read(ini_path)
+    
+    app.log("Starting job executor..")
+    with span("Start job executor"):
+        job_executor = JobExecutor.from_config(parser["jobs"]) if parser.has_section("jobs") else JobExecutor()
+        job_executor.start()
+        set_executor(job_executor)
+    
+    quota = parser.get("recycle_bin", "quota", fallback="").strip()
+    recycle_bin.set_default_quota(int(quota) * 1024 * 1024 if quota else None)
+    
+    preload = [line.strip() for line in parser.get("apps", "preload", fallback="").splitlines() if line.strip()]
+    if preload:
+        app.log(f"Preloading apps: {preload}")
+        
+        with span("Preload apps", apps=preload):
+            failed_apps = preload_apps(preload)
+        
+        for failed_app in failed_apps:
+            app.log(f"Failed to preload app: {failed_app}")
     
     if not os.path.isdir("home"):
         app.log("`home` folder does not exist! Creating..")
         os.mkdir("home")
         
-    if len(get_valid_users()) == 0:
+    if parser.has_section("auth"):
+        auth.set_kdf_settings(auth.KDFSettings.from_config(parser["auth"]))
+    
+    user_db_path = parser.get("users", "database", fallback="").strip()
+    if user_db_path:
+        app.log(f"Using user database: {user_db_path}")
+        with span("Open user database"):
+            users.set_user_database(UserDatabase(user_db_path))
+    
+    roots = [line.strip() for line in parser.get("search", "index", fallback="").splitlines() if line.strip()]
+    if roots:
+        app.log(f"Starting search indexer: {roots}")
+        with span("Start search indexer"):
+            search_index.start_indexer(roots)
+    
+    with span("Find users"):
+        valid_users = get_valid_users()
+        
+    if len(valid_users) == 0:
         app.log("No users found! Showing setup screen..")
 
         setup = setup_screen.SetupScreen()
@@ -70,21 +114,33 @@ async def boot(app : SwiftOS, ini_path: str):
     app.log(f"Login completed! Logged in user: \"{logged_in_user}\"")"""
     logged_in_user = "Nathaniel"
     
-    user_details = get_user_details(logged_in_user)
+    with span("Read user details"):
+        user_details = get_user_details(logged_in_user)
+    
+    # The background, desktop icons and the apps the user opens files with are all loaded at once, while the loading screen is showing
+    app.log("Preloading profile..")
+    profile = ProfilePreload(logged_in_user, user_details)
+    profile.start()
+    
     if user_details["theme"] == "light":
         app.dark = False
     else:
         app.dark = True
     
-    app.log("Loading desktop..")
-    desktop = Desktop(logged_in_user)
-    desktop.on_ready = on_ready
+    app.log("Starting session manager..")
+    limits = ResourceLimits.from_config(parser["limits"]) if parser.has_section("limits") else None
+    low_memory = parser.get("sessions", "low_memory", fallback="").strip()
     
-    app.log("Starting process manager..")
-    process_manager = ProcessManager(desktop)
+    # Each logged in user has their own desktop and process manager, which stay in memory while other users use the computer
+    session_manager = SessionManager(app, limits, int(low_memory) * 1024 * 1024 if low_memory else None, on_ready)
+    
+    app.log("Loading desktop..")
+    with span("Wait for profile preload"):
+        await session_manager.open(logged_in_user, profile)
     
     app.pop_screen()
-    await app.push_screen(desktop)
+    with span("Show desktop"):
+        await session_manager.switch_to(logged_in_user)
 
     app.log("Cleaning up..")
     
@@ -95,4 +151,23 @@ async def boot(app : SwiftOS, ini_path: str):
     #del login_form
     #del login
     del loading
-    
\ No newline at end of file
+    
+    save_trace(app, parser)
+
+def save_trace(app: SwiftOS, parser: ConfigParser):
+    """Stop tracing the boot, then write the trace and its summary table to the folder in the `[trace]` section of `boot.ini`."""
+    trace_dir = parser.get("trace", "dir", fallback="").strip()
+    keep = parser.get("trace", "keep", fallback="").strip()
+    
+    # This runs in its own worker, after `boot` has returned, so the boot's own span is in the trace
+    async def save():
+        tracer = get_tracer()
+        tracer.stop()
+        
+        app.log(f"Boot trace summary:\n{tracer.format_summary()}")
+        
+        if trace_dir:
+            trace_path = await run_blocking(tracer.save, trace_dir, int(keep) if keep else None, lane=Lane.IO, priority=JobPriority.LOW, name="Save boot trace")
+            app.log(f"Boot trace saved: {trace_path}")
+    
+    app.run_worker(save(), group="boot-trace")
@@ -0,0 +1,143 @@
+import os
+import threading
+
+from system import users, file_types
+from system.app_loader import load_app
+from system.jobs import run_blocking, JobPriority
+
+
+class ProgramCache:
+    def __init__(self, username: str) -> None:
+        """The apps a user opens each kind of file with.
+
+        It's built once per session from the user's settings, so opening a file doesn't read
+        `user.json` or look for the app on the disk. It's thrown away whenever the user's details change.
+
+        Args:
+            username (str): The user.
+        """
+
+        self.username = username
+
+        self.__programs: dict[str, str] | None = None
+        self.__lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__programs is not None
+
+    def load(self, user_details: dict | None = None):
+        """Build the cache from the user's settings.
+
+        Args:
+            user_details (dict | None, optional): The user's details, if they have already been read.
+        """
+
+        if user_details is None:
+            user_details = users.get_user_details(self.username)
+
+        with self.__lock:
+            self.__programs = dict(user_details.get("defaultPrograms", {}))
+
+    async def load_async(self):
+        """The same as `load`, but reads the user's details without blocking the event loop."""
+        self.load(await users.get_user_details_async(self.username))
+
+    def invalidate(self):
+        with self.__lock:
+            self.__programs = None
+
+    def get_program(self, file_path: str, file_type: file_types.FileType | None = None) -> str | None:
+        """Get the app the user has chosen to open a file with. The cache has to be loaded first.
+
+        Args:
+            file_path (str): The path to the file.
+            file_type (FileType | None, optional): The type of the file, if it's already known.
+
+        Returns:
+            str | None: The path to the app, or `None` if the user hasn't chosen one.
+        """
+
+        if file_type is None:
+            file_type = file_types.get_file_type(file_path)
+
+        if file_type is file_types.FOLDER:
+            key = file_types.FOLDER_KEY
+        else:
+            key = os.path.splitext(file_path)[1][1:]
+
+        with self.__lock:
+            return self.__programs.get(key)
+
+    def get_entry_point(self, app_path: str):
+        """Get the `execute` function of an app, loading the app the first time it's needed.
+        
+        The loaded app is kept by `load_app`, which loads it again if it has been edited since.
+
+        Args:
+            app_path (str): The path to the app's `.py` file.
+
+        Raises:
+            FileNotFoundError: Raised if the app doesn't exist.
+
+        Returns:
+            Callable: The app's `execute` function.
+        """
+
+        return load_app(app_path).execute
+
+    async def warm(self):
+        """Load every app the user opens files with in the background, so the first file of each kind opens instantly."""
+        if not self.is_loaded:
+            await self.load_async()
+
+        with self.__lock:
+            programs = set(self.__programs.values())
+
+        for program in programs:
+            try:
+                await run_blocking(self.get_entry_point, program, priority=JobPriority.LOW, name="warm-program")
+            except Exception: # A broken app is reported when it's opened
+                continue
+
+
+_caches: dict[str, ProgramCache] = {}
+
+
+def _on_user_changed(username: str):
+    cache = _caches.get(username)
+    if cache is not None:
+        cache.invalidate()
+
+def get_program_cache(username: str) -> ProgramCache:
+    """Get the program cache of a user's session.
+
+    Args:
+        username (str): The user.
+
+    Returns:
+        ProgramCache: The cache. It may not be loaded yet.
+    """
+
+    if not _caches:
+        # Registered here rather than on import, since `users` imports `fs` which imports this module
+        users.add_change_listener(_on_user_changed)
+
+    if username not in _caches:
+        _caches[username] = ProgramCache(username)
+    return _caches[username]
+
+def start_session(username: str, user_details: dict | None = None) -> ProgramCache:
+    """Build the program cache for a user who just logged in. This is done by the boot process.
+
+    Args:
+        username (str): The user.
+        user_details (dict | None, optional): The user's details, if they have already been read.
+
+    Returns:
+        ProgramCache: The cache.
+    """
+
+    cache = get_program_cache(username)
+    cache.load(user_details)
+    return cache
@@ -0,0 +1,283 @@
+import os
+import asyncio
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from system.jobs import run_blocking, JobPriority
+from system.util.paths import normalize, inside
+
+
+DISK_USAGE_PATH = "system/cache/disk_usage.db"
+SCAN_WORKERS = 8 # How many directories are scanned at once
+
+
+def _scan_dir(dir: str, known: tuple | None):
+    """Work out the size of the files directly inside a directory, reusing what was known about it if its mtime hasn't changed.
+
+    Returns:
+        tuple: The directory, its mtime, the size and number of the files inside it and the paths of the directories inside it.
+        If the directory no longer exists, the mtime is `None`.
+    """
+
+    try:
+        mtime = os.stat(dir).st_mtime_ns
+    except OSError:
+        return dir, None, 0, 0, []
+
+    # Nothing was added, removed or renamed in here. Files that were changed in place are caught by a full rescan, see `DiskUsage.scan`.
+    if known is not None and known[0] == mtime:
+        return (dir, *known)
+
+    size = 0
+    files = 0
+    subdirs = []
+
+    try:
+        with os.scandir(dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                        files += 1
+                except OSError:
+                    continue
+    except PermissionError:
+        pass
+
+    return dir, mtime, size, files, subdirs
+
+
+class DirUsage:
+    def __init__(self, path: str, size: int = 0, files: int = 0, children: list["DirUsage"] | None = None) -> None:
+        """How much space a directory takes up.
+
+        Args:
+            path (str): The path to the directory.
+            size (int, optional): How many bytes the directory and everything inside it takes up.
+            files (int, optional): How many files are inside the directory, including inside its subdirectories.
+            children (list[DirUsage] | None, optional): The directories inside it, biggest first.
+        """
+
+        self.path = path
+        self.size = size
+        self.files = files
+        self.children = children if children is not None else []
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    def __str__(self) -> str:
+        return f"(PATH={self.path}, SIZE={self.size}, FILES={self.files})"
+
+
+class DiskUsage:
+    def __init__(self, db_path: str = DISK_USAGE_PATH, full_rescan: bool = False) -> None:
+        """Works out how much space directories take up, remembering the results between scans.
+
+        Only directories whose mtime has changed are listed again, the rest are served from the database.
+
+        Args:
+            db_path (str, optional): Where the results are stored. Defaults to DISK_USAGE_PATH.
+            full_rescan (bool, optional): Ignore the stored results and list every directory in every scan. Defaults to False.
+        """
+
+        self.db_path = db_path
+        self.full_rescan = full_rescan
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.__lock = threading.RLock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        self.__db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime INTEGER NOT NULL,
+                size INTEGER NOT NULL,     -- The files directly inside the directory
+                files INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,     -- The paths of the directories directly inside it, separated by NUL
+                total_size INTEGER,        -- Everything inside the directory
+                total_files INTEGER
+            );
+        """)
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __get_known(self, root: str) -> dict[str, tuple]:
+        condition, params = inside("path", root)
+
+        with self.__lock:
+            rows = self.__db.execute(f"SELECT path, mtime, size, files, subdirs FROM dirs WHERE {condition}", params).fetchall()
+
+        return {path: (mtime, size, files, subdirs.split("\0") if subdirs else []) for path, mtime, size, files, subdirs in rows}
+
+    def scan(self, root: str, on_progress=None, cancelled: threading.Event | None = None, full_rescan: bool | None = None) -> DirUsage | None:
+        """Work out how much space a directory and everything inside it takes up.
+
+        Args:
+            root (str): The directory.
+            on_progress (Callable[[list[DirUsage]], Any] | None, optional): Called after each level of the tree is scanned with the sizes found so far of what's directly inside `root`, biggest first.
+            cancelled (threading.Event | None, optional): Stop early when this is set.
+            full_rescan (bool | None, optional): Ignore the stored results and list every directory, which catches files that grew or shrank
+                without their directory changing. Defaults to `self.full_rescan`.
+
+        Returns:
+            DirUsage | None: The size of the directory and the directories inside it, or `None` if the scan was cancelled.
+        """
+
+        root = normalize(root)
+
+        if full_rescan is None:
+            full_rescan = self.full_rescan
+        known = {} if full_rescan else self.__get_known(root)
+
+        scanned: dict[str, tuple] = {}          # Directory -> (mtime, size, files, subdirs)
+        parents: dict[str, str] = {}
+        top_level: dict[str, str] = {root: root} # Directory -> the directory directly inside `root` it's in
+        partial: dict[str, list[int]] = {}       # Directory directly inside `root` -> [size, files] found so far
+
+        pending = [root]
+
+        with ThreadPoolExecutor(SCAN_WORKERS) as pool:
+            while pending:
+                if cancelled is not None and cancelled.is_set():
+                    return None
+
+                next_pending = []
+
+                for dir, mtime, size, files, subdirs in pool.map(lambda dir: _scan_dir(dir, known.get(dir)), pending):
+                    if mtime is None: # It was deleted while we were scanning
+                        continue
+
+                    scanned[dir] = (mtime, size, files, subdirs)
+
+                    totals = partial.setdefault(top_level[dir], [0, 0])
+                    totals[0] += size
+                    totals[1] += files
+
+                    for subdir in subdirs:
+                        parents[subdir] = dir
+                        top_level[subdir] = subdir if dir == root else top_level[dir]
+                        next_pending.append(subdir)
+
+                pending = next_pending
+
+                if on_progress is not None:
+                    on_progress(sorted(
+                        (DirUsage(path, size, files) for path, (size, files) in partial.items()),
+                        key=lambda usage: usage.size, reverse=True
+                    ))
+
+        if root not in scanned:
+            raise FileNotFoundError(root)
+
+        # Add up the sizes from the bottom of the tree
+        usages = {dir: DirUsage(dir, size, files) for dir, (_, size, files, _) in scanned.items()}
+
+        for dir in reversed(list(scanned)): # Children are always after their parents
+            usage = usages[dir]
+            usage.children.sort(key=lambda child: child.size, reverse=True)
+
+            parent = parents.get(dir)
+            if parent is not None:
+                usages[parent].size += usage.size
+                usages[parent].files += usage.files
+                usages[parent].children.append(usage)
+
+        self.__store(root, scanned, usages)
+        return usages[root]
+
+    def __store(self, root: str, scanned: dict[str, tuple], usages: dict[str, DirUsage]):
+        condition, params = inside("path", root)
+
+        with self.__lock:
+            self.__db.execute(f"DELETE FROM dirs WHERE {condition}", params)
+            self.__db.executemany(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (dir, mtime, size, files, "\0".join(subdirs), usages[dir].size, usages[dir].files)
+                    for dir, (mtime, size, files, subdirs) in scanned.items()
+                )
+            )
+            self.__db.commit()
+
+    def get_cached(self, root: str) -> DirUsage | None:
+        """Get the size of a directory from the last scan, without touching the disk.
+
+        Args:
+            root (str): The directory.
+
+        Returns:
+            DirUsage | None: The size of the directory and the directories directly inside it, or `None` if it hasn't been scanned.
+        """
+
+        root = normalize(root)
+
+        with self.__lock:
+            row = self.__db.execute("SELECT subdirs, total_size, total_files FROM dirs WHERE path = ?", (root,)).fetchone()
+            if row is None or row[1] is None:
+                return None
+
+            subdirs, size, files = row
+            children = []
+
+            for subdir in subdirs.split("\0") if subdirs else []:
+                child = self.__db.execute("SELECT total_size, total_files FROM dirs WHERE path = ?", (subdir,)).fetchone()
+                if child is not None:
+                    children.append(DirUsage(subdir, child[0], child[1]))
+
+        children.sort(key=lambda child: child.size, reverse=True)
+        return DirUsage(root, size, files, children)
+
+    async def scan_async(self, root: str, on_progress=None, full_rescan: bool | None = None) -> DirUsage | None:
+        """The same as `scan`, but runs in the background. `on_progress` is called on the event loop.
+
+        Cancelling the task that is awaiting this stops the scan.
+        """
+
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+
+        def report(partial: list[DirUsage]):
+            if on_progress is not None:
+                loop.call_soon_threadsafe(on_progress, partial)
+
+        try:
+            return await run_blocking(self.scan, root, report, cancelled, full_rescan, priority=JobPriority.LOW, name="disk-usage")
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+
+_disk_usage: DiskUsage | None = None
+_disk_usage_lock = threading.Lock()
+
+
+def get_disk_usage() -> DiskUsage:
+    """Get the system's disk usage service, opening its database if it isn't open yet.
+
+    Returns:
+        DiskUsage: The disk usage service.
+    """
+
+    global _disk_usage
+
+    with _disk_usage_lock:
+        if _disk_usage is None:
+            _disk_usage = DiskUsage()
+        return _disk_usage
+
+def format_size(size: int) -> str:
+    """Format a number of bytes for people to read, e.g. `1536` -> `1.5 KB`."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
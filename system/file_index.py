@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from system.util.paths import normalize, dir_prefix, is_inside, inside, starts_with
+
+
+INDEX_PATH = "system/cache/file_index.db"
+INDEX_VERSION = 2 # Increased whenever what's stored changes, an index from an older version is rebuilt
+SCAN_WORKERS = 8  # How many directories are scanned at once
+
+
+def _scan_dir(dir: str):
+    """Scan a single directory.
+
+    Returns:
+        tuple: The directory, its mtime, the names of the files inside it and the paths of the directories inside it.
+        If the directory no longer exists, the mtime is `None`.
+    """
+
+    files = []
+    subdirs = []
+
+    try:
+        mtime = os.stat(dir).st_mtime_ns
+
+        with os.scandir(dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return dir, None, [], []
+    except PermissionError:
+        return dir, 0, [], []
+
+    return dir, mtime, files, subdirs
+
+
+class FileIndex:
+    def __init__(self, db_path: str = INDEX_PATH) -> None:
+        """A persistent index of file names, used to find files without walking the whole file system.
+
+        Args:
+            db_path (str, optional): Where the index is stored. Defaults to INDEX_PATH.
+        """
+
+        self.db_path = db_path
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.__lock = threading.RLock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        
+        (version,) = self.__db.execute("PRAGMA user_version").fetchone()
+        if version != INDEX_VERSION:
+            self.__db.executescript("DROP TABLE IF EXISTS roots; DROP TABLE IF EXISTS dirs; DROP TABLE IF EXISTS files;")
+            self.__db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        
+        self.__db.executescript("""
+            CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS dirs  (path TEXT PRIMARY KEY, mtime INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, name TEXT NOT NULL, dir TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS files_by_name ON files (name);
+            CREATE INDEX IF NOT EXISTS files_by_dir  ON files (dir);
+        """)
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def has_root(self, root: str) -> bool:
+        """Check if a directory is indexed.
+
+        Args:
+            root (str): The directory.
+
+        Returns:
+            bool: Whether the directory, or a directory it is inside of, is indexed.
+        """
+
+        root = normalize(root)
+
+        with self.__lock:
+            for (indexed,) in self.__db.execute("SELECT path FROM roots"):
+                if is_inside(root, indexed):
+                    return True
+        return False
+
+    def add_root(self, root: str):
+        """Index a directory and everything inside of it.
+
+        Args:
+            root (str): The directory to index.
+        """
+
+        root = normalize(root)
+
+        with self.__lock:
+            self.__db.execute("INSERT OR IGNORE INTO roots VALUES (?)", (root,))
+            self.__db.commit()
+
+        self.refresh(root)
+
+    def refresh(self, root: str | None = None):
+        """Bring the index up to date. Only directories whose mtime has changed are scanned again.
+
+        Args:
+            root (str | None, optional): Only refresh inside this directory. Defaults to every indexed directory.
+        """
+
+        with self.__lock:
+            if root is None:
+                roots = [path for (path,) in self.__db.execute("SELECT path FROM roots")]
+            else:
+                roots = [normalize(root)]
+
+            for root in roots:
+                self.__refresh_root(root)
+
+            self.__db.commit()
+
+    def __get_known_dirs(self, root: str) -> dict[str, int]:
+        condition, params = inside("path", root)
+        return dict(self.__db.execute(f"SELECT path, mtime FROM dirs WHERE {condition}", params))
+
+    def __refresh_root(self, root: str):
+        known = self.__get_known_dirs(root)
+
+        if root not in known:
+            known[root] = None
+
+        # Stat every directory we know about in parallel, and only rescan the ones that changed.
+        with ThreadPoolExecutor(SCAN_WORKERS) as pool:
+            mtimes = dict(zip(known, pool.map(self.__get_mtime, known)))
+
+            changed = [dir for dir, mtime in mtimes.items() if mtime != known[dir]]
+
+            for dir in changed:
+                if mtimes[dir] is None: # The directory was deleted
+                    self.__remove_dir(dir)
+
+            pending = [dir for dir in changed if mtimes[dir] is not None]
+
+            while pending:
+                new_dirs = []
+
+                for dir, mtime, files, subdirs in pool.map(_scan_dir, pending):
+                    if mtime is None:
+                        self.__remove_dir(dir)
+                        continue
+
+                    self.__store_dir(dir, mtime, files)
+
+                    for subdir in subdirs:
+                        subdir = normalize(subdir)
+
+                        if subdir not in known: # Directories we already know about are checked by their mtime
+                            known[subdir] = None
+                            new_dirs.append(subdir)
+
+                    # Forget about directories that are no longer inside this one
+                    current = {normalize(subdir) for subdir in subdirs}
+                    condition, params = starts_with("path", dir_prefix(dir))
+                    for (old,) in self.__db.execute(
+                        f"SELECT path FROM dirs WHERE {condition} AND instr(substr(path, ?), ?) = 0",
+                        params + [len(dir_prefix(dir)) + 1, os.sep]
+                    ).fetchall():
+                        if old not in current:
+                            self.__remove_dir(old)
+
+                pending = new_dirs
+
+    @staticmethod
+    def __get_mtime(dir: str) -> int | None:
+        try:
+            return os.stat(dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def __store_dir(self, dir: str, mtime: int, files: list[str]):
+        self.__db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (dir, mtime))
+        self.__db.execute("DELETE FROM files WHERE dir = ?", (dir,))
+        self.__db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+            ((normalize(os.path.join(dir, name)), name, dir) for name in files)
+        )
+
+    def __remove_dir(self, dir: str):
+        condition, params = inside("dir", dir)
+        self.__db.execute(f"DELETE FROM files WHERE {condition}", params)
+
+        condition, params = inside("path", dir)
+        self.__db.execute(f"DELETE FROM dirs WHERE {condition}", params)
+
+    def __query(self, condition: str, params: list, root: str | None) -> list[str]:
+        query = f"SELECT path FROM files WHERE {condition}"
+
+        if root is not None:
+            condition, root_params = inside("dir", normalize(root))
+            query += f" AND {condition}"
+            params = params + root_params
+
+        # Shallowest first, then alphabetically. `os.walk` goes depth first in whatever order the disk lists
+        # directories, so when a name is in several places this can find a different file than it did
+        query += " ORDER BY length(path) - length(replace(path, ?, '')), path"
+        params = params + [os.sep]
+
+        with self.__lock:
+            return [path for (path,) in self.__db.execute(query, params)]
+
+    def find(self, name: str, root: str | None = None) -> list[str]:
+        """Find files with an exact name.
+
+        Args:
+            name (str): The name of the file.
+            root (str | None, optional): Only find files inside this directory.
+
+        Returns:
+            list[str]: The absolute paths of the files, the shallowest first.
+        """
+
+        return self.__query("name = ?", [name], root)
+
+    def find_prefix(self, prefix: str, root: str | None = None) -> list[str]:
+        """Find files whose name starts with a prefix.
+
+        Args:
+            prefix (str): The start of the file name.
+            root (str | None, optional): Only find files inside this directory.
+
+        Returns:
+            list[str]: The paths of the files.
+        """
+
+        return self.__query(*starts_with("name", prefix), root)
+
+    def find_glob(self, pattern: str, root: str | None = None) -> list[str]:
+        """Find files whose name matches a glob pattern, e.g. `*.txt`.
+
+        Args:
+            pattern (str): The glob pattern. Supports `*`, `?` and `[...]`.
+            root (str | None, optional): Only find files inside this directory.
+
+        Returns:
+            list[str]: The paths of the files.
+        """
+
+        return self.__query("name GLOB ?", [pattern], root)
+
+
+_file_index: FileIndex | None = None
+_file_index_lock = threading.Lock()
+
+
+def get_file_index() -> FileIndex:
+    """Get the system's file index, opening it if it isn't open yet.
+
+    Returns:
+        FileIndex: The file index.
+    """
+
+    global _file_index
+
+    with _file_index_lock:
+        if _file_index is None:
+            _file_index = FileIndex()
+        return _file_index
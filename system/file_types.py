@@ -0,0 +1,188 @@
+import os
+
+from functools import lru_cache
+
+from system import stat_cache
+
+
+FOLDER_KEY = "/folder\\" # Used in place of an extension for folders, e.g. in a user's `defaultPrograms`
+
+ICONS_PATH = "system/assets/images/icons/file"
+SNIFF_SIZE = 512 # How many bytes are read from the start of a file to work out its type
+
+
+class FileType:
+    def __init__(self, name: str, extensions: tuple[str] = (), icon: str = "txt.png", language: str | None = None, default_program: str | None = None, signatures: tuple[bytes] = (), is_text: bool = False) -> None:
+        """A kind of file, and everything the system needs to know about it.
+
+        Args:
+            name (str): The name of the file type.
+            extensions (tuple[str], optional): The extensions of files of this type, without the dot.
+            icon (str, optional): The name of the image in `ICONS_PATH` shown for these files. Defaults to "txt.png".
+            language (str | None, optional): The syntax highlighting language used when editing these files.
+            default_program (str | None, optional): The app that opens these files if the user hasn't chosen one.
+            signatures (tuple[bytes], optional): The bytes these files start with (their "magic number").
+            is_text (bool, optional): Whether these files are plain text.
+        """
+
+        self.name = name
+        self.extensions = extensions
+        self.icon = os.path.join(ICONS_PATH, icon)
+        self.language = language
+        self.default_program = default_program
+        self.signatures = signatures
+        self.is_text = is_text
+
+    def __str__(self) -> str:
+        return f"(NAME={self.name}, EXTENSIONS={self.extensions})"
+
+
+NOTEPAD = "system/apps/Notepad.py"
+
+FOLDER = FileType("Folder", (FOLDER_KEY,), icon="folder.png") # There's no built-in app for folders yet
+TEXT = FileType("Text", ("txt", "log", "ini", "cfg", "conf"), default_program=NOTEPAD, is_text=True)
+BINARY = FileType("File")
+
+FILE_TYPES = (
+    FOLDER,
+    TEXT,
+    FileType("Markdown",    ("md",),            language="markdown",   default_program=NOTEPAD, is_text=True),
+    FileType("Python",      ("py",),            language="python",     default_program=NOTEPAD, is_text=True),
+    FileType("JSON",        ("json",),          language="json",       default_program=NOTEPAD, is_text=True),
+    FileType("CSS",         ("css", "tcss"),    language="css",        default_program=NOTEPAD, is_text=True),
+    FileType("HTML",        ("html", "htm"),    language="html",       default_program=NOTEPAD, is_text=True, signatures=(b"<!DOCTYPE html", b"<!doctype html", b"<html")),
+    FileType("JavaScript",  ("js",),            language="javascript", default_program=NOTEPAD, is_text=True),
+    FileType("Java",        ("java",),          language="java",       default_program=NOTEPAD, is_text=True),
+    FileType("Shell Script",("sh",),            language="bash",       default_program=NOTEPAD, is_text=True, signatures=(b"#!/bin/sh", b"#!/bin/bash", b"#!/usr/bin/env bash")),
+    FileType("Go",          ("go",),            language="go",         default_program=NOTEPAD, is_text=True),
+    FileType("PNG Image",   ("png",),           signatures=(b"\x89PNG\r\n\x1a\n",)),
+    FileType("JPEG Image",  ("jpg", "jpeg"),    signatures=(b"\xff\xd8\xff",)),
+    FileType("GIF Image",   ("gif",),           signatures=(b"GIF87a", b"GIF89a")),
+    FileType("PDF Document",("pdf",),           signatures=(b"%PDF-",)),
+    FileType("ZIP Archive", ("zip",),           signatures=(b"PK\x03\x04",)),
+    FileType("Program",     ("elf",),           signatures=(b"\x7fELF",)),
+)
+
+# Built once, so looking up a file type is a dictionary lookup
+_by_extension: dict[str, FileType] = {
+    extension: file_type
+    for file_type in FILE_TYPES
+    for extension in file_type.extensions
+}
+
+# Longest signatures first, so a more specific signature wins
+_signatures: list[tuple[bytes, FileType]] = sorted(
+    ((signature, file_type) for file_type in FILE_TYPES for signature in file_type.signatures),
+    key=lambda item: len(item[0]),
+    reverse=True
+)
+
+
+def _get_extension(file_path: str) -> str:
+    return os.path.splitext(file_path)[1][1:].lower()
+
+def get_type_by_extension(extension: str) -> FileType | None:
+    """Get a file type from an extension.
+
+    Args:
+        extension (str): The extension, without the dot. Use `FOLDER_KEY` for folders.
+
+    Returns:
+        FileType | None: The file type, or `None` if the extension isn't known.
+    """
+
+    return _by_extension.get(extension if extension == FOLDER_KEY else extension.lower())
+
+def sniff_bytes(data: bytes) -> FileType:
+    """Work out the type of a file from the first bytes of it.
+
+    Args:
+        data (bytes): The start of the file.
+
+    Returns:
+        FileType: The file type. Unknown text is `TEXT`, anything else unknown is `BINARY`.
+    """
+
+    for signature, file_type in _signatures:
+        if data.startswith(signature):
+            return file_type
+
+    if b"\0" in data:
+        return BINARY
+
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(data) - 3: # Only a multi-byte character cut off at the end is allowed
+            return BINARY
+
+    return TEXT
+
+@lru_cache(maxsize=1024)
+def _sniff_file(path: str, mtime: int, size: int) -> FileType:
+    # The mtime and size are part of the cache key, so a changed file is sniffed again
+    with open(path, "rb") as f:
+        return sniff_bytes(f.read(SNIFF_SIZE))
+
+def sniff_file(file_path: str) -> FileType:
+    """Work out the type of a file from its contents. Only the start of the file is read, and the result is cached.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        FileType: The file type.
+    """
+
+    path = os.path.abspath(file_path)
+    stat_result = os.stat(path)
+
+    return _sniff_file(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+def get_file_type(file_path: str, sniff: bool = False, is_dir: bool | None = None) -> FileType:
+    """Get the type of a file.
+
+    Args:
+        file_path (str): The path to the file.
+        sniff (bool, optional): Read the start of the file if its extension isn't known. Defaults to False.
+        is_dir (bool | None, optional): Whether the file is a folder, if that's already known. Otherwise the stat cache is asked.
+
+    Returns:
+        FileType: The file type.
+    """
+
+    if is_dir is None:
+        is_dir = stat_cache.isdir(file_path)
+    if is_dir:
+        return FOLDER
+
+    file_type = _by_extension.get(_get_extension(file_path))
+    if file_type is not None:
+        return file_type
+
+    if sniff:
+        try:
+            return sniff_file(file_path)
+        except OSError:
+            pass
+
+    return BINARY
+
+def get_icon(file_path: str, is_dir: bool | None = None) -> str:
+    """Get the icon shown for a file. This never reads the file.
+
+    Returns:
+        str: The path to the icon.
+    """
+
+    return get_file_type(file_path, is_dir=is_dir).icon
+
+def get_language(file_path: str) -> str | None:
+    """Get the syntax highlighting language of a file from its extension.
+
+    Returns:
+        str | None: The language, or `None` if the file has no language.
+    """
+
+    file_type = _by_extension.get(_get_extension(file_path))
+    return file_type.language if file_type else None
@@ -1,13 +1,35 @@
+import io
 import os
+import heapq
+import sqlite3
+import tempfile
 
-import imp
+from system import default_programs
+from system.jobs import run_blocking, get_executor, JobPriority, Lane
+from system.file_index import get_file_index
+from system import stat_cache, file_types
+from system.transfer import Transfer, TransferKind, TransferProgress
+from system.util.lazy_import import lazy_import
 
-from system.users import get_user_details
-from system.gui.custom_widgets.dialog import create_dialog, DialogIcon
+# Only needed to show an error, and it imports most of the GUI
+dialog = lazy_import("system.gui.custom_widgets.dialog")
+
+
+PREFETCH_SIZE = 64 * 1024 # How many bytes of a file are read ahead of time when it's about to be opened
+CHUNK_SIZE = 64 * 1024    # How many bytes `iter_chunks` reads at a time
+LIST_BATCH_SIZE = 512     # How many directory entries `iter_dir` reads at a time
+
+# The first chunk of files that are about to be opened, keyed by their absolute path.
+# Each entry is a tuple of (file mtime, chunk, whether the chunk is the whole file).
+_prefetched: dict[str, tuple[int, bytes, bool]] = {}
 
 
 def find_file(file_name: str, dir: str = None):
-    """Recursively search for a file in a directory.
+    """Search for a file in a directory, and every directory inside of it.
+    
+    The file is looked up in the file index, which is brought up to date if the file isn't found.
+    If the index can't be used, the directory is searched with `os.walk`. If there's more than one
+    file with this name, the one in the shallowest directory is found, then the first alphabetically.
 
     Args:
         file_name (str): The file being searched for.
@@ -17,68 +39,518 @@ def find_file(file_name: str, dir: str = None):
         str?: Returns the path the file if it was found, otherwise returns `None`.
     """
     
+    dir = dir if dir is not None else "."
+    
+    try:
+        index = get_file_index()
+        
+        if not index.has_root(dir):
+            index.add_root(dir)
+        
+        for path in index.find(file_name, dir):
+            if os.path.isfile(path):
+                return _relative_to(path, dir)
+            
+        # The index might be out of date, refresh the directories that changed and try again
+        index.refresh(dir)
+        
+        for path in index.find(file_name, dir):
+            if os.path.isfile(path):
+                return _relative_to(path, dir)
+        return None
+    except sqlite3.Error:
+        pass
+    
     for root, _, files in os.walk(dir):
         if file_name in files:
             return os.path.join(root, file_name)
         
+def _relative_to(path: str, dir: str) -> str:
+    """Turn an absolute path from the file index into a path inside `dir`, like the ones `os.walk(dir)` gives."""
+    return os.path.join(dir, os.path.relpath(path, os.path.abspath(dir)))
+        
 def get_file_extension(file_path: str):
     _, extension = os.path.splitext(file_path)
     return extension[1:]
         
-def get_file_icon(file_path: str):
-    icons = {
-        "txt": "system/assets/images/icons/file/txt.png",
-        "/folder\\": "system/assets/images/icons/file/folder.png"
-    }
+def get_file_icon(file_path: str, is_dir: bool | None = None):
+    return file_types.get_icon(file_path, is_dir)
+
+def _read_bytes(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
     
-    extension = get_file_extension(file_path)
+def _read_text(file_path: str, encoding: str) -> str:
+    with open(file_path, "r", encoding=encoding) as f:
+        return f.read()
+
+def decode_text(data: bytes, encoding: str = "utf-8") -> str:
+    """Decode the bytes of a text file, e.g. a prefetched chunk, the same way `read_text` reads the file (with newlines translated).
+
+    Args:
+        data (bytes): The contents of the file.
+        encoding (str, optional): The encoding of the file. Defaults to "utf-8".
+
+    Returns:
+        str: The contents of the file.
+    """
+    
+    return io.TextIOWrapper(io.BytesIO(data), encoding=encoding).read()
+
+def _get_umask() -> int:
+    # Linux shows the umask in /proc, otherwise it can only be read by changing it (which affects every thread) and changing it back
     try:
-        return icons[extension]
-    except KeyError:
-        if not os.path.isdir(file_path):
-            return icons["txt"]
-        else:
-            return icons["/folder\\"]
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
     
-async def run(app_path: str, desktop, args: list[str]):
-    name = os.path.basename(app_path)[:-3]
-    path = os.path.abspath(app_path)
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+def write_atomic_sync(file_path: str, data: str | bytes, encoding: str = "utf-8"):
+    """Replace the contents of a file, without anyone ever seeing a half written file.
+    
+    The data is written to a temporary file next to it, flushed to the disk and then renamed over the file.
+    Prefer `write_atomic` on the event loop.
 
+    Args:
+        file_path (str): The path to the file.
+        data (str | bytes): The new contents of the file.
+        encoding (str, optional): The encoding used if `data` is a string. Defaults to "utf-8".
+    """
+    
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    
+    dir = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=dir)
+    
     try:
-        app = imp.load_source(name, path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            
+        try: # Keep the permissions of the file we're replacing
+            mode = os.stat(file_path).st_mode & 0o7777
+        except FileNotFoundError: # A new file, which `mkstemp` made private, gets the permissions `open` would have given it
+            mode = 0o666 & ~_get_umask()
+        os.chmod(temp_path, mode)
+            
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    
+    stat_cache.invalidate(file_path)
+    
+def _open_chunks(file_path: str):
+    return open(file_path, "rb")
+
+def _read_chunk(file, size: int) -> bytes:
+    return file.read(size)
+
+async def _run_io(func, *args, name: str | None = None):
+    return await run_blocking(func, *args, lane=Lane.IO, priority=JobPriority.HIGH, name=name)
+    
+async def read_bytes(file_path: str) -> bytes:
+    """Read a whole file without blocking the event loop.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        bytes: The contents of the file.
+    """
+    
+    return await _run_io(_read_bytes, file_path, name="read-bytes")
+
+async def read_text(file_path: str, encoding: str = "utf-8") -> str:
+    """Read a whole text file without blocking the event loop.
+
+    Args:
+        file_path (str): The path to the file.
+        encoding (str, optional): The encoding of the file. Defaults to "utf-8".
+
+    Returns:
+        str: The contents of the file.
+    """
+    
+    return await _run_io(_read_text, file_path, encoding, name="read-text")
+
+async def write_atomic(file_path: str, data: str | bytes, encoding: str = "utf-8"):
+    """Replace the contents of a file atomically without blocking the event loop. See `write_atomic_sync`.
+
+    Args:
+        file_path (str): The path to the file.
+        data (str | bytes): The new contents of the file.
+        encoding (str, optional): The encoding used if `data` is a string. Defaults to "utf-8".
+    """
+    
+    await _run_io(write_atomic_sync, file_path, data, encoding, name="write-atomic")
+    
+async def stat(file_path: str) -> os.stat_result:
+    """Get the metadata of a file without blocking the event loop.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        os.stat_result: The file's metadata.
+    """
+    
+    return await _run_io(os.stat, file_path, name="stat")
+
+async def iter_chunks(file_path: str, chunk_size: int = CHUNK_SIZE):
+    """Read a file a chunk at a time without blocking the event loop, e.g. `async for chunk in iter_chunks(path)`.
+
+    Args:
+        file_path (str): The path to the file.
+        chunk_size (int, optional): How many bytes to read at a time. Defaults to CHUNK_SIZE.
+
+    Yields:
+        bytes: The next chunk of the file.
+    """
+    
+    file = await _run_io(_open_chunks, file_path, name="open-chunks")
+    
+    try:
+        while True:
+            chunk = await _run_io(_read_chunk, file, chunk_size, name="read-chunk")
+            
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await _run_io(file.close, name="close-chunks")
+        
+def _read_dir_batch(entries, size: int, show_hidden: bool, filter) -> tuple[list[stat_cache.StatEntry], bool]:
+    batch = []
+    
+    for entry in entries:
+        if not show_hidden and entry.name.startswith("."):
+            continue
+        
+        stat_entry = stat_cache.StatEntry.from_dir_entry(entry)
+        
+        if filter is None or filter(stat_entry):
+            batch.append(stat_entry)
+            
+            if len(batch) >= size:
+                return batch, False
+    
+    entries.close()
+    return batch, True
+
+async def iter_dir(dir: str, batch_size: int = LIST_BATCH_SIZE, show_hidden: bool = True, filter=None):
+    """List a directory a batch at a time without blocking the event loop, e.g. `async for batch in iter_dir(path)`.
+    
+    Entries are yielded in the order they're read from the disk, so the first batch arrives
+    without waiting for the rest of the directory.
+
+    Args:
+        dir (str): The directory.
+        batch_size (int, optional): The most entries in each batch. Defaults to LIST_BATCH_SIZE.
+        show_hidden (bool, optional): Whether to include files whose name starts with a dot. Defaults to True.
+        filter (Callable[[StatEntry], bool] | None, optional): Only entries this returns `True` for are included. It's called off the event loop.
+
+    Raises:
+        FileNotFoundError: Raised if the directory doesn't exist.
+        NotADirectoryError: Raised if the path isn't a directory.
+
+    Yields:
+        list[StatEntry]: The next batch of entries. Whether each entry is a directory is already known, its other metadata is fetched when it's needed.
+            The entries are also put in the stat cache.
+    """
+    
+    entries = await _run_io(os.scandir, dir, name="scandir")
+    
+    try:
+        done = False
+        
+        while not done:
+            batch, done = await _run_io(_read_dir_batch, entries, batch_size, show_hidden, filter, name="read-dir")
+            
+            if batch:
+                stat_cache.store(batch) # So looking up the files afterwards, e.g. to open them, doesn't stat them again
+                yield batch
+    finally:
+        entries.close()
+
+def default_sort_key(entry: stat_cache.StatEntry):
+    """Folders first, then by name ignoring case."""
+    return (not entry.is_dir, entry.name.casefold())
+
+class DirListing:
+    def __init__(self, dir: str, key=default_sort_key, reverse: bool = False) -> None:
+        """A sorted directory listing that is filled in a batch at a time by `stream_dir`.
+        
+        Each batch is sorted on its own when it arrives, and the sorted batches are only merged
+        when a page is asked for, so a page can be shown before the whole directory has been read.
+
+        Args:
+            dir (str): The directory.
+            key (Callable[[StatEntry], Any], optional): What the entries are sorted by. Defaults to `default_sort_key`.
+            reverse (bool, optional): Whether to sort backwards. Defaults to False.
+        """
+        
+        self.dir = dir
+        self.key = key
+        self.reverse = reverse
+        self.complete = False
+        
+        self.__sorted: list[stat_cache.StatEntry] = []
+        self.__pending: list[list[stat_cache.StatEntry]] = []
+        self.__count = 0
+        
+    def add(self, batch: list[stat_cache.StatEntry]):
+        self.__pending.append(sorted(batch, key=self.key, reverse=self.reverse))
+        self.__count += len(batch)
+    
+    def __merge(self):
+        if self.__pending:
+            self.__sorted = list(heapq.merge(self.__sorted, *self.__pending, key=self.key, reverse=self.reverse))
+            self.__pending.clear()
+    
+    def page(self, index: int, size: int) -> list[stat_cache.StatEntry]:
+        """Get a page of the entries read so far. Until the listing is complete, entries read later may come before this page.
+
+        Args:
+            index (int): The page number, starting at 0.
+            size (int): How many entries are in each page.
+
+        Returns:
+            list[StatEntry]: The entries on the page.
+        """
+        
+        self.__merge()
+        return self.__sorted[index * size:(index + 1) * size]
+    
+    def entries(self) -> list[stat_cache.StatEntry]:
+        """Get every entry read so far, sorted."""
+        self.__merge()
+        return list(self.__sorted)
+    
+    def __len__(self) -> int:
+        return self.__count
+    
+    def __str__(self) -> str:
+        return f"(DIR={self.dir}, ENTRIES={self.__count}, COMPLETE={self.complete})"
+
+async def stream_dir(dir: str, key=default_sort_key, reverse: bool = False, batch_size: int = LIST_BATCH_SIZE, show_hidden: bool = True, filter=None):
+    """List and sort a directory, yielding the listing after every batch so folder views can show the first page straight away.
+    
+    ```
+    async for listing in stream_dir(path):
+        show(listing.page(0, 50))
+    ```
+
+    Args:
+        dir (str): The directory.
+        key (Callable[[StatEntry], Any], optional): What the entries are sorted by. Defaults to `default_sort_key`.
+        reverse (bool, optional): Whether to sort backwards. Defaults to False.
+        batch_size (int, optional): The most entries read at a time. Defaults to LIST_BATCH_SIZE.
+        show_hidden (bool, optional): Whether to include files whose name starts with a dot. Defaults to True.
+        filter (Callable[[StatEntry], bool] | None, optional): Only entries this returns `True` for are included.
+
+    Yields:
+        DirListing: The same listing each time, with the new batch added. `complete` is `True` on the last one.
+    """
+    
+    listing = DirListing(dir, key, reverse)
+    
+    async for batch in iter_dir(dir, batch_size, show_hidden, filter):
+        listing.add(batch)
+        yield listing
+    
+    listing.complete = True
+    yield listing
+        
+def get_io_metrics() -> dict:
+    """Get how busy file I/O is: how many reads and writes are queued and running, and how long they take.
+
+    Returns:
+        dict: The metrics, or an empty dict if the job executor isn't running.
+    """
+    
+    executor = get_executor()
+    
+    if executor is None:
+        return {}
+    return executor.get_metrics()[Lane.IO.name]
+    
+async def copy(sources: list[str], destination: str, on_progress=None, overwrite: bool = False) -> TransferProgress:
+    """Copy files and folders into a folder without blocking the event loop. Use `Transfer` directly to be able to cancel it.
+
+    Args:
+        sources (list[str]): The files and folders to copy.
+        destination (str): The folder to copy them into.
+        on_progress (Callable[[TransferProgress], Any] | None, optional): Called every so often with how far along the copy is.
+        overwrite (bool, optional): Whether to replace files that already exist in the destination. Defaults to False.
+
+    Returns:
+        TransferProgress: How many files and bytes were copied, and how fast.
+    """
+    
+    return await Transfer(sources, destination, TransferKind.COPY, on_progress, overwrite).run()
+
+async def move(sources: list[str], destination: str, on_progress=None, overwrite: bool = False) -> TransferProgress:
+    """Move files and folders into a folder without blocking the event loop. Moves on the same drive are instant.
+
+    Args:
+        sources (list[str]): The files and folders to move.
+        destination (str): The folder to move them into.
+        on_progress (Callable[[TransferProgress], Any] | None, optional): Called every so often with how far along the move is.
+        overwrite (bool, optional): Whether to replace files that already exist in the destination. Defaults to False.
+
+    Returns:
+        TransferProgress: How many files and bytes were moved, and how fast.
+    """
+    
+    return await Transfer(sources, destination, TransferKind.MOVE, on_progress, overwrite).run()
+    
+async def run(app_path: str, desktop, args: list[str]):
+    try:
+        execute = default_programs.get_program_cache(desktop.logged_in_user).get_entry_point(app_path)
     except FileNotFoundError: # Couldn't run the app because it doesn't exist
-        create_dialog(
+        dialog.create_dialog(
             f"The system cannot find the specified file:\n[blue]{app_path}[/blue]",
             desktop,
             "SwiftOS error",
-            icon=DialogIcon.EXCLAMATION
+            icon=dialog.DialogIcon.EXCLAMATION
         )
         return 1
     
-    await app.execute(desktop, args)
+    return await execute(desktop, args)
     
-async def open_file(file_path: str, desktop):    
-    current_user = desktop.logged_in_user
+async def get_default_program(file_path: str, username: str):
+    """Find the app a user opens a file with.
+
+    Args:
+        file_path (str): The path to the file.
+        username (str): The user opening the file.
+
+    Returns:
+        str?: The path to the app, or `None` if the user has no app for this kind of file.
+    """
     
-    user_details = get_user_details(current_user)
-    apps = user_details["defaultPrograms"]
+    programs = default_programs.get_program_cache(username)
+    if not programs.is_loaded:
+        await programs.load_async()
     
-    ext = get_file_extension(file_path)
+    file_type = file_types.get_file_type(file_path)
     
-    if os.path.isdir(file_path):
-        ext = "/folder\\"
+    chosen = programs.get_program(file_path, file_type)
+    if chosen is not None: # The user's choice comes first
+        return chosen
     
-    if not os.path.exists(file_path): # The file doesn't exist
-        raise FileNotFoundError(file_path)
+    if file_type is file_types.BINARY: # We don't know the extension, look at what's inside the file
+        file_type = await run_blocking(file_types.get_file_type, file_path, True, False, name="sniff-file-type")
+        
+    return file_type.default_program
+
+def prefetch_file(file_path: str, size: int = PREFETCH_SIZE):
+    """Read the first chunk of a file ahead of time, so the app opening it doesn't have to wait for the disk.
+
+    Args:
+        file_path (str): The path to the file.
+        size (int, optional): How many bytes to read. Defaults to PREFETCH_SIZE.
+    """
+    
+    path = os.path.abspath(file_path)
+    
+    with open(path, "rb") as f:
+        mtime = os.fstat(f.fileno()).st_mtime_ns
+        chunk = f.read(size + 1) # Read one extra byte to know if there's more to the file
+    
+    _prefetched[path] = (mtime, chunk[:size], len(chunk) <= size)
+    
+def take_prefetched(file_path: str, whole_file: bool = True):
+    """Take the prefetched chunk of a file, if it was prefetched and hasn't changed since.
+
+    Args:
+        file_path (str): The path to the file.
+        whole_file (bool, optional): Only return the chunk if it is the whole file. Defaults to True.
+
+    Returns:
+        bytes?: The prefetched chunk, or `None` if there isn't one.
+    """
+    
+    path = os.path.abspath(file_path)
+    prefetched = _prefetched.pop(path, None)
+    
+    if prefetched is None:
+        return None
+    
+    mtime, chunk, complete = prefetched
     
     try:
-        default_app = apps[ext]
-    except KeyError: # There is no default app to handle this file extension...
-        await create_dialog(
+        if os.stat(path).st_mtime_ns != mtime:
+            return None
+    except FileNotFoundError:
+        return None
+    
+    if whole_file and not complete:
+        return None
+    return chunk
+
+def discard_prefetched(file_path: str):
+    """Forget the prefetched chunk of a file, if it has one."""
+    _prefetched.pop(os.path.abspath(file_path), None)
+
+async def preload_file(file_path: str, desktop):
+    """Get ready to open a file: find the app that opens it, load the app and read the start of the file.
+    
+    This is ran speculatively (e.g. when the mouse hovers over an icon), so opening the file
+    afterwards only has to show the app's window.
+
+    Args:
+        file_path (str): The path to the file.
+        desktop (Desktop): The desktop the file will be opened on.
+
+    Returns:
+        str?: The app that will open the file, or `None` if there isn't one.
+    """
+    
+    entry = stat_cache.get(file_path)
+    
+    if entry is None:
+        return None
+    
+    default_app = await get_default_program(file_path, desktop.logged_in_user)
+    
+    if default_app is None:
+        return None
+    
+    programs = default_programs.get_program_cache(desktop.logged_in_user)
+    await run_blocking(programs.get_entry_point, default_app, priority=JobPriority.LOW, name="preload-app")
+    
+    if entry.is_file:
+        await run_blocking(prefetch_file, file_path, priority=JobPriority.LOW, name="prefetch-file")
+        
+    return default_app
+
+async def open_file(file_path: str, desktop):    
+    current_user = desktop.logged_in_user
+    
+    if not stat_cache.exists(file_path): # The file doesn't exist
+        raise FileNotFoundError(file_path)
+    
+    default_app = await get_default_program(file_path, current_user)
+    
+    if default_app is None: # There is no default app to handle this file extension...
+        await dialog.create_dialog(
             "There is no default app to handle this kind of file. Support for changing default apps will be coming in a future release of SwiftOS. We apolagize for the inconvenicence.",
             desktop,
             "SwiftOS Error",
-            icon=DialogIcon.EXCLAMATION
+            icon=dialog.DialogIcon.EXCLAMATION
         )
         return False
     
@@ -3,13 +3,19 @@ from textual.widgets import Static
 from textual.widget import Widget
 from textual.containers import Center
 from textual import events, on
+from textual.worker import Worker
 
 import time
 import os
 from textwrap import shorten
 
 from system.gui.custom_widgets import image, dialog
-from system.fs import open_file
+from system.fs import open_file, preload_file, discard_prefetched
+from system import stat_cache
+from system.tracing import traced
+
+
+ICON_SIZE = (9, 11) # How many characters wide and tall an icon's image is
 
 
 class Icon(Widget):
@@ -60,10 +66,11 @@ class Icon(Widget):
         self.click_threshold = 0.5 # clicks must be within 0.5 seconds to be considered a double click
         
         self.hovered = False
+        self.preload_worker: Worker | None = None
         super().__init__(name=name, id=id, classes=classes, disabled=disabled)
         
     async def open_icon(self):
-        if not os.path.exists(self.file):
+        if not stat_cache.exists(self.file):
             def callback(pressed_button: str):
                 if pressed_button == "Yes":
                     self.remove()
@@ -72,9 +79,31 @@ class Icon(Widget):
             await dialog.create_dialog(text, self.screen, title="SwiftOS Error", buttons=dialog.DialogButtons.YES_NO, icon=dialog.DialogIcon.EXCLAMATION, callback=callback)
             
         await open_file(self.file, self.screen)
+        self.preload_worker = None # Whatever was preloaded has been used up
+        
+    def preload(self):
+        """Start getting ready to open the icon's file in the background, so a double click only has to show the app."""
+        if self.preload_worker is not None: # Already preloading, or preloaded
+            return
+        
+        self.preload_worker = self.run_worker(
+            preload_file(self.file, self.screen),
+            name=f"preload {self.file}",
+            group="icon-preload",
+            exit_on_error=False
+        )
+        
+    def cancel_preload(self):
+        """Stop preloading the icon's file, and forget anything that was already preloaded."""
+        if self.preload_worker is not None:
+            self.preload_worker.cancel()
+            self.preload_worker = None
+        
+        discard_prefetched(self.file)
         
+    @traced(category="compose")
     def compose(self) -> ComposeResult: 
-        yield image.Image(self.icon_path, (9, 11), id="icon-image")
+        yield image.Image(self.icon_path, ICON_SIZE, id="icon-image")
         yield Static(
             shorten(self.text, width=10, placeholder="..")
             , id="icon-text")
@@ -88,5 +117,7 @@ class Icon(Widget):
             
             self.app.log(f"Icon Openned: (FILE={self.file})")
             await self.open_icon()
+        else:
+            self.preload() # The first click of a double click, get ready to open the file
         
         self.last_click = current_time
\ No newline at end of file
@@ -1,7 +1,64 @@
+import os
+import threading
+
+from collections import OrderedDict
+
 from textual.widgets import Static
 
 from rich_pixels import Pixels
 
+from system.jobs import run_blocking, JobPriority
+from system.tracing import span
+
+
+RENDER_CACHE_SIZE = 64 # How many rendered images are kept
+
+
+# Rendered images, keyed by (path, mtime, size it was resized to), least recently used first
+_renders: OrderedDict[tuple, Pixels] = OrderedDict()
+_renders_lock = threading.Lock()
+
+
+def render_image(file_path: str, resize: tuple[int, int] | None = None) -> Pixels:
+    """Decode and resize an image, reusing the last render of it if the file hasn't changed.
+
+    Args:
+        file_path (str): The file path to the image.
+        resize (tuple[int, int] | None, optional): How many characters wide and tall the image should be resized to.
+
+    Returns:
+        Pixels: The rendered image.
+    """
+    
+    key = (os.path.abspath(file_path), os.stat(file_path).st_mtime_ns, tuple(resize) if resize is not None else None)
+    
+    with _renders_lock:
+        pixels = _renders.get(key)
+        if pixels is not None:
+            _renders.move_to_end(key)
+            return pixels
+    
+    pixels = Pixels.from_image_path(file_path, resize)
+    
+    with _renders_lock:
+        _renders[key] = pixels
+        while len(_renders) > RENDER_CACHE_SIZE:
+            _renders.popitem(last=False)
+    
+    return pixels
+
+def forget_renders(file_path: str):
+    """Remove every render of an image from the cache, to free its memory."""
+    path = os.path.abspath(file_path)
+    
+    with _renders_lock:
+        for key in [key for key in _renders if key[0] == path]:
+            del _renders[key]
+
+async def render_image_async(file_path: str, resize: tuple[int, int] | None = None) -> Pixels:
+    """The same as `render_image`, but decodes the image in a worker thread. Used to render images before they're shown."""
+    return await run_blocking(render_image, file_path, resize, priority=JobPriority.HIGH, name="render-image")
+
 
 class Image(Static):
     DEFAULT_CSS = """
@@ -22,7 +79,8 @@ class Image(Static):
         
         self.file_path = file_path
         
-        data = Pixels.from_image_path(self.file_path, resize)
+        with span("Image", "compose", file_path=file_path):
+            data = render_image(self.file_path, resize)
         super().__init__(data, name=name, id=id, classes=classes)
         
     def set_image(self, file_path: str, resize: tuple[int, int] | None = None):     
@@ -34,6 +92,6 @@ class Image(Static):
         """
         
         self.file_path = file_path   
-        data = Pixels.from_image_path(self.file_path, resize)
+        data = render_image(self.file_path, resize)
         
         self.update(data)
\ No newline at end of file
@@ -1,17 +1,32 @@
 import os
+import weakref
 
 from textual.screen import Screen
 from textual.app import ComposeResult
 from textual.widgets import Header, Footer, Static, TabbedContent, TabPane, Tabs
 from textual.containers import Container
+from textual.binding import Binding
+from textual.timer import Timer
 from textual import events, on, work
 
 from string import punctuation
 
 from system.gui.custom_widgets import image, window, icon
 from system.users import get_user_background
-from system.fs import get_file_icon
+from system.fs import get_file_icon, iter_dir, run
 from system.console import console_bounds
+from system.jobs import get_executor
+from system import session
+from system.tracing import traced
+
+
+DISK_USAGE = "system/apps/DiskUsage.py"
+
+
+def get_background_size() -> tuple[int, int]:
+    """Get how many characters wide and tall the desktop background is."""
+    bounds = console_bounds()
+    return (bounds.columns, (bounds.lines*2)-9)
 
 
 class Desktop(Screen):
@@ -57,17 +72,38 @@ class Desktop(Screen):
     }
     """
     
-    def __init__(self, logged_in_user: str) -> None:
+    BINDINGS = [
+        Binding("ctrl+u", "switch_user", "Switch user"),
+        Binding("ctrl+l", "log_out", "Log out"),
+        Binding("ctrl+d", "disk_usage", "Disk usage")
+    ]
+    
+    def __init__(self, logged_in_user: str, desktop_entries: list | None = None) -> None:
         """A desktop screen for SwiftOS.
 
         Args:
             logged_in_user (str): The username of the currently logged in user.
+            desktop_entries (list[StatEntry] | None, optional): What's on the user's desktop, if it was listed while booting.
         """
         
         super().__init__()
         
         self.logged_in_user = logged_in_user
+        self.desktop_entries = desktop_entries
         self.selected_window = None
+        self.hovered_icon = None
+        
+        # Whether another user is using the computer, see `suspend`
+        self.is_suspended = False
+        self.caches_dropped = False
+        self.__timers: weakref.WeakSet[Timer] = weakref.WeakSet() # Forgotten once they stop, see `track_timer`
+        self.__paused_timers = []
+        
+        # Set by the session manager that opened this desktop, used to switch users
+        self.session_manager = None
+        
+        # The system-wide job executor, apps should run blocking work through this.
+        self.jobs = get_executor()
         
         self.__mouse_pos = (0, 0)
     
@@ -92,6 +128,32 @@ class Desktop(Screen):
     
     def on_mouse_move(self, event: events.MouseMove) -> None:
         self.__mouse_pos = (event.screen_x, event.screen_y) # Constant mouse tracking :D
+        self.__update_hovered_icon(self.app.mouse_over)
+        
+    def __update_hovered_icon(self, widget) -> None:
+        """Start preloading the icon under the mouse, and cancel preloading the icon the mouse left.
+
+        Args:
+            widget (Widget | None): The widget under the mouse.
+        """
+        
+        # The mouse is usually over the icon's image or text, so look for the icon they belong to.
+        hovered = widget
+        while hovered is not None and not isinstance(hovered, icon.Icon):
+            hovered = hovered.parent
+            
+        if hovered is self.hovered_icon:
+            return
+        
+        if self.hovered_icon is not None:
+            self.hovered_icon.hovered = False
+            self.hovered_icon.cancel_preload()
+            
+        if hovered is not None:
+            hovered.hovered = True
+            hovered.preload()
+            
+        self.hovered_icon = hovered
     
     def get_window(self, title: str):
         """
@@ -188,6 +250,138 @@ class Desktop(Screen):
         
         self.app.log(f"Window Deselected ({self}): {selected_window.id}")
     
+    def on_mount(self) -> None:
+        self.load_icons()
+        self.restore_session()
+        
+        session.add_desktop(self)
+    
+    def on_unmount(self) -> None:
+        session.remove_desktop(self)
+    
+    def on_resize(self) -> None:
+        # Windows that were off screen from the last session may fit now
+        self.call_after_refresh(session.realise_seen, self)
+    
+    def action_switch_user(self) -> None:
+        if self.session_manager is not None:
+            self.app.run_worker(self.session_manager.switch_user(), group="switch-user", exclusive=True)
+    
+    def action_log_out(self) -> None:
+        if self.session_manager is not None:
+            self.app.run_worker(self.session_manager.switch_user(log_out=True), group="switch-user", exclusive=True)
+    
+    def track_timer(self, timer: Timer) -> Timer:
+        """Pause a timer while the desktop is suspended. The desktop's own timers are tracked already,
+        apps should pass theirs through this, e.g. `self.screen.track_timer(self.set_interval(1, self.tick))`.
+
+        Args:
+            timer (Timer): The timer, from `set_interval` or `set_timer`.
+
+        Returns:
+            Timer: The same timer.
+        """
+        
+        self.__timers.add(timer)
+        
+        if self.is_suspended:
+            timer.pause()
+            self.__paused_timers.append(timer)
+        
+        return timer
+    
+    def set_interval(self, *args, **kwargs) -> Timer:
+        return self.track_timer(super().set_interval(*args, **kwargs))
+    
+    def set_timer(self, *args, **kwargs) -> Timer:
+        return self.track_timer(super().set_timer(*args, **kwargs))
+    
+    def action_disk_usage(self) -> None:
+        """Show what's using the space in this user's home folder."""
+        self.run_worker(run(DISK_USAGE, self, [f"home/{self.logged_in_user}"]), group="disk-usage")
+    
+    def suspend(self) -> None:
+        """Pause the desktop's timers while another user is using the computer. The desktop stays in memory, so switching back is instant."""
+        self.is_suspended = True
+        
+        # A paused timer is only kept alive by the list, otherwise it would be garbage collected
+        self.__paused_timers.extend(self.__timers)
+        
+        for timer in self.__paused_timers:
+            timer.pause()
+        
+        if self.hovered_icon is not None:
+            self.hovered_icon.cancel_preload()
+            self.hovered_icon = None
+    
+    def resume(self) -> None:
+        """Start the desktop's timers again when its user switches back to it."""
+        self.is_suspended = False
+        
+        for timer in self.__paused_timers:
+            timer.resume()
+        self.__paused_timers.clear()
+        
+        if self.caches_dropped:
+            self.reload_background()
+    
+    def drop_caches(self) -> None:
+        """Free the desktop's background while it's suspended. Used when the computer is low on memory."""
+        background = self.query_one("#desktop-background", image.Image)
+        background.update("")
+        image.forget_renders(background.file_path)
+        
+        self.caches_dropped = True
+    
+    @work(group="desktop-background", exclusive=True)
+    async def reload_background(self) -> None:
+        background = self.query_one("#desktop-background", image.Image)
+        background.update(await image.render_image_async(background.file_path, get_background_size()))
+        
+        self.caches_dropped = False
+    
+    def save_session(self) -> None:
+        """Save the open windows, so they come back the next time this user logs in."""
+        session.save_session(self)
+    
+    @work(group="session")
+    async def restore_session(self) -> None:
+        """Put back the windows that were open when this user's last session ended."""
+        await session.restore_session(self)
+    
+    @work(group="desktop-icons", exclusive=True)
+    async def load_icons(self) -> None:
+        """Add an icon for everything on the desktop. The desktop is listed a batch at a time, so the first icons appear straight away."""
+        if self.desktop_entries is not None: # Listed while booting, and the icons' images are already rendered
+            await self.mount_icons(self.desktop_entries)
+            self.desktop_entries = None
+            return
+        
+        async for batch in iter_dir(f"home/{self.logged_in_user}/Desktop"):
+            await self.mount_icons(batch)
+    
+    async def mount_icons(self, entries: list) -> None:
+        """Add icons to the desktop.
+
+        Args:
+            entries (list[StatEntry]): The files on the desktop to add icons for.
+        """
+        
+        desktop_dir = f"home/{self.logged_in_user}/Desktop"
+        
+        new_icons = [
+            icon.Icon(os.path.join(desktop_dir, entry.name), entry.name, get_file_icon(entry.path, entry.is_dir))
+            for entry in entries
+        ]
+        
+        # Icons go before any windows, so they keep their place in the grid
+        first_window = next((child for child in self.windows.children if not isinstance(child, icon.Icon)), None)
+        
+        if first_window is not None:
+            await self.windows.mount_all(new_icons, before=first_window)
+        else:
+            await self.windows.mount_all(new_icons)
+    
     def on_ready(self) -> ComposeResult:
         """
         Overwritable placeholder method for when the Desktop is fully
@@ -211,9 +405,15 @@ class Desktop(Screen):
     async def add_to_window_bar(self, window, window_bar: TabbedContent):
         window_title = window.title
         
-        new_pane = TabPane(window_title, id=self.window_title_to_id(window_title))
+        pane_id = self.window_title_to_id(window_title)
+        new_pane = TabPane(window_title, id=pane_id)
         
         if len(window_bar.children) > 0:
+            # Adding a duplicate tab leaves half of it on the window bar, so check first
+            if any(pane.id == pane_id for pane in window_bar.query(TabPane)):
+                self.app.log(f"Window already in Window Bar ({window_bar}): {window}")
+                return
+            
             try:
                 await window_bar.add_pane(
                     new_pane
@@ -225,6 +425,7 @@ class Desktop(Screen):
         
         self.app.log(f"Window Added to Window bar ({window_bar}): {window}")
     
+    @traced(category="compose")
     def compose(self) -> ComposeResult:
         with Header(show_clock=True):
             yield Static(self.logged_in_user)
@@ -238,16 +439,9 @@ class Desktop(Screen):
         
         window_bar_windows = []
         
-        yield image.Image(get_user_background(self.logged_in_user), (bounds.columns, (bounds.lines*2)-9), id="desktop-background")
+        yield image.Image(get_user_background(self.logged_in_user), get_background_size(), id="desktop-background")
         with self.windows:
             
-            for file in os.listdir(f"home/{self.logged_in_user}/Desktop"):
-                path = os.path.join(f"home/{self.logged_in_user}/Desktop", file)
-                
-                new_icon = icon.Icon(path, file, get_file_icon(file))
-                yield new_icon
-            
-            
             ready_result = self.on_ready(self)
             if ready_result:
                 for widget in ready_result:
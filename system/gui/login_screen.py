@@ -2,13 +2,11 @@ from textual.screen import Screen, ModalScreen
 from textual.app import ComposeResult
 from textual.widgets import Header, Static, Input, Button
 from textual.containers import Container, Center
-
-from hashlib import sha256
-from time import sleep
+from textual.binding import Binding
 
 from system.gui.custom_widgets.image import Image
 from system.console import console_bounds
-from system import users
+from system import users, auth
 
 
 class LoginForm(ModalScreen):
@@ -24,22 +22,30 @@ class LoginForm(ModalScreen):
     
     CSS_PATH = "../assets/css/boot.tcss"
     
-    def __init__(self, login_screen) -> None:
+    BINDINGS = [
+        Binding("escape", "cancel", "Cancel")
+    ]
+    
+    def __init__(self, login_screen, cancellable: bool = False) -> None:
         """The form for the login screen in SwiftOS.
 
         Args:
             login_screen (Screen): The screen this from belongs to.
+            cancellable (bool, optional): Whether the form can be closed without logging in (with Escape or the Cancel button),
+                e.g. when switching users. It's dismissed with `None` if it is. Defaults to False.
         """
         
         super().__init__(id="login_form")
 
         
         self.login_screen = login_screen
+        self.cancellable = cancellable
     
     def compose(self) -> ComposeResult:        
-        self.users = users.get_users()
+        # Users are fetched a page at a time, so systems with lots of users don't load them all
+        self.user_count = users.count_users()
         self.current_user_index = 0
-        self.current_user = self.users[self.current_user_index]
+        self.current_user = users.get_users_page(self.current_user_index, 1)[0]
         
         theme = users.get_user_details(self.current_user)["theme"]
         
@@ -67,6 +73,9 @@ class LoginForm(ModalScreen):
             with Center(id="sign-in"):
                 yield Button("Sign In", variant="success", id="sign-in-button")
                 yield Button("Change User", id="change-user")
+                
+                if self.cancellable:
+                    yield Button("Cancel", id="cancel")
     
     def on_input_submitted(self, event: Input.Submitted):
         """Fires when the user submits an input widget.
@@ -78,14 +87,14 @@ class LoginForm(ModalScreen):
         """
         if event.input.id == "login-password":
             # When the user submits their password, we attempt a sign in.
-            self.sign_in()
+            self.run_worker(self.sign_in(), group="sign-in", exclusive=True)
     
-    def sign_in(self):
+    async def sign_in(self):
         """
         Use the entered password in the login form to attempt to sign in.
         
-        Using `sha256`, the password is hashed and checked against the user's
-        password hash.
+        The password is checked by the authentication service in a worker thread, so the
+        screen keeps rendering however slow the password hashing is set to be.
         
         If the passwords match the user has logged in successfully, if they don't
         match then the password is incorrect.
@@ -102,30 +111,24 @@ class LoginForm(ModalScreen):
         change_user_button.disabled = True
         password_input.disabled = True
         
-        user_details = users.get_user_details(self.current_user)
-        password = password_input.value
-        
-        encrypted_pass = sha256(password.encode()).hexdigest()
-        
         status = self.query_one("#status")
-        if encrypted_pass == user_details["password_hash"]: # Log in success
+        status.update("[bold]Signing in..[/bold]")
+        
+        if await auth.authenticate(self.current_user, password_input.value): # Log in success
             status.update("[bold gold1]Welcome.[/bold gold1]")
             
-            async def dismiss_login():
-                sleep(2)
-                self.dismiss(self.current_user)
-            self.app.run_worker(dismiss_login, thread=True)
+            user = self.current_user
+            self.set_timer(2, lambda: self.dismiss(user))
         else: # Incorrect password
             status.update("[bold red]Incorrect password![/bold red]")
             
-            async def unlock_input():
-                sleep(1)
+            def unlock_input():
                 password_input.value = ""
                 
                 sign_in_button.disabled = False
                 change_user_button.disabled = False
                 password_input.disabled = False
-            self.app.run_worker(unlock_input, thread=True)
+            self.set_timer(1, unlock_input)
 
     def change_user(self):
         """Change the user being signed in. This cycles through all the users on the system.
@@ -143,11 +146,13 @@ class LoginForm(ModalScreen):
         password_input.disabled = True
         self.query_one("#status").update("")
         
+        self.user_count = users.count_users()
+        
         self.current_user_index += 1
-        if self.current_user_index >= len(self.users):
+        if self.current_user_index >= self.user_count:
             self.current_user_index = 0
             
-        self.current_user = self.users[self.current_user_index]
+        self.current_user = users.get_users_page(self.current_user_index, 1)[0]
         
         user_icon = self.query_one("#user-icon")
         width = console_bounds().columns   
@@ -180,9 +185,15 @@ class LoginForm(ModalScreen):
         """
         
         if event.button.id == "sign-in-button":
-            self.sign_in()
+            self.run_worker(self.sign_in(), group="sign-in", exclusive=True)
         elif event.button.id == "change-user":
             self.change_user()
+        elif event.button.id == "cancel":
+            self.action_cancel()
+    
+    def action_cancel(self):
+        if self.cancellable:
+            self.dismiss(None)
 
 class LoginScreen(Screen):    
     """A screen to handle logging in inside SwiftOS.
@@ -8,8 +8,9 @@ from textual.validation import Length
 from textual import on
 
 from system.gui.custom_widgets.image import Image
-from system.users import get_backgrounds, create_user, change_user, user_exists, get_user_details, get_users
+from system.users import get_backgrounds, create_user_async, change_user_async, get_user_details, get_user_details_async, get_users, flush_async
 from system.console import console_bounds
+from system.gui.setup_validation import SetupFormValidator
 
 
 class SetupScreen(Screen):
@@ -93,7 +94,7 @@ Press **"Finish"** to end Setup.
     CSS_PATH = "../assets/css/setup.tcss"
     CURRENT_TAB = 1
     
-    def on_button_pressed(self, event: Button.Pressed):
+    async def on_button_pressed(self, event: Button.Pressed):
         """
         Handle the event of a button being pressed.
         
@@ -112,7 +113,8 @@ Press **"Finish"** to end Setup.
             next_tab = tabbed_content.get_tab(next_tab_str)
         
         if event.button.id == "finish-button": # Finish the setup
-            change_user(username, ready=True)
+            await change_user_async(username, ready=True)
+            await flush_async(username) # Make sure everything chosen during setup is on the disk
             
             self.dismiss(True)
         elif event.button.id == "next-button": # Go to the next page, if we can
@@ -137,7 +139,7 @@ Press **"Finish"** to end Setup.
                     password_input.disabled = True
                     confirm_password_input.disabled = True
                     
-                    create_user(username_input.value, password_input.value, True)
+                    await create_user_async(username_input.value, password_input.value, True)
                 elif new_tab_str == "tab-4":
                     tabbed_content.active = "tab-4"
             else: # Back up, back up, back up
@@ -146,25 +148,25 @@ Press **"Finish"** to end Setup.
             container = event.button.parent
             image_path = container.query_one("#image").file_path
             
-            change_user(username, background=image_path)
+            await change_user_async(username, background=image_path)
             
-            details = get_user_details(username)
+            details = await get_user_details_async(username)
             
             if details["theme"].strip() != "":
                 next_tab.disabled = False
         elif event.button.id == "select-light-theme": # Select the light theme
-            change_user(username, theme="light")
+            await change_user_async(username, theme="light")
             
-            details = get_user_details(username)
+            details = await get_user_details_async(username)
             
             self.app.dark = False
             
             if details["desktop_background"].strip() != "":
                 next_tab.disabled = False
         elif event.button.id == "select-dark-theme": # Select the dark theme
-            change_user(username, theme="dark")
+            await change_user_async(username, theme="dark")
             
-            details = get_user_details(username)
+            details = await get_user_details_async(username)
             
             self.app.dark = True
             
@@ -179,6 +181,13 @@ Press **"Finish"** to end Setup.
         
         self.CURRENT_TAB = int(tabbed_content.active[4])
     
+    def on_mount(self):
+        self.validator = SetupFormValidator(self)
+        self.validator.bind()
+    
+    def on_unmount(self):
+        self.validator.unbind()
+    
     def on_input_changed(self, event: Input.Changed):
         """
         Fires when the user types a key inside of a text input.
@@ -189,46 +198,7 @@ Press **"Finish"** to end Setup.
             event (Input.Changed): The event passed by Textual.
         """
         
-        status = self.query_one("#status")
-        self.can_continue = False
-
-        def set_error(message):
-            nonlocal is_error
-            is_error = True
-            status.update(f"[bold red]{message}[/bold red]")
-
-        validations = {
-            "validation_result": lambda: ( not event.validation_result.is_valid,
-                                    event.validation_result.failure_descriptions),
-            "empty_password": lambda: (self.query_one("#password-input").value.strip() == "" or 
-                                    self.query_one("#confirm-password-input").value.strip() == "",
-                                    ["You can't have an empty password!"]),
-            "empty_username": lambda: (self.query_one("#username-input").value.strip() == "",
-                                    ["You can't have an empty username!"]),
-            "password_mismatch": lambda: (event.input.id in ["confirm-password-input", "password-input"] and 
-                                        event.input.value != self.query_one("#confirm-password-input" if event.input.id == "password-input" else "#password-input").value,
-                                        ["Passwords do not match!"]),
-            "username_taken": lambda: (user_exists(self.query_one("#username-input").value),
-                                    ["That username is taken!"])
-        }
-
-        is_error = False
-
-        for _, validation in validations.items():
-            condition, message = validation()
-            if condition and len(message) > 0:
-                set_error(message[0])
-                break
-
-        if not is_error:
-            status.update("")
-            self.can_continue = True
-
-        tabbed_content = self.query_one(TabbedContent)
-        next_tab_str = f"tab-{self.CURRENT_TAB + 1}"
-        next_tab = tabbed_content.get_tab(next_tab_str)
-        next_tab.disabled = not self.can_continue
-        self.can_continue = False
+        self.validator.validate(event)
     
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
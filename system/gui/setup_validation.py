@@ -0,0 +1,144 @@
+from textual.widgets import Input, Static, TabbedContent
+from textual.validation import ValidationResult
+
+from system import users
+from system.jobs import run_blocking, JobPriority, Lane
+
+
+DEBOUNCE_DELAY = 0.3 # How many seconds typing has to pause for before the taken usernames are checked on the disk
+
+
+class UsernameCache:
+    def __init__(self) -> None:
+        """The usernames that are already taken, so checking a username while it's typed doesn't list `home`.
+
+        Users created or changed by this system are added straight away, and the rest are found by `refresh`.
+        """
+
+        self.__names: frozenset[str] = frozenset()
+        self.version = 0 # Goes up whenever the usernames change, so results checked against old usernames can be thrown away
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.__names
+
+    def add(self, username: str):
+        if username not in self.__names:
+            self.__names = self.__names | {username}
+            self.version += 1
+
+    async def refresh(self):
+        """Read the taken usernames again, without blocking the event loop."""
+        names = frozenset(await run_blocking(users.get_users, lane=Lane.IO, priority=JobPriority.HIGH, name="list-usernames"))
+
+        if names != self.__names:
+            self.__names = names
+            self.version += 1
+
+
+# Checked in order, the first one that fails is shown. Each takes the username, password and confirmed password.
+RULES = (
+    (lambda username, password, confirm: password.strip() == "" or confirm.strip() == "", "You can't have an empty password!"),
+    (lambda username, password, confirm: username.strip() == "", "You can't have an empty username!")
+)
+
+
+class SetupFormValidator:
+    def __init__(self, screen) -> None:
+        """Checks the account form of the setup screen as it's typed in.
+
+        The cheap checks run on every key press against cached widgets. Whether the username is
+        taken is checked against a `UsernameCache`, which is only refreshed once typing pauses.
+
+        Args:
+            screen (SetupScreen): The setup screen.
+        """
+
+        self.screen = screen
+        self.usernames = UsernameCache()
+
+        self.__last_values: tuple | None = None
+        self.__last_error: str | None = None
+        self.__last_validation: ValidationResult | None = None
+        self.__timer = None
+
+    def bind(self):
+        """Find the form's widgets. Done once, when the screen is mounted."""
+        self.username_input = self.screen.query_one("#username-input", Input)
+        self.password_input = self.screen.query_one("#password-input", Input)
+        self.confirm_password_input = self.screen.query_one("#confirm-password-input", Input)
+        self.status = self.screen.query_one("#status", Static)
+        self.tabbed_content = self.screen.query_one(TabbedContent)
+
+        users.add_change_listener(self.usernames.add)
+        self.screen.run_worker(self.usernames.refresh(), group="setup-usernames", exclusive=True, exit_on_error=False)
+
+    def unbind(self):
+        users.remove_change_listener(self.usernames.add)
+
+        if self.__timer is not None:
+            self.__timer.stop()
+
+    def check(self, validation_result: ValidationResult | None) -> str | None:
+        """Check the form.
+
+        Args:
+            validation_result (ValidationResult | None): The result of the validators of the input that was last changed.
+
+        Returns:
+            str | None: The first problem with the form, or `None` if there isn't one.
+        """
+
+        values = (self.username_input.value, self.password_input.value, self.confirm_password_input.value, self.usernames.version)
+
+        # Nothing that affects the result has changed since it was last checked
+        if values == self.__last_values and validation_result is self.__last_validation:
+            return self.__last_error
+
+        self.__last_values = values
+        self.__last_validation = validation_result
+        self.__last_error = self.__check(values, validation_result)
+        return self.__last_error
+
+    def __check(self, values: tuple, validation_result: ValidationResult | None) -> str | None:
+        username, password, confirm, _ = values
+
+        if validation_result is not None and not validation_result.is_valid and validation_result.failure_descriptions:
+            return validation_result.failure_descriptions[0]
+
+        for rule, message in RULES:
+            if rule(username, password, confirm):
+                return message
+
+        if password != confirm:
+            return "Passwords do not match!"
+
+        if username in self.usernames:
+            return "That username is taken!"
+
+        return None
+
+    def validate(self, event: Input.Changed):
+        """Check the form after an input was changed, show the result and schedule the username check."""
+        self.apply(self.check(event.validation_result))
+
+        if event.input is self.username_input:
+            if self.__timer is not None:
+                self.__timer.stop()
+            self.__timer = self.screen.set_timer(DEBOUNCE_DELAY, self.__recheck_username)
+
+    def apply(self, error: str | None):
+        self.status.update(f"[bold red]{error}[/bold red]" if error is not None else "")
+
+        next_tab = self.tabbed_content.get_tab(f"tab-{self.screen.CURRENT_TAB + 1}")
+        next_tab.disabled = error is not None
+
+    def __recheck_username(self):
+        self.__timer = None
+        self.screen.run_worker(self.__refresh_and_check(), group="setup-usernames", exclusive=True, exit_on_error=False)
+
+    async def __refresh_and_check(self):
+        # Users can be created outside this screen, so have another look at the disk now typing has paused
+        await self.usernames.refresh()
+
+        if not self.username_input.disabled:
+            self.apply(self.check(self.__last_validation))
@@ -0,0 +1,323 @@
+import asyncio
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from enum import Enum
+from functools import partial
+from itertools import count
+
+
+class JobQueueFullError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(f"The job queue for the \"{args[0]}\" lane is full.")
+
+class ExecutorNotRunningError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__("The job executor has not been started.")
+
+
+class Lane(Enum):
+    THREAD = 1  # Blocking I/O and anything else that releases the GIL
+    PROCESS = 2 # CPU heavy work. Jobs in this lane must be picklable
+    IO = 3      # File reads and writes, kept separate so they don't wait behind other jobs
+
+class JobPriority(Enum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class Job:
+    def __init__(self, func, args: tuple, kwargs: dict, lane: Lane, priority: JobPriority, name: str | None = None) -> None:
+        """A piece of work submitted to the `JobExecutor`. Await a job to get its result.
+
+        Args:
+            func (Callable): The function to run.
+            args (tuple): The positional arguments passed to the function.
+            kwargs (dict): The keyword arguments passed to the function.
+            lane (Lane): Which pool the job runs in.
+            priority (JobPriority): Jobs with a higher priority are started first.
+            name (str | None, optional): A name for the job, shown in the metrics. Defaults to the function's name.
+        """
+
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.priority = priority
+        self.name = name if name is not None else getattr(func, "__name__", repr(func))
+
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+        self.queued_at = time.perf_counter()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def cancel(self) -> bool:
+        """Cancel the job. Jobs that have already started can't be cancelled.
+
+        Returns:
+            bool: Whether the job was cancelled.
+        """
+
+        if self.started_at is not None:
+            return False
+        return self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.future.cancelled()
+
+    @property
+    def wait_time(self) -> float | None:
+        """How many seconds the job spent in the queue."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.queued_at
+
+    @property
+    def run_time(self) -> float | None:
+        """How many seconds the job took to run."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def __await__(self):
+        return self.future.__await__()
+
+    def __str__(self) -> str:
+        return f"(NAME={self.name}, LANE={self.lane.name}, PRIORITY={self.priority.name}, WAIT={self.wait_time}, RUN={self.run_time})"
+
+
+class JobExecutor:
+    def __init__(self, max_queue: int = 256, thread_workers: int = 4, process_workers: int = 2, io_workers: int = 8, history: int = 1000) -> None:
+        """A bounded executor that keeps blocking work off the event loop.
+
+        Args:
+            max_queue (int, optional): How many jobs can wait in each lane before `submit` has to wait for space. Defaults to 256.
+            thread_workers (int, optional): How many threads run jobs in the thread lane. Defaults to 4.
+            process_workers (int, optional): How many processes run jobs in the process lane. Defaults to 2.
+            io_workers (int, optional): How many threads run jobs in the I/O lane. Defaults to 8.
+            history (int, optional): How many finished jobs are kept for the metrics. Defaults to 1000.
+        """
+
+        self.max_queue = max_queue
+        self.workers = {
+            Lane.THREAD: thread_workers,
+            Lane.PROCESS: process_workers,
+            Lane.IO: io_workers
+        }
+
+        self.history: deque[Job] = deque(maxlen=history)
+
+        self.__loop: asyncio.AbstractEventLoop = None
+        self.__queues: dict[Lane, asyncio.PriorityQueue] = {}
+        self.__pools = {}
+        self.__tasks: list[asyncio.Task] = []
+        self.__running: dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.__sequence = count() # Keeps jobs with the same priority in the order they were submitted
+
+    @classmethod
+    def from_config(cls, section) -> "JobExecutor":
+        """Create a job executor from a section of a config file, like `[jobs]` in `boot.ini`.
+
+        Args:
+            section (SectionProxy): The config section.
+
+        Returns:
+            JobExecutor: The job executor.
+        """
+
+        return cls(
+            max_queue=section.getint("max_queue", 256),
+            thread_workers=section.getint("thread_workers", 4),
+            process_workers=section.getint("process_workers", 2),
+            io_workers=section.getint("io_workers", 8)
+        )
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the executor is running on the current event loop."""
+        try:
+            return self.__loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    def start(self):
+        """Start the executor's workers on the running event loop."""
+        self.__loop = asyncio.get_running_loop()
+
+        for lane, workers in self.workers.items():
+            self.__queues[lane] = asyncio.PriorityQueue(self.max_queue)
+
+            for _ in range(workers):
+                self.__tasks.append(self.__loop.create_task(self.__worker(lane)))
+
+    async def shutdown(self):
+        """Stop the executor. Jobs that haven't started yet are cancelled."""
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks.clear()
+
+        for queue in self.__queues.values():
+            while not queue.empty():
+                queue.get_nowait()[2].cancel()
+
+        for pool in self.__pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.__pools.clear()
+
+        self.__loop = None
+
+    def __get_pool(self, lane: Lane):
+        # Pools are only created once they're needed, most sessions never use the process lane.
+        if lane not in self.__pools:
+            if lane == Lane.THREAD:
+                self.__pools[lane] = ThreadPoolExecutor(self.workers[lane], thread_name_prefix="swiftos-job")
+            elif lane == Lane.IO:
+                self.__pools[lane] = ThreadPoolExecutor(self.workers[lane], thread_name_prefix="swiftos-io")
+            else:
+                self.__pools[lane] = ProcessPoolExecutor(self.workers[lane])
+        return self.__pools[lane]
+
+    async def __worker(self, lane: Lane):
+        queue = self.__queues[lane]
+
+        while True:
+            _, _, job = await queue.get()
+
+            if job.cancelled:
+                continue
+
+            job.started_at = time.perf_counter()
+            self.__running[lane] += 1
+
+            try:
+                result = await self.__loop.run_in_executor(self.__get_pool(lane), partial(job.func, *job.args, **job.kwargs))
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                job.finished_at = time.perf_counter()
+                self.__running[lane] -= 1
+                self.history.append(job)
+
+    def __create_job(self, func, args, kwargs, lane: Lane, priority: JobPriority, name: str | None) -> Job:
+        if not self.is_running:
+            raise ExecutorNotRunningError()
+        return Job(func, args, kwargs, lane, priority, name)
+
+    async def submit(self, func, *args, lane: Lane = Lane.THREAD, priority: JobPriority = JobPriority.NORMAL, name: str | None = None, **kwargs) -> Job:
+        """Submit a job, waiting for space if the lane's queue is full.
+
+        Args:
+            func (Callable): The function to run.
+            lane (Lane, optional): Which pool the job runs in. Defaults to Lane.THREAD.
+            priority (JobPriority, optional): Jobs with a higher priority are started first. Defaults to JobPriority.NORMAL.
+            name (str | None, optional): A name for the job, shown in the metrics.
+
+        Returns:
+            Job: The submitted job.
+        """
+
+        job = self.__create_job(func, args, kwargs, lane, priority, name)
+        await self.__queues[lane].put((priority.value, next(self.__sequence), job))
+
+        return job
+
+    def submit_nowait(self, func, *args, lane: Lane = Lane.THREAD, priority: JobPriority = JobPriority.NORMAL, name: str | None = None, **kwargs) -> Job:
+        """Submit a job without waiting.
+
+        Raises:
+            JobQueueFullError: Raised if the lane's queue is full.
+
+        Returns:
+            Job: The submitted job.
+        """
+
+        job = self.__create_job(func, args, kwargs, lane, priority, name)
+
+        try:
+            self.__queues[lane].put_nowait((priority.value, next(self.__sequence), job))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(lane.name)
+
+        return job
+
+    async def run(self, func, *args, lane: Lane = Lane.THREAD, priority: JobPriority = JobPriority.NORMAL, name: str | None = None, **kwargs):
+        """Submit a job and wait for its result.
+
+        Returns:
+            Any: What the function returned.
+        """
+
+        job = await self.submit(func, *args, lane=lane, priority=priority, name=name, **kwargs)
+        return await job
+
+    def get_metrics(self) -> dict[str, dict]:
+        """Get the state of each lane and timings of recently finished jobs.
+
+        Returns:
+            dict[str, dict]: The metrics of each lane, keyed by the lane's name.
+        """
+
+        metrics = {}
+
+        for lane in Lane:
+            finished = [job for job in self.history if job.lane == lane and job.run_time is not None]
+            queue = self.__queues.get(lane)
+
+            metrics[lane.name] = {
+                "queued": queue.qsize() if queue else 0,
+                "running": self.__running[lane],
+                "finished": len(finished),
+                "average_wait": sum(job.wait_time for job in finished) / len(finished) if finished else 0.0,
+                "average_run": sum(job.run_time for job in finished) / len(finished) if finished else 0.0,
+                "slowest": max(finished, key=lambda job: job.run_time).name if finished else None
+            }
+
+        return metrics
+
+
+_executor: JobExecutor | None = None
+
+
+def set_executor(executor: JobExecutor | None):
+    """Set the system-wide job executor. This is done by the boot process."""
+    global _executor
+    _executor = executor
+
+def get_executor() -> JobExecutor | None:
+    """Get the system-wide job executor.
+
+    Returns:
+        JobExecutor | None: The job executor, or `None` if the system hasn't booted yet.
+    """
+
+    return _executor
+
+async def run_blocking(func, *args, lane: Lane = Lane.THREAD, priority: JobPriority = JobPriority.NORMAL, name: str | None = None, **kwargs):
+    """Run a blocking function off the event loop, in the system-wide job executor if it's running.
+
+    Args:
+        func (Callable): The function to run.
+        lane (Lane, optional): Which pool the job runs in. Defaults to Lane.THREAD.
+        priority (JobPriority, optional): Jobs with a higher priority are started first. Defaults to JobPriority.NORMAL.
+        name (str | None, optional): A name for the job, shown in the metrics.
+
+    Returns:
+        Any: What the function returned.
+    """
+
+    if _executor is not None and _executor.is_running:
+        return await _executor.run(func, *args, lane=lane, priority=priority, name=name, **kwargs)
+
+    return await asyncio.to_thread(func, *args, **kwargs)
@@ -0,0 +1,69 @@
+import asyncio
+
+from system import default_programs
+from system.fs import iter_dir, get_file_icon
+from system.stat_cache import StatEntry
+from system.gui.custom_widgets.image import render_image_async
+from system.gui.custom_widgets.icon import ICON_SIZE
+from system.gui.desktop_screen import get_background_size
+
+
+class ProfilePreload:
+    def __init__(self, username: str, user_details: dict) -> None:
+        """Gets a user's desktop ready while the loading screen is showing.
+
+        The background and desktop icons are rendered into the image cache, the desktop is listed
+        and the apps the user opens files with are loaded, all at the same time.
+
+        Args:
+            username (str): The user who is logging in.
+            user_details (dict): Their details.
+        """
+
+        self.username = username
+        self.user_details = user_details
+
+        # What's on the user's desktop, once it has been listed
+        self.desktop_entries: list[StatEntry] | None = None
+
+        self.__tasks: list[asyncio.Task] = []
+
+    def start(self):
+        """Start preloading in the background."""
+        self.__tasks = [
+            asyncio.create_task(self.__render_background()),
+            asyncio.create_task(self.__load_desktop()),
+            asyncio.create_task(self.__warm_programs())
+        ]
+
+    async def wait(self) -> list[BaseException]:
+        """Wait for everything to be preloaded.
+
+        Returns:
+            list[BaseException]: Whatever went wrong. Anything that failed is loaded again when the desktop needs it.
+        """
+
+        results = await asyncio.gather(*self.__tasks, return_exceptions=True)
+        return [result for result in results if isinstance(result, BaseException)]
+
+    async def __render_background(self):
+        background = self.user_details["desktop_background"]
+
+        if background.strip() != "":
+            await render_image_async(background, get_background_size())
+
+    async def __load_desktop(self):
+        desktop_dir = f"home/{self.username}/Desktop"
+        entries = []
+
+        async for batch in iter_dir(desktop_dir):
+            entries.extend(batch)
+
+        self.desktop_entries = entries
+
+        icons = {get_file_icon(entry.path, entry.is_dir) for entry in entries}
+        await asyncio.gather(*(render_image_async(icon, ICON_SIZE) for icon in icons))
+
+    async def __warm_programs(self):
+        programs = default_programs.start_session(self.username, self.user_details)
+        await programs.warm()
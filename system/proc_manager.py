@@ -1,15 +1,31 @@
 import os
+import sys
+import errno
+import signal
+import resource
 import asyncio
-import multiprocessing
-import math
 from random import randint
+from enum import Enum
 
 from system.fs import run
 from system.gui.desktop_screen import Desktop
+from system.util.lazy_import import lazy_import
+
+# Only needed once an app is started
+multiprocessing = lazy_import("multiprocessing")
 
 
 PROC_ID_RANGE = (1000, 9999) # this defines the range of ids prossible
-MAXprocesses = PROC_ID_RANGE[1]-PROC_ID_RANGE[1]+1
+MAXprocesses = PROC_ID_RANGE[1]-PROC_ID_RANGE[0]+1
+
+CGROUP_ROOT = "/sys/fs/cgroup/swiftos" # A delegated cgroup v2 tree for apps, used if it exists and is writable
+CGROUP_CPU_PERIOD = 100000 # Microseconds, the period `cpu_quota` is measured over
+
+SUSPENDED_CPU_QUOTA = 0.05 # The fraction of a CPU each app of a suspended session can use, if cgroups are available
+
+# The ids of the processes registered with every process manager. Each session has its own manager,
+# so ids are unique across all of them, otherwise two sessions' apps would share a cgroup.
+_process_ids: set[int] = set()
 
 
 class MaxProcessesError(Exception):
@@ -25,13 +41,164 @@ class NoProcessFoundError(Exception):
         super().__init__(*args)
 
 
+class ExitReason(Enum):
+    NORMAL = 1
+    ERROR = 2
+    KILLED = 3
+    MEMORY_LIMIT = 4
+    CPU_LIMIT = 5
+    FILE_LIMIT = 6
+
+
+class ResourceLimits:
+    def __init__(self, memory: int | None = None, cpu_time: int | None = None, open_files: int | None = None, nice: int | None = None, cpu_quota: float | None = None) -> None:
+        """The resources a process is allowed to use. `None` means there is no limit.
+
+        Args:
+            memory (int | None, optional): The most memory the process can use, in bytes.
+            cpu_time (int | None, optional): How many seconds of CPU time the process can use.
+            open_files (int | None, optional): How many files the process can have open at once.
+            nice (int | None, optional): How much to lower the priority of the process by, so it doesn't slow down the desktop.
+            cpu_quota (float | None, optional): The fraction of a CPU the process can use. Only applied if cgroups are available.
+        """
+        
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.open_files = open_files
+        self.nice = nice
+        self.cpu_quota = cpu_quota
+        
+    @classmethod
+    def from_config(cls, section) -> "ResourceLimits":
+        """Create resource limits from a section of a config file, like `[limits]` in `boot.ini`.
+
+        Args:
+            section (SectionProxy): The config section. Memory is in megabytes.
+
+        Returns:
+            ResourceLimits: The resource limits.
+        """
+        
+        def get(key, type):
+            value = section.get(key, "").strip()
+            return type(value) if value else None
+        
+        memory = get("memory", int)
+        
+        return cls(
+            memory=memory * 1024 * 1024 if memory else None,
+            cpu_time=get("cpu_time", int),
+            open_files=get("open_files", int),
+            nice=get("nice", int),
+            cpu_quota=get("cpu_quota", float)
+        )
+        
+    def apply(self):
+        """Apply the limits to the current process.
+        
+        ! This is ran in a process's child before the app starts, don't call it in the desktop.
+        """
+        
+        if self.memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory, self.memory))
+        if self.cpu_time is not None:
+            # Going over the soft limit sends SIGXCPU, the hard limit is a backup that sends SIGKILL.
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1))
+        if self.open_files is not None:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (self.open_files, self.open_files))
+        if self.nice:
+            os.nice(self.nice)
+            
+    def create_cgroup(self, name: str) -> str | None:
+        """Create a cgroup v2 group with these limits and move the current process into it.
+
+        Args:
+            name (str): The name of the group.
+
+        Returns:
+            str | None: The path to the group, or `None` if cgroups aren't available.
+        """
+        
+        if not os.path.isdir(CGROUP_ROOT) or not os.access(CGROUP_ROOT, os.W_OK):
+            return None
+        
+        path = os.path.join(CGROUP_ROOT, name)
+        
+        try:
+            os.makedirs(path, exist_ok=True)
+            
+            if self.memory is not None:
+                with open(os.path.join(path, "memory.max"), "w") as f:
+                    f.write(str(self.memory))
+            if self.cpu_quota is not None:
+                with open(os.path.join(path, "cpu.max"), "w") as f:
+                    f.write(f"{int(self.cpu_quota * CGROUP_CPU_PERIOD)} {CGROUP_CPU_PERIOD}")
+                    
+            with open(os.path.join(path, "cgroup.procs"), "w") as f:
+                f.write("0") # "0" means the process writing to the file
+        except OSError:
+            return None
+        
+        return path
+    
+    def __str__(self) -> str:
+        return f"(MEMORY={self.memory}, CPU_TIME={self.cpu_time}, OPEN_FILES={self.open_files}, NICE={self.nice}, CPU_QUOTA={self.cpu_quota})"
+
+
+def get_cgroup_path(process_id: int) -> str:
+    return os.path.join(CGROUP_ROOT, f"process-{process_id}")
+
+def get_exit_reason(exit_code: int, cgroup_path: str | None = None, limit_hit: ExitReason | None = None) -> ExitReason:
+    """Work out why a process exited.
+
+    Args:
+        exit_code (int): The exit code of the process. Negative exit codes are the signal that killed the process.
+        cgroup_path (str | None, optional): The cgroup the process ran in, used to check if it was killed for using too much memory.
+        limit_hit (ExitReason | None, optional): The limit the process's child reported running into, if any.
+            This isn't an exit code, so an app can't be mistaken for running into a limit by what it returns.
+
+    Returns:
+        ExitReason: Why the process exited.
+    """
+    
+    if limit_hit is not None:
+        return limit_hit
+    if exit_code == 0:
+        return ExitReason.NORMAL
+    if exit_code == -signal.SIGXCPU:
+        return ExitReason.CPU_LIMIT
+    
+    if exit_code == -signal.SIGKILL and cgroup_path:
+        try:
+            with open(os.path.join(cgroup_path, "memory.events")) as f:
+                for line in f:
+                    key, value = line.split()
+                    if key == "oom_kill" and int(value) > 0:
+                        return ExitReason.MEMORY_LIMIT
+        except OSError:
+            pass
+    
+    if exit_code < 0:
+        return ExitReason.KILLED
+    return ExitReason.ERROR
+
+
 class Process:    
-    def __init__(self, name: str, file_path: str, process_manager) -> None:
+    def __init__(self, name: str, file_path: str, process_manager, limits: ResourceLimits | None = None) -> None:
         self.process_manager = process_manager
         self._name = name
         self._file = file_path
         
+        self.limits = limits if limits is not None else process_manager.default_limits
+        
         self.__thread: multiprocessing.Process = None
+        self.__exited: asyncio.Future = None
+        
+        # Shared with the process's child, which sets it to the `ExitReason` of a limit it runs into
+        self._limit_hit = None
+        
+        self.exit_code: int | None = None
+        self.exit_reason: ExitReason | None = None
         
         if not os.path.isfile(self._file):
             raise FileNotFoundError(self._file)
@@ -43,6 +210,16 @@ class Process:
         
     def get_thread(self):
         return self.__thread
+    
+    def _get_exited_future(self) -> asyncio.Future:
+        """Get the future that is resolved with the process's exit code once it exits."""
+        if self.__exited is None:
+            self.__exited = asyncio.get_running_loop().create_future()
+        return self.__exited
+    
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None and self.exit_code is None
         
     def __generate_unique_id(self):
         """Generates a random id within the possible range of ids. This function ensures non-duplicates.
@@ -50,25 +227,58 @@ class Process:
         Returns:
             int: The unqiue generated id
         """
-        existingprocesses = self.process_manager.processes
-        
-        if len(existingprocesses) >= (MAXprocesses): # This is so we don't get stuck in an infinite loop
+        if len(_process_ids) >= (MAXprocesses): # This is so we don't get stuck in an infinite loop
             raise MaxProcessesError(f"Reached process limit of {MAXprocesses}")
         
         num = randint(*PROC_ID_RANGE)
-        while num in existingprocesses:
+        while num in _process_ids:
             num = randint(*PROC_ID_RANGE)
             
         self.id = num
         return num
     
     async def start(self, args: list[str] = []):
-        await run(self._file, self.process_manager.desktop, args)
+        return await run(self._file, self.process_manager.desktop, args)
+    
+    def __str__(self) -> str:
+        return f"(NAME={self._name}, ID={self.id}, FILE={self._file}, EXIT_CODE={self.exit_code}, EXIT_REASON={self.exit_reason})"
+
+
+def _process_entry(process: Process, args: list[str]):
+    """The entry point of a process's child. Applies the process's limits, runs the app and exits with its exit code.
+    
+    A limit the app runs into is reported through `process._limit_hit` rather than the exit code, which the app chooses.
+    """
+    if process.limits:
+        process.limits.create_cgroup(os.path.basename(get_cgroup_path(process.id)))
+        process.limits.apply()
+    
+    try:
+        exit_code = asyncio.run(process.start(args))
+    except MemoryError:
+        process._limit_hit.value = ExitReason.MEMORY_LIMIT.value
+        os._exit(1)
+    except OSError as e:
+        if e.errno == errno.EMFILE: # Too many open files
+            process._limit_hit.value = ExitReason.FILE_LIMIT.value
+            os._exit(1)
+        raise
+    
+    sys.exit(exit_code if isinstance(exit_code, int) else 0)
 
 class ProcessManager:
-    def __init__(self, desktop: Desktop) -> None:
+    def __init__(self, desktop: Desktop, default_limits: ResourceLimits | None = None) -> None:
         self.processes: set[Process] = set()
         self.desktop: Desktop = desktop
+        self.default_limits = default_limits
+        
+        # Whether the processes are slowed down, because their user's session is suspended
+        self.is_throttled = False
+        
+        self.__exit_listeners = []
+        
+        # The exit codes of processes that have been reaped, kept until their id is used again so `wait` still works after they exit
+        self.__exit_codes: dict[int, int] = {}
 
     def get_process(self, id: int):
         processes_dict = {process.id: process for process in self.processes}
@@ -77,15 +287,34 @@ class ProcessManager:
         return process
         
     def register_process(self, process: Process):
-        if self.get_process(process.id):
+        if process.id in _process_ids: # Registered here or with another session's manager
             raise ProcessAlreadyRegisteredError()
         self.processes.add(process)
+        _process_ids.add(process.id)
+        self.__exit_codes.pop(process.id, None)
         
         self.desktop.app.log(f"Registered process: {process}")
         
     def __unregister_process(self, id: int):
         process = self.get_process(id)
         self.processes.remove(process)
+        _process_ids.discard(id)
+        
+    def add_exit_listener(self, callback):
+        """Call a function whenever a process exits.
+
+        Args:
+            callback (Callable[[Process, int], Any]): The function to call, it is passed the process and its exit code. The reason it exited is in `process.exit_reason`.
+        """
+        self.__exit_listeners.append(callback)
+        
+    def remove_exit_listener(self, callback):
+        """Stop calling a function added with `add_exit_listener`.
+
+        Args:
+            callback (Callable[[Process, int], Any]): The function to stop calling.
+        """
+        self.__exit_listeners.remove(callback)
         
     async def start(self, id: int, args: list[str] = []):
         process = self.get_process(id)
@@ -94,24 +323,138 @@ class ProcessManager:
             raise NoProcessFoundError(id)
         
         self.desktop.app.log(args, process)
-        _thread = multiprocessing.Process(target=asyncio.run, args=(process.start(args)), daemon=True)
+        process._limit_hit = multiprocessing.Value("i", 0, lock=False) # 0 means no limit was hit
+        
+        _thread = multiprocessing.Process(target=_process_entry, args=(process, args), daemon=True)
         _thread.start()
         
         process._set_thread(_thread)
         
+        # The process's sentinel becomes readable once it exits, so the event loop
+        # tells us when to reap it instead of us polling every process.
+        loop = asyncio.get_running_loop()
+        process._get_exited_future()
+        loop.add_reader(_thread.sentinel, self.__reap, process)
+        
+        if self.is_throttled:
+            self.__set_throttled(process, True)
+        
         self.desktop.app.log(f"Started process: {process}")
         
+    def throttle(self):
+        """Slow down the processes while their user's session is suspended.
+        
+        With cgroups each process is limited to `SUSPENDED_CPU_QUOTA` of a CPU, otherwise it's stopped until `unthrottle` is called.
+        """
+        self.is_throttled = True
+        
+        for process in list(self.processes):
+            if process.is_running:
+                self.__set_throttled(process, True)
+                
+    def unthrottle(self):
+        """Let the processes run at full speed again, when their user's session is resumed."""
+        self.is_throttled = False
+        
+        for process in list(self.processes):
+            if process.is_running:
+                self.__set_throttled(process, False)
+                
+    def __set_throttled(self, process: Process, throttled: bool):
+        cgroup_path = get_cgroup_path(process.id)
+        
+        if os.path.isdir(cgroup_path):
+            quota = SUSPENDED_CPU_QUOTA if throttled else process.limits.cpu_quota if process.limits else None
+            
+            try:
+                with open(os.path.join(cgroup_path, "cpu.max"), "w") as f:
+                    f.write(f"{int(quota * CGROUP_CPU_PERIOD) if quota is not None else 'max'} {CGROUP_CPU_PERIOD}")
+                return
+            except OSError:
+                pass
+        
+        try:
+            os.kill(process.get_thread().pid, signal.SIGSTOP if throttled else signal.SIGCONT)
+        except ProcessLookupError: # It has already exited
+            pass
+        
+    def __reap(self, process: Process):
+        """Collect the exit code of a process that has exited and unregister it."""
+        thread = process.get_thread()
+        
+        asyncio.get_running_loop().remove_reader(thread.sentinel)
+        thread.join()
+        
+        process.exit_code = thread.exitcode
+        thread.close()
+        
+        cgroup_path = get_cgroup_path(process.id)
+        limit_hit = ExitReason(process._limit_hit.value) if process._limit_hit.value else None
+        process.exit_reason = get_exit_reason(process.exit_code, cgroup_path if os.path.isdir(cgroup_path) else None, limit_hit)
+        
+        if os.path.isdir(cgroup_path):
+            try:
+                os.rmdir(cgroup_path)
+            except OSError:
+                pass
+        
+        self.__exit_codes[process.id] = process.exit_code
+        
+        if process in self.processes:
+            self.__unregister_process(process.id)
+        
+        exited = process._get_exited_future()
+        if not exited.done():
+            exited.set_result(process.exit_code)
+        
+        self.desktop.app.log(f"Process exited: {process}")
+        
+        for callback in list(self.__exit_listeners):
+            try:
+                callback(process, process.exit_code)
+            except Exception as e:
+                self.desktop.app.log(f"Process exit listener failed ({callback}): {e}")
+        
+    async def wait(self, id: int) -> int:
+        """Wait for a process to exit.
+
+        Args:
+            id (int): The id of the process.
+
+        Raises:
+            NoProcessFoundError: Raised if there is no process with the id, and no process with the id has exited.
+
+        Returns:
+            int: The exit code of the process. Negative exit codes are the signal that killed the process.
+        """
+        process = self.get_process(id)
+        
+        if not process:
+            if id in self.__exit_codes: # It has already exited and been reaped
+                return self.__exit_codes[id]
+            
+            raise NoProcessFoundError(id)
+        
+        return await asyncio.shield(process._get_exited_future())
+        
     def kill(self, id: int):
         process = self.get_process(id)
+        
+        if not process:
+            raise NoProcessFoundError(id)
+        
         thread = process.get_thread()
         
-        thread.terminate()
-        process._set_thread(None)
-        self.__unregister_process(id)
+        if thread is None or not process.is_running: # It was never started, so there's nothing to reap
+            self.__unregister_process(id)
+        else:
+            thread.terminate() # The process is unregistered once it has been reaped
+            
+            if self.is_throttled: # A stopped process only handles SIGTERM once it's continued
+                self.__set_throttled(process, False)
         
         self.desktop.app.log(f"Killed process: {process}")
         
     @property
     def numprocesses(self) -> int:
         return len(self.processes)
-    
\ No newline at end of file
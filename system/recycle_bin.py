@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+
+from system import stat_cache
+from system.jobs import run_blocking, JobPriority
+from system.util.rand_str import generate_random_string
+from system.util.threads import lower_thread_priority
+
+
+BIN_NAME = "Recycle Bin"
+JOURNAL_NAME = ".journal"
+PURGING_NAME = ".purging"
+
+PURGE_BATCH = 256       # How many files the purger deletes before giving the rest of the system a turn
+PURGE_PAUSE = 0.005     # How many seconds the purger waits between batches
+
+
+class NotInRecycleBinError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(f"\"{args[0]}\" is not in the Recycle Bin.")
+
+class CrossDeviceError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(f"\"{args[0]}\" is on a different drive to the Recycle Bin, and can't be moved into it instantly.")
+
+
+class RecycledItem:
+    def __init__(self, id: str, original_path: str, deleted_at: float, bin_dir: str) -> None:
+        """Something that has been deleted into the Recycle Bin.
+
+        Args:
+            id (str): The id of the item, which is also its file name inside the Recycle Bin.
+            original_path (str): Where the item was before it was deleted.
+            deleted_at (float): When the item was deleted, as a UNIX timestamp.
+            bin_dir (str): The Recycle Bin the item is in.
+        """
+
+        self.id = id
+        self.original_path = original_path
+        self.deleted_at = deleted_at
+        self.path = os.path.join(bin_dir, id)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.original_path)
+
+    def __str__(self) -> str:
+        return f"(ID={self.id}, ORIGINAL={self.original_path}, DELETED_AT={self.deleted_at})"
+
+
+def _delete_tree(path: str, cancelled: threading.Event | None = None):
+    """Delete a file or directory a batch at a time, pausing between batches so the desktop stays responsive."""
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+
+    deleted = 0
+
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files + [dir for dir in dirs if os.path.islink(os.path.join(root, dir))]:
+            try:
+                os.remove(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+
+            deleted += 1
+            if deleted % PURGE_BATCH == 0:
+                if cancelled is not None and cancelled.is_set():
+                    return
+                time.sleep(PURGE_PAUSE)
+
+        for dir in dirs:
+            dir_path = os.path.join(root, dir)
+            if not os.path.islink(dir_path):
+                try:
+                    os.rmdir(dir_path)
+                except FileNotFoundError:
+                    pass
+
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+
+def _get_size(path: str) -> int:
+    if not os.path.isdir(path) or os.path.islink(path):
+        try:
+            return os.lstat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class _Purger:
+    def __init__(self) -> None:
+        """A background thread that permanently deletes things, so the desktop never waits for big deletes."""
+        self.__tasks = queue.Queue()
+        self.__thread: threading.Thread | None = None
+        self.__lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def submit(self, task):
+        """Run a function in the purger thread."""
+        with self.__lock:
+            if self.__thread is None or not self.__thread.is_alive():
+                self.stopping.clear()
+                self.__thread = threading.Thread(target=self.__run, name="swiftos-purger", daemon=True)
+                self.__thread.start()
+
+        self.__tasks.put(task)
+
+    def join(self):
+        """Wait until everything submitted so far has been done."""
+        self.__tasks.join()
+
+    def __run(self):
+        lower_thread_priority()
+
+        while not self.stopping.is_set():
+            task = self.__tasks.get()
+
+            try:
+                task()
+            except Exception:
+                pass
+            finally:
+                self.__tasks.task_done()
+
+_purger = _Purger()
+
+
+class RecycleBin:
+    def __init__(self, username: str, quota: int | None = None) -> None:
+        """A user's Recycle Bin.
+
+        Deleting and restoring are a single rename, so they're instant no matter how big the file is.
+        Permanently deleting happens in the background.
+
+        Args:
+            username (str): The user the Recycle Bin belongs to.
+            quota (int | None, optional): The most bytes the Recycle Bin can hold before the oldest items are permanently deleted. Defaults to no limit.
+        """
+
+        self.username = username
+        self.quota = quota
+
+        self.dir = os.path.abspath(f"home/{username}/Desktop/{BIN_NAME}")
+        self.journal_path = os.path.join(self.dir, JOURNAL_NAME)
+        self.purging_dir = os.path.join(self.dir, PURGING_NAME)
+
+        os.makedirs(self.purging_dir, exist_ok=True)
+
+        self.__lock = threading.RLock()
+        self.__items: dict[str, RecycledItem] = {}
+        self.__journal_entries = 0
+
+        self.__load_journal()
+
+        # Finish purging anything that was being purged when the system last shut down
+        if os.listdir(self.purging_dir):
+            _purger.submit(self.__purge_pending)
+
+    def __load_journal(self):
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: # A torn write at the end of the journal
+                        continue
+
+                    self.__journal_entries += 1
+
+                    if entry["op"] == "delete":
+                        self.__items[entry["id"]] = RecycledItem(entry["id"], entry["original"], entry["deleted_at"], self.dir)
+                    else:
+                        self.__items.pop(entry["id"], None)
+        except FileNotFoundError:
+            pass
+
+        # The journal is written before the rename, so drop items whose rename never happened
+        for id in [id for id, item in self.__items.items() if not os.path.lexists(item.path)]:
+            del self.__items[id]
+
+    def __append_journal(self, entry: dict):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.__journal_entries += 1
+
+        if self.__journal_entries > 64 and self.__journal_entries > len(self.__items) * 4:
+            self.__compact_journal()
+
+    def __compact_journal(self):
+        temp_path = self.journal_path + ".tmp"
+
+        with open(temp_path, "w") as f:
+            for item in self.__items.values():
+                f.write(json.dumps({"op": "delete", "id": item.id, "original": item.original_path, "deleted_at": item.deleted_at}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, self.journal_path)
+        self.__journal_entries = len(self.__items)
+
+    def items(self) -> list[RecycledItem]:
+        """Get everything in the Recycle Bin, oldest first."""
+        with self.__lock:
+            return sorted(self.__items.values(), key=lambda item: item.deleted_at)
+
+    def get_item(self, id: str) -> RecycledItem:
+        with self.__lock:
+            try:
+                return self.__items[id]
+            except KeyError:
+                raise NotInRecycleBinError(id)
+
+    def delete(self, path: str) -> RecycledItem:
+        """Move a file or folder into the Recycle Bin.
+
+        Args:
+            path (str): The file or folder.
+
+        Raises:
+            FileNotFoundError: Raised if the file doesn't exist.
+            CrossDeviceError: Raised if the file isn't on the same drive as the Recycle Bin.
+
+        Returns:
+            RecycledItem: The deleted item, used to restore it.
+        """
+
+        original_path = os.path.abspath(path)
+
+        if os.lstat(original_path).st_dev != os.stat(self.dir).st_dev:
+            raise CrossDeviceError(path)
+
+        with self.__lock:
+            id = f"{time.time_ns()}-{generate_random_string(6)}"
+            item = RecycledItem(id, original_path, time.time(), self.dir)
+
+            self.__append_journal({"op": "delete", "id": id, "original": original_path, "deleted_at": item.deleted_at})
+            os.rename(original_path, item.path)
+
+            self.__items[id] = item
+
+        stat_cache.invalidate(original_path)
+        stat_cache.invalidate(item.path)
+
+        if self.quota is not None:
+            _purger.submit(self.__enforce_quota)
+
+        return item
+
+    async def delete_async(self, path: str) -> RecycledItem:
+        """The same as `delete`, but files on a different drive to the Recycle Bin are moved into it in the background instead of raising `CrossDeviceError`."""
+        try:
+            return self.delete(path)
+        except CrossDeviceError:
+            pass
+
+        original_path = os.path.abspath(path)
+
+        with self.__lock:
+            id = f"{time.time_ns()}-{generate_random_string(6)}"
+            item = RecycledItem(id, original_path, time.time(), self.dir)
+
+            self.__append_journal({"op": "delete", "id": id, "original": original_path, "deleted_at": item.deleted_at})
+
+        await run_blocking(shutil.move, original_path, item.path, priority=JobPriority.LOW, name="recycle_bin.move")
+
+        with self.__lock:
+            self.__items[id] = item
+
+        stat_cache.invalidate(original_path)
+        stat_cache.invalidate(item.path)
+
+        if self.quota is not None:
+            _purger.submit(self.__enforce_quota)
+
+        return item
+
+    def restore(self, id: str) -> str:
+        """Move an item in the Recycle Bin back to where it was deleted from.
+
+        If something else is there now, a number is added to the end of the item's name.
+
+        Args:
+            id (str): The id of the item.
+
+        Raises:
+            NotInRecycleBinError: Raised if the item isn't in the Recycle Bin.
+
+        Returns:
+            str: Where the item was restored to.
+        """
+
+        with self.__lock:
+            item = self.get_item(id)
+
+            os.makedirs(os.path.dirname(item.original_path), exist_ok=True)
+
+            restored_path = item.original_path
+            base, extension = os.path.splitext(item.original_path)
+            copy = 1
+
+            while os.path.lexists(restored_path):
+                restored_path = f"{base} ({copy}){extension}"
+                copy += 1
+
+            os.rename(item.path, restored_path)
+
+            del self.__items[id]
+            self.__append_journal({"op": "restore", "id": id})
+
+        stat_cache.invalidate(restored_path)
+        stat_cache.invalidate(item.path)
+
+        return restored_path
+
+    def purge(self, ids: list[str]):
+        """Permanently delete items in the Recycle Bin. They disappear instantly, and are deleted in the background.
+
+        Args:
+            ids (list[str]): The ids of the items.
+        """
+
+        try:
+            with self.__lock:
+                for id in ids:
+                    item = self.get_item(id)
+
+                    os.rename(item.path, os.path.join(self.purging_dir, id))
+
+                    del self.__items[id]
+                    self.__append_journal({"op": "purge", "id": id})
+
+                    stat_cache.invalidate(item.path)
+        finally: # Even if one of them couldn't be moved, the ones that were are deleted now rather than at the next start up
+            _purger.submit(self.__purge_pending)
+
+    def empty(self):
+        """Permanently delete everything in the Recycle Bin."""
+        self.purge([item.id for item in self.items()])
+
+    def __purge_pending(self):
+        for name in os.listdir(self.purging_dir):
+            _delete_tree(os.path.join(self.purging_dir, name), _purger.stopping)
+
+    def __enforce_quota(self):
+        # Ran in the purger thread, since working out sizes means walking every item
+        items = self.items()
+        sizes = {item.id: _get_size(item.path) for item in items}
+        total = sum(sizes.values())
+
+        oldest = []
+        for item in items:
+            if total <= self.quota:
+                break
+
+            oldest.append(item.id)
+            total -= sizes[item.id]
+
+        if oldest:
+            try:
+                self.purge(oldest)
+            except NotInRecycleBinError: # It was restored while we were working out the sizes
+                pass
+
+    def wait_for_purge(self):
+        """Wait until everything being permanently deleted has been deleted."""
+        _purger.join()
+
+
+_recycle_bins: dict[str, RecycleBin] = {}
+_default_quota: int | None = None
+
+
+def set_default_quota(quota: int | None):
+    """Set the quota of Recycle Bins opened from now on. This is done by the boot process.
+
+    Args:
+        quota (int | None): The most bytes a Recycle Bin can hold, or `None` for no limit.
+    """
+
+    global _default_quota
+    _default_quota = quota
+
+def get_recycle_bin(username: str) -> RecycleBin:
+    """Get a user's Recycle Bin.
+
+    Args:
+        username (str): The user.
+
+    Returns:
+        RecycleBin: Their Recycle Bin.
+    """
+
+    if username not in _recycle_bins:
+        _recycle_bins[username] = RecycleBin(username, _default_quota)
+    return _recycle_bins[username]
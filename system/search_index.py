@@ -0,0 +1,488 @@
+import os
+import re
+import stat
+import time
+import select
+import sqlite3
+import threading
+
+from system import file_types
+from system.jobs import run_blocking, JobPriority, Lane
+from system.recycle_bin import BIN_NAME
+from system.util import inotify
+from system.util.paths import normalize, is_inside, inside
+from system.util.threads import lower_thread_priority
+
+
+SEARCH_INDEX_PATH = "system/cache/search_index.db"
+INDEX_VERSION = 2             # Increased whenever what's stored changes, an index from an older version is rebuilt
+MAX_FILE_SIZE = 1024 * 1024   # Files bigger than this aren't indexed
+INDEX_BATCH = 200             # How many files are indexed between commits
+BATCH_PAUSE = 0.01            # How many seconds the indexer waits between batches, so it doesn't compete with the desktop
+REFRESH_INTERVAL = 300        # How many seconds between full mtime checks, which catch anything inotify missed
+MAX_WATCHES = 4096            # The most directories the indexer watches with inotify
+
+# Files that are never indexed, since anyone who can search could read them. Dotfiles (like `.session`) and the Recycle Bin are skipped too.
+PRIVATE_NAMES = {"user.json"}
+
+_WATCH_MASK = inotify.IN_CLOSE_WRITE | inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_private(relative_path: str) -> bool:
+    """Check if a path, relative to the indexed directory it's in, should be kept out of the index."""
+    parts = relative_path.split(os.sep)
+    return parts[-1] in PRIVATE_NAMES or any(part.startswith(".") or part == BIN_NAME for part in parts)
+
+def to_fts_query(text: str) -> str | None:
+    """Turn what a user typed into a search query. Every word has to match, and the last word can be the start of a word.
+
+    Args:
+        text (str): What the user typed.
+
+    Returns:
+        str | None: The query, or `None` if there are no words to search for.
+    """
+
+    words = _WORD.findall(text)
+    if not words:
+        return None
+
+    terms = [f"\"{word}\"" for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchResult:
+    def __init__(self, path: str, score: float, snippet: str) -> None:
+        """A file that matched a search.
+
+        Args:
+            path (str): The path to the file.
+            score (float): How well the file matched. Lower is better.
+            snippet (str): The part of the file that matched, with matches wrapped in `[b]` and `[/b]`.
+        """
+
+        self.path = path
+        self.score = score
+        self.snippet = snippet
+
+    def __str__(self) -> str:
+        return f"(PATH={self.path}, SCORE={self.score:.2f})"
+
+
+class SearchIndex:
+    def __init__(self, db_path: str = SEARCH_INDEX_PATH) -> None:
+        """A persistent full-text index of the text files in some directories.
+
+        Args:
+            db_path (str, optional): Where the index is stored. Defaults to SEARCH_INDEX_PATH.
+        """
+
+        self.db_path = db_path
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.__lock = threading.RLock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+
+        (version,) = self.__db.execute("PRAGMA user_version").fetchone()
+        if version != INDEX_VERSION:
+            self.__db.executescript("DROP TABLE IF EXISTS roots; DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS docs_text;")
+            self.__db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+        self.__db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS docs  (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime INTEGER NOT NULL, size INTEGER NOT NULL);
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_text USING fts5(name, body, tokenize = 'unicode61');
+        """)
+
+        self.__roots = [path for (path,) in self.__db.execute("SELECT path FROM roots")]
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def roots(self) -> list[str]:
+        with self.__lock:
+            return list(self.__roots)
+
+    def add_root(self, root: str):
+        """Start indexing a directory. Call `refresh` to index what's already in it.
+
+        Args:
+            root (str): The directory.
+        """
+
+        root = normalize(root)
+
+        with self.__lock:
+            self.__db.execute("INSERT OR IGNORE INTO roots VALUES (?)", (root,))
+            self.__db.commit()
+
+            if root not in self.__roots:
+                self.__roots.append(root)
+
+    def is_private(self, path: str) -> bool:
+        """Check if a file is kept out of the index, like `user.json`, dotfiles and the Recycle Bin. See `PRIVATE_NAMES`.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            bool: Whether the file is never indexed.
+        """
+
+        path = normalize(path)
+
+        for root in self.roots():
+            if path == root:
+                return False
+            if is_inside(path, root):
+                return _is_private(os.path.relpath(path, root))
+        return _is_private(os.path.basename(path))
+
+    @staticmethod
+    def __read_text(path: str, size: int) -> str | None:
+        if size > MAX_FILE_SIZE or not file_types.get_file_type(path, sniff=True, is_dir=False).is_text:
+            return None
+
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+
+    def update_path(self, path: str, stat_result: os.stat_result | None = None) -> bool:
+        """Bring a single file up to date in the index. It's added if it's a text file, and removed if it no longer is or no longer exists.
+
+        Args:
+            path (str): The path to the file.
+            stat_result (os.stat_result | None, optional): The file's metadata, if it's already known.
+
+        Returns:
+            bool: Whether the index changed. Changes are committed in `commit` or `refresh`.
+        """
+
+        path = normalize(path)
+
+        if self.is_private(path):
+            return self.remove_path(path)
+
+        try:
+            if stat_result is None:
+                stat_result = os.stat(path)
+            if not stat.S_ISREG(stat_result.st_mode):
+                return self.remove_path(path)
+
+            with self.__lock:
+                row = self.__db.execute("SELECT mtime, size FROM docs WHERE path = ?", (path,)).fetchone()
+            if row == (stat_result.st_mtime_ns, stat_result.st_size):
+                return False
+
+            text = self.__read_text(path, stat_result.st_size)
+        except (FileNotFoundError, NotADirectoryError):
+            return self.remove_path(path)
+        except OSError:
+            return False
+
+        with self.__lock:
+            self.remove_path(path)
+
+            # Files that aren't text are still recorded, so they aren't read again until they change
+            cursor = self.__db.execute("INSERT INTO docs (path, mtime, size) VALUES (?, ?, ?)", (path, stat_result.st_mtime_ns, stat_result.st_size))
+            if text is not None:
+                self.__db.execute("INSERT INTO docs_text (rowid, name, body) VALUES (?, ?, ?)", (cursor.lastrowid, os.path.basename(path), text))
+
+        return True
+
+    def remove_path(self, path: str) -> bool:
+        """Remove a file, or everything inside a directory, from the index.
+
+        Returns:
+            bool: Whether anything was removed.
+        """
+
+        path = normalize(path)
+
+        with self.__lock:
+            condition, params = inside("path", path)
+            ids = [id for (id,) in self.__db.execute(f"SELECT id FROM docs WHERE {condition}", params)]
+
+            self.__db.executemany("DELETE FROM docs_text WHERE rowid = ?", ((id,) for id in ids))
+            self.__db.executemany("DELETE FROM docs WHERE id = ?", ((id,) for id in ids))
+
+        return bool(ids)
+
+    def commit(self):
+        with self.__lock:
+            self.__db.commit()
+
+    def refresh(self, root: str | None = None, cancelled: threading.Event | None = None, pause: float = 0) -> int:
+        """Bring the index up to date. Only files whose mtime or size has changed are read again.
+
+        Args:
+            root (str | None, optional): Only refresh inside this directory. Defaults to every indexed directory.
+            cancelled (threading.Event | None, optional): Stop early when this is set.
+            pause (float, optional): How many seconds to wait between batches. Defaults to 0.
+
+        Returns:
+            int: How many files changed in the index.
+        """
+
+        roots = [normalize(root)] if root is not None else self.roots()
+        changed = 0
+        seen = set()
+
+        for root in roots:
+            for dir, dirs, files in os.walk(root):
+                dirs[:] = [subdir for subdir in dirs if not self.is_private(os.path.join(dir, subdir))]
+
+                for name in files:
+                    if cancelled is not None and cancelled.is_set():
+                        self.commit()
+                        return changed
+
+                    path = normalize(os.path.join(dir, name))
+                    if self.is_private(path): # Not marked as seen, so it's removed if it was indexed before
+                        continue
+                    seen.add(path)
+
+                    if self.update_path(path):
+                        changed += 1
+
+                        if changed % INDEX_BATCH == 0:
+                            self.commit()
+                            time.sleep(pause)
+
+            # Forget files that were deleted
+            with self.__lock:
+                condition, params = inside("path", root)
+                known = [path for (path,) in self.__db.execute(f"SELECT path FROM docs WHERE {condition}", params)]
+
+            for path in known:
+                if path not in seen and self.remove_path(path):
+                    changed += 1
+
+        self.commit()
+        return changed
+
+    def search(self, text: str, limit: int = 20, root: str | None = None) -> list[SearchResult]:
+        """Search the contents and names of the indexed files.
+
+        Args:
+            text (str): What to search for. Files have to contain every word.
+            limit (int, optional): The most results to return. Defaults to 20.
+            root (str | None, optional): Only search files inside this directory, e.g. a user's home.
+
+        Returns:
+            list[SearchResult]: The best matches first.
+        """
+
+        query = to_fts_query(text)
+        if query is None:
+            return []
+
+        # Matches in the file name count for more than matches in the contents
+        sql = """
+            SELECT docs.path, bm25(docs_text, 10.0, 1.0) AS score, snippet(docs_text, 1, '[b]', '[/b]', '...', 12)
+            FROM docs_text JOIN docs ON docs.id = docs_text.rowid
+            WHERE docs_text MATCH ?
+        """
+        params = [query]
+
+        if root is not None:
+            condition, root_params = inside("docs.path", normalize(root))
+            sql += f" AND {condition}"
+            params += root_params
+
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        with self.__lock:
+            try:
+                rows = self.__db.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                return []
+
+        return [SearchResult(path, score, snippet) for path, score, snippet in rows]
+
+
+class SearchIndexer:
+    def __init__(self, index: SearchIndex, roots: list[str]) -> None:
+        """Keeps a search index up to date in a low priority background thread.
+
+        Everything is checked by its mtime when the indexer starts, then changes are picked up
+        from inotify as they happen, with a full check every `REFRESH_INTERVAL` seconds in case any were missed.
+
+        Args:
+            index (SearchIndex): The index to keep up to date.
+            roots (list[str]): The directories to index.
+        """
+
+        self.index = index
+        self.roots = [normalize(root) for root in roots]
+
+        self.__stopping = threading.Event()
+        self.__thread: threading.Thread | None = None
+        self.__inotify: inotify.Inotify | None = None
+        self.__watched: dict[int, str] = {}
+
+        self.ready = threading.Event() # Set once the first full check has finished
+
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        for root in self.roots:
+            self.index.add_root(root)
+
+        self.__stopping.clear()
+        self.__thread = threading.Thread(target=self.__run, name="swiftos-search-indexer", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopping.set()
+
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __watch_tree(self, root: str):
+        if self.__inotify is None:
+            return
+
+        for dir, dirs, _ in os.walk(root):
+            if len(self.__watched) >= MAX_WATCHES:
+                return
+
+            dirs[:] = [subdir for subdir in dirs if not self.index.is_private(os.path.join(dir, subdir))]
+
+            try:
+                self.__watched[self.__inotify.add_watch(dir, _WATCH_MASK)] = normalize(dir)
+            except OSError:
+                continue
+
+    def __handle_events(self):
+        changed = set()
+        new_dirs = []
+
+        for event in self.__inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW: # We missed some events, so check everything
+                self.index.refresh(cancelled=self.__stopping, pause=BATCH_PAUSE)
+                return
+
+            dir = self.__watched.get(event.wd)
+            if dir is None:
+                continue
+
+            if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_IGNORED):
+                self.__watched.pop(event.wd, None)
+                continue
+
+            path = normalize(os.path.join(dir, event.name))
+
+            if self.index.is_private(path):
+                continue
+
+            if os.path.isdir(path):
+                new_dirs.append(path)
+            else:
+                changed.add(path)
+
+        for path in changed:
+            self.index.update_path(path)
+
+        for dir in new_dirs:
+            self.__watch_tree(dir)
+            self.index.refresh(dir, self.__stopping, BATCH_PAUSE)
+
+        self.index.commit()
+
+    def __run(self):
+        lower_thread_priority()
+
+        if inotify.is_available():
+            try:
+                self.__inotify = inotify.Inotify()
+            except OSError:
+                self.__inotify = None
+
+        for root in self.roots:
+            self.__watch_tree(root)
+
+        try:
+            last_refresh = time.monotonic()
+            self.index.refresh(cancelled=self.__stopping, pause=BATCH_PAUSE)
+            self.ready.set()
+
+            while not self.__stopping.is_set():
+                if self.__inotify is not None:
+                    readable, _, _ = select.select([self.__inotify.fileno()], [], [], 1)
+                    if readable:
+                        self.__handle_events()
+                else:
+                    self.__stopping.wait(1)
+
+                if time.monotonic() - last_refresh >= REFRESH_INTERVAL:
+                    self.index.refresh(cancelled=self.__stopping, pause=BATCH_PAUSE)
+                    last_refresh = time.monotonic()
+        finally:
+            if self.__inotify is not None:
+                self.__inotify.close()
+                self.__inotify = None
+            self.__watched.clear()
+
+
+_search_index: SearchIndex | None = None
+_search_index_lock = threading.Lock()
+_indexer: SearchIndexer | None = None
+
+
+def get_search_index() -> SearchIndex:
+    """Get the system's search index, opening it if it isn't open yet.
+
+    Returns:
+        SearchIndex: The search index.
+    """
+
+    global _search_index
+
+    with _search_index_lock:
+        if _search_index is None:
+            _search_index = SearchIndex()
+        return _search_index
+
+def start_indexer(roots: list[str]) -> SearchIndexer:
+    """Start keeping the system's search index up to date in the background. This is done by the boot process.
+
+    Args:
+        roots (list[str]): The directories to index, e.g. `["home"]`.
+
+    Returns:
+        SearchIndexer: The indexer.
+    """
+
+    global _indexer
+
+    if _indexer is None or not _indexer.is_running:
+        _indexer = SearchIndexer(get_search_index(), roots)
+        _indexer.start()
+    return _indexer
+
+def search(username: str, text: str, limit: int = 20) -> list[SearchResult]:
+    """Search the contents and names of a user's files. Only their home folder is searched, never other users'.
+
+    Args:
+        username (str): The user who is searching.
+        text (str): What to search for. See `SearchIndex.search`.
+        limit (int, optional): The most results to return. Defaults to 20.
+
+    Returns:
+        list[SearchResult]: The best matches first.
+    """
+    return get_search_index().search(text, limit, f"home/{username}")
+
+async def search_async(username: str, text: str, limit: int = 20) -> list[SearchResult]:
+    """The same as `search`, but runs the query off the event loop."""
+    return await run_blocking(search, username, text, limit, lane=Lane.IO, priority=JobPriority.HIGH, name="search")
@@ -0,0 +1,294 @@
+import os
+import json
+import asyncio
+
+from textual.widgets import Static
+
+from system import fs, default_programs
+from system.jobs import run_blocking, JobPriority
+from system.app_loader import find_app_path, get_app_name
+from system.gui.custom_widgets.window import Window
+
+
+SESSION_FILE = ".session" # Kept in the user's home folder
+SESSION_VERSION = 1
+
+RESTORED = "restored"
+MINIMIZED = "minimized"
+MAXIMISED = "maximised"
+
+# Windows are found by comparing the desktop before and after their app runs, so only one is opened at a time
+_realise_lock = asyncio.Lock()
+
+# The desktops whose sessions are saved when the system shuts down
+_desktops = []
+
+
+def get_session_path(username: str) -> str:
+    return os.path.join("home", username, SESSION_FILE)
+
+
+class WindowState:
+    def __init__(self, app: str, args: list[str], title: str, position: list[int], size: list[int], state: str = RESTORED, focused: bool = False) -> None:
+        """What a window looked like when its user's session was saved, so it can be opened again next time they log in.
+
+        Args:
+            app (str): The path to the app that made the window.
+            args (list[str]): The arguments the app was run with.
+            title (str): The window's title.
+            position (list[int]): Where the window was.
+            size (list[int]): How many characters wide and tall the window was.
+            state (str, optional): `RESTORED`, `MINIMIZED` or `MAXIMISED`. Defaults to RESTORED.
+            focused (bool, optional): Whether it was the selected window. Defaults to False.
+        """
+
+        self.app = app
+        self.args = args
+        self.title = title
+        self.position = position
+        self.size = size
+        self.state = state
+        self.focused = focused
+
+    @classmethod
+    def from_window(cls, window: Window, focused: bool = False) -> "WindowState | None":
+        """Record a window on the desktop.
+
+        Returns:
+            WindowState | None: The window's state, or `None` if it wasn't made by an app (e.g. a dialog).
+        """
+
+        if isinstance(window, PlaceholderWindow): # It was never opened, so save it as it was restored
+            state = window.state
+            return cls(state.app, state.args, state.title, [int(value) for value in window.position], state.size, state.state, focused)
+
+        app = find_app_path(type(window).__module__)
+        if app is None:
+            return None
+
+        if window.is_maximised:
+            state = MAXIMISED
+        elif window.is_minimized:
+            state = MINIMIZED
+        else:
+            state = RESTORED
+
+        args = [arg for arg in window.ARGS if isinstance(arg, str)]
+        return cls(os.path.relpath(app), args, window.title, [int(value) for value in window.position], list(window.window_size), state, focused)
+
+    def to_json(self) -> list:
+        return [self.app, self.args, self.title, self.position, self.size, self.state, self.focused]
+
+    @classmethod
+    def from_json(cls, data: list) -> "WindowState":
+        app, args, title, position, size, state, focused = data
+        return cls(app, list(args), title, list(position), list(size), state, bool(focused))
+
+    def apply(self, window: Window):
+        """Move and resize a newly opened window to where this one was."""
+        window.position = list(self.position)
+        window.window_size = list(self.size)
+
+        window.styles.width = self.size[0]
+        window.styles.height = self.size[1] if window.no_title_bar else self.size[1] + 1
+        window.styles.offset = tuple(self.position)
+
+        if self.state == MAXIMISED:
+            window.call_after_refresh(window.maximize_animation)
+
+
+class PlaceholderWindow(Window):
+    DEFAULT_CSS = """
+    PlaceholderWindow #placeholder {
+        width: 100%;
+        height: 100%;
+        content-align: center middle;
+    }
+    """
+
+    def __init__(self, state: WindowState) -> None:
+        """Stands in for a window from the user's last session until it's seen or selected, so logging in doesn't have to open every app.
+
+        Args:
+            state (WindowState): The window it stands in for.
+        """
+
+        super().__init__(title=state.title, size=list(state.size), start_position=list(state.position))
+
+        self.state = state
+        self.is_minimized = state.state == MINIMIZED
+        self.__realising = False
+
+    def on_mount(self):
+        if self.is_minimized:
+            self.styles.width = 0
+            self.styles.height = 0
+            self.styles.offset = (0, 0)
+
+    def on_ready(self):
+        yield Static(f"[dim]Opening {get_app_name(self.state.app)}..[/dim]", id="placeholder")
+
+    def on_show(self):
+        self.realise_if_seen()
+
+    def on_resize(self):
+        self.realise_if_seen()
+
+    def realise_if_seen(self):
+        """Open the app this window stands in for if any of it is on screen. Minimized windows and windows off screen wait until they're seen or selected."""
+        if not self.is_attached or self.is_minimized or self.state.focused: # The selected window is opened by `restore_session`
+            return
+
+        region = self.region # Empty until it has been laid out
+        if region and self.screen.region.overlaps(region):
+            self.screen.run_worker(self.realise(), group="session", exit_on_error=False)
+
+    def set_as_primary(self):
+        super().set_as_primary()
+        self.screen.run_worker(self.realise(), group="session", exit_on_error=False)
+
+    def normal_size_animation(self):
+        pass # It's replaced by the real window when it's selected
+
+    async def realise(self):
+        """Open the app this window stands in for and put its window where this one is."""
+        if self.__realising or not self.is_attached:
+            return
+        self.__realising = True
+
+        desktop = self.screen
+
+        try: # Load the app in the background while the placeholder is still showing
+            await run_blocking(default_programs.get_program_cache(desktop.logged_in_user).get_entry_point, self.state.app, priority=JobPriority.LOW, name="restore-window")
+        except Exception: # `fs.run` tells the user
+            pass
+
+        async with _realise_lock:
+            if self.is_attached:
+                await self.__replace(desktop)
+
+    async def __replace(self, desktop):
+        windows = desktop.windows
+        window_bar = desktop.query_one("#window-bar")
+
+        siblings = list(windows.children)
+        index = siblings.index(self)
+        above = siblings[index + 1] if index + 1 < len(siblings) else None
+        was_selected = desktop.selected_window is self
+
+        if was_selected:
+            desktop.selected_window = None
+
+        # The real window has the same title, so it takes over this one's tab on the window bar
+        await self.remove()
+
+        if self.state.state == MINIMIZED: # Selecting a minimized window shows it
+            self.state.state = RESTORED
+
+        try:
+            await fs.run(self.state.app, desktop, list(self.state.args))
+        except Exception as e: # The app is broken, the user can open it again themselves
+            desktop.app.log(f"Failed to restore window ({self.state.title}): {e}")
+            return
+
+        for new_window in windows.children:
+            if not isinstance(new_window, Window) or new_window in siblings:
+                continue
+
+            self.state.apply(new_window)
+
+            if new_window.title != self.title: # The app named its window differently, so it has its own tab
+                await window_bar.remove_pane(desktop.window_title_to_id(self.title))
+
+            if above is not None and above.parent is windows:
+                windows.move_child(new_window, before=above)
+            if was_selected:
+                new_window.call_after_refresh(desktop.select_window, new_window)
+
+
+def save_session(desktop):
+    """Save the windows on a desktop, so they are opened again the next time its user logs in.
+
+    Args:
+        desktop (Desktop): The desktop.
+    """
+
+    states = []
+
+    for child in desktop.windows.children: # Bottom to top
+        if isinstance(child, Window):
+            state = WindowState.from_window(child, child is desktop.selected_window)
+            if state is not None:
+                states.append(state)
+
+    data = json.dumps({"version": SESSION_VERSION, "windows": [state.to_json() for state in states]}, separators=(",", ":"))
+
+    try:
+        fs.write_atomic_sync(get_session_path(desktop.logged_in_user), data)
+    except OSError: # The user was deleted
+        pass
+
+def add_desktop(desktop):
+    """Save a desktop's session when the system shuts down."""
+    if desktop not in _desktops:
+        _desktops.append(desktop)
+
+def remove_desktop(desktop):
+    if desktop in _desktops:
+        _desktops.remove(desktop)
+
+def save_all():
+    """Save the sessions of every open desktop. This is done when the system shuts down."""
+    for desktop in list(_desktops):
+        save_session(desktop)
+
+async def load_session(username: str) -> list[WindowState]:
+    """Read the windows a user had open when their last session was saved, bottom to top.
+
+    Args:
+        username (str): The user.
+
+    Returns:
+        list[WindowState]: The windows, or nothing if the session file is missing or broken.
+    """
+
+    try:
+        data = json.loads(await fs.read_text(get_session_path(username)))
+
+        if data.get("version") != SESSION_VERSION:
+            return []
+        return [WindowState.from_json(window) for window in data["windows"]]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return []
+
+def realise_seen(desktop):
+    """Open the apps of the placeholder windows on a desktop that have come into view, e.g. after the terminal was resized."""
+    for child in desktop.windows.children:
+        if isinstance(child, PlaceholderWindow):
+            child.realise_if_seen()
+
+async def restore_session(desktop):
+    """Put the windows from a user's last session back on their desktop.
+
+    Placeholders are shown straight away, and the selected window's app is opened first. The rest
+    are opened when they're first shown on screen, and minimized windows only when they're selected.
+
+    Args:
+        desktop (Desktop): The desktop.
+    """
+
+    states = await load_session(desktop.logged_in_user)
+    if not states:
+        return
+
+    window_bar = desktop.query_one("#window-bar")
+    placeholders = [PlaceholderWindow(state) for state in states]
+
+    for placeholder in placeholders:
+        await desktop.add_to_window_bar(placeholder, window_bar)
+    await desktop.windows.mount_all(placeholders)
+
+    focused = next((placeholder for placeholder in placeholders if placeholder.state.focused), None)
+    if focused is not None:
+        desktop.select_window(focused)
+        await focused.realise()
@@ -0,0 +1,353 @@
+import os
+import stat
+import time
+import asyncio
+import threading
+
+from collections import OrderedDict
+
+from system.util import inotify
+
+
+DEFAULT_TTL = 2.0          # How many seconds cached entries are trusted for
+WATCHED_TTL = 60.0         # How many seconds entries of directories watched with inotify are trusted for
+MAX_WATCHES = 256          # The most directories watched with inotify at once
+MAX_PATHS = 4096           # The most paths cached outside of directory listings, the least recently used are forgotten first
+
+
+class StatEntry:
+    __slots__ = ("name", "path", "is_dir", "is_file", "is_symlink", "__stat")
+
+    def __init__(self, name: str, path: str, is_dir: bool, is_file: bool, is_symlink: bool = False, stat_result: os.stat_result | None = None) -> None:
+        """The cached metadata of a file or directory.
+
+        Args:
+            name (str): The name of the file.
+            path (str): The absolute path to the file.
+            is_dir (bool): Whether the file is a directory.
+            is_file (bool): Whether the file is a regular file.
+            is_symlink (bool, optional): Whether the file is a symbolic link.
+            stat_result (os.stat_result | None, optional): The result of `os.stat`, if it is already known. Otherwise it is fetched when it's needed.
+        """
+
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.is_file = is_file
+        self.is_symlink = is_symlink
+        self.__stat = stat_result
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry) -> "StatEntry":
+        # On Linux these come from the directory listing itself, so they don't cost a syscall per file
+        try:
+            is_dir = entry.is_dir()
+            is_file = entry.is_file()
+        except OSError:
+            is_dir = is_file = False
+
+        return cls(entry.name, os.path.abspath(entry.path), is_dir, is_file, entry.is_symlink())
+
+    @classmethod
+    def from_stat(cls, path: str, stat_result: os.stat_result) -> "StatEntry":
+        return cls(
+            os.path.basename(path), path,
+            stat.S_ISDIR(stat_result.st_mode), stat.S_ISREG(stat_result.st_mode),
+            stat_result=stat_result
+        )
+
+    def stat(self) -> os.stat_result:
+        """Get the full metadata of the file (size, mtime, etc.). This is only fetched the first time it's needed."""
+        if self.__stat is None:
+            self.__stat = os.stat(self.path)
+        return self.__stat
+
+    @property
+    def size(self) -> int:
+        return self.stat().st_size
+
+    @property
+    def mtime(self) -> float:
+        return self.stat().st_mtime
+
+    def __str__(self) -> str:
+        return f"(PATH={self.path}, DIR={self.is_dir}, FILE={self.is_file})"
+
+
+class StatCache:
+    def __init__(self, ttl: float = DEFAULT_TTL, use_inotify: bool = True) -> None:
+        """A cache of file metadata, so the GUI doesn't stat the same files over and over.
+
+        Whole directories are listed with a single `os.scandir`, and kept until they expire or
+        inotify says they have changed.
+
+        Args:
+            ttl (float, optional): How many seconds cached entries are trusted for. Defaults to DEFAULT_TTL.
+            use_inotify (bool, optional): Whether to use inotify to notice changes sooner. Defaults to True.
+        """
+
+        self.ttl = ttl
+
+        # Directory path -> (time it was listed, entries by name)
+        self.__dirs: dict[str, tuple[float, dict[str, StatEntry]]] = {}
+        # Path -> (time it was checked, entry or `None` if it doesn't exist), least recently used first. Used for paths whose directory isn't listed.
+        self.__paths: OrderedDict[str, tuple[float, StatEntry | None]] = OrderedDict()
+
+        self.__lock = threading.RLock()
+
+        self.__inotify: inotify.Inotify | None = None
+        self.__watched: dict[str, int] = {}
+        self.__reader_loop: asyncio.AbstractEventLoop | None = None
+
+        if use_inotify and inotify.is_available():
+            try:
+                self.__inotify = inotify.Inotify()
+            except OSError:
+                self.__inotify = None
+
+    def __is_fresh(self, loaded_at: float, dir: str) -> bool:
+        ttl = WATCHED_TTL if dir in self.__watched else self.ttl
+        return time.monotonic() - loaded_at < ttl
+
+    def __process_events(self):
+        if self.__inotify is None:
+            return
+
+        for event in self.__inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW: # We missed some events, so nothing can be trusted
+                self.invalidate()
+                continue
+
+            dir = self.__inotify.watches.get(event.wd)
+            if dir is None:
+                dir = next((path for path, wd in self.__watched.items() if wd == event.wd), None)
+            if dir is None:
+                continue
+
+            with self.__lock:
+                if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_IGNORED):
+                    self.__unwatch(dir)
+
+                self.__dirs.pop(dir, None)
+                self.__paths.pop(os.path.join(dir, event.name), None)
+
+    def __watch(self, dir: str):
+        if self.__inotify is None or dir in self.__watched:
+            return
+
+        if len(self.__watched) >= MAX_WATCHES:
+            self.__unwatch(next(iter(self.__watched))) # Stop watching the directory that has been watched the longest
+
+        try:
+            self.__watched[dir] = self.__inotify.add_watch(dir)
+        except OSError:
+            return
+
+        # Handle events as they arrive if we're on an event loop, otherwise they are handled before each lookup
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None and self.__reader_loop is None:
+            loop.add_reader(self.__inotify.fileno(), self.__process_events)
+            self.__reader_loop = loop
+
+    def __unwatch(self, dir: str):
+        wd = self.__watched.pop(dir, None)
+        if wd is not None and self.__inotify is not None:
+            try:
+                self.__inotify.remove_watch(wd)
+            except OSError:
+                pass
+
+    def __remember(self, path: str, loaded_at: float, entry: StatEntry | None):
+        self.__paths[path] = (loaded_at, entry)
+        self.__paths.move_to_end(path)
+
+        while len(self.__paths) > MAX_PATHS:
+            self.__paths.popitem(last=False)
+
+    def __sync(self):
+        if self.__reader_loop is not None and self.__reader_loop.is_closed():
+            self.__reader_loop = None
+
+        # Without an event loop reading inotify for us, read any waiting events now
+        if self.__inotify is not None and self.__reader_loop is None:
+            self.__process_events()
+
+    def scan_dir(self, dir: str) -> list[StatEntry]:
+        """List a directory, using the cached listing if it's still fresh.
+
+        Args:
+            dir (str): The directory.
+
+        Raises:
+            FileNotFoundError: Raised if the directory doesn't exist.
+            NotADirectoryError: Raised if the path isn't a directory.
+
+        Returns:
+            list[StatEntry]: The entries inside the directory.
+        """
+
+        dir = os.path.abspath(dir)
+
+        with self.__lock:
+            self.__sync()
+
+            cached = self.__dirs.get(dir)
+            if cached and self.__is_fresh(cached[0], dir):
+                return list(cached[1].values())
+
+            loaded_at = time.monotonic()
+
+            with os.scandir(dir) as entries:
+                listing = {entry.name: StatEntry.from_dir_entry(entry) for entry in entries}
+
+            self.__dirs[dir] = (loaded_at, listing)
+            self.__watch(dir)
+
+            return list(listing.values())
+
+    def prefetch(self, dirs: list[str]):
+        """List several directories at once, so lookups of the files inside them don't touch the disk.
+
+        Args:
+            dirs (list[str]): The directories. Directories that don't exist are skipped.
+        """
+
+        for dir in dirs:
+            try:
+                self.scan_dir(dir)
+            except OSError:
+                continue
+
+    def store(self, entries: list[StatEntry]):
+        """Cache entries that were listed somewhere else, e.g. by `fs.iter_dir`, so looking them up doesn't stat them again.
+
+        Args:
+            entries (list[StatEntry]): The entries.
+        """
+
+        loaded_at = time.monotonic()
+
+        with self.__lock:
+            self.__sync()
+
+            for entry in entries:
+                self.__remember(entry.path, loaded_at, entry)
+                self.__watch(os.path.dirname(entry.path))
+
+    def get(self, path: str) -> StatEntry | None:
+        """Get the metadata of a file.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            StatEntry | None: The file's metadata, or `None` if it doesn't exist.
+        """
+
+        path = os.path.abspath(path)
+        dir, name = os.path.split(path)
+
+        with self.__lock:
+            self.__sync()
+
+            listed = self.__dirs.get(dir)
+            if listed:
+                if self.__is_fresh(listed[0], dir):
+                    return listed[1].get(name)
+                del self.__dirs[dir]
+
+            checked = self.__paths.get(path)
+            if checked:
+                if self.__is_fresh(checked[0], dir):
+                    self.__paths.move_to_end(path)
+                    return checked[1]
+                del self.__paths[path]
+
+            loaded_at = time.monotonic()
+
+            try:
+                entry = StatEntry.from_stat(path, os.stat(path))
+            except (FileNotFoundError, NotADirectoryError):
+                entry = None
+
+            self.__remember(path, loaded_at, entry)
+            return entry
+
+    def exists(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        entry = self.get(path)
+        return entry is not None and entry.is_dir
+
+    def isfile(self, path: str) -> bool:
+        entry = self.get(path)
+        return entry is not None and entry.is_file
+
+    def invalidate(self, path: str | None = None):
+        """Forget cached metadata.
+
+        Args:
+            path (str | None, optional): The directory or file to forget. Defaults to forgetting everything.
+        """
+
+        with self.__lock:
+            if path is None:
+                self.__dirs.clear()
+                self.__paths.clear()
+                return
+
+            path = os.path.abspath(path)
+
+            self.__dirs.pop(path, None)
+            self.__dirs.pop(os.path.dirname(path), None)
+
+            for cached in [cached for cached in self.__paths if cached == path or os.path.dirname(cached) == path]:
+                del self.__paths[cached]
+
+    def close(self):
+        with self.__lock:
+            if self.__inotify is not None:
+                if self.__reader_loop is not None and not self.__reader_loop.is_closed():
+                    self.__reader_loop.remove_reader(self.__inotify.fileno())
+                self.__inotify.close()
+                self.__inotify = None
+
+            self.__reader_loop = None
+            self.__watched.clear()
+
+
+_stat_cache = StatCache()
+
+
+def get_stat_cache() -> StatCache:
+    """Get the system-wide stat cache."""
+    return _stat_cache
+
+def scan_dir(dir: str) -> list[StatEntry]:
+    return _stat_cache.scan_dir(dir)
+
+def prefetch(dirs: list[str]):
+    _stat_cache.prefetch(dirs)
+
+def store(entries: list[StatEntry]):
+    _stat_cache.store(entries)
+
+def get(path: str) -> StatEntry | None:
+    return _stat_cache.get(path)
+
+def exists(path: str) -> bool:
+    return _stat_cache.exists(path)
+
+def isdir(path: str) -> bool:
+    return _stat_cache.isdir(path)
+
+def isfile(path: str) -> bool:
+    return _stat_cache.isfile(path)
+
+def invalidate(path: str | None = None):
+    _stat_cache.invalidate(path)
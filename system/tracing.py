@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import asyncio
+import inspect
+import threading
+
+from functools import wraps
+from contextlib import contextmanager
+
+
+MAX_EVENTS = 100000 # Recording stops after this many spans, so a trace that is never finished can't use up memory
+TRACE_PREFIX = "boot-"
+
+
+class Tracer:
+    def __init__(self) -> None:
+        """Records how long things take as nested spans, in the Chrome trace event format (open it in `chrome://tracing` or ui.perfetto.dev).
+
+        Spans on the event loop are recorded on a track per task, and spans in worker threads on a track per thread,
+        so spans that run at the same time don't overlap on the same track.
+        """
+
+        self.recording = True
+
+        self.__start = time.perf_counter()
+        self.__events: list[dict] = []
+        self.__tracks: dict[tuple, int] = {}
+        self.__lock = threading.Lock()
+
+    def __get_track(self) -> int:
+        thread = threading.current_thread()
+
+        try:
+            task = asyncio.current_task()
+        except RuntimeError: # No event loop in this thread
+            task = None
+
+        key = (thread.ident, task)
+
+        with self.__lock:
+            track = self.__tracks.get(key)
+
+            if track is None:
+                track = len(self.__tracks) + 1
+                self.__tracks[key] = track
+
+                name = thread.name if task is None else f"{thread.name}: {task.get_name()}"
+                self.__events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": track, "args": {"name": name}})
+
+        return track
+
+    def record(self, name: str, category: str, start: float, end: float, args: dict | None = None):
+        """Record a span that has finished.
+
+        Args:
+            name (str): What was done.
+            category (str): The kind of thing that was done, e.g. "boot" or "compose".
+            start (float): When it started, from `time.perf_counter`.
+            end (float): When it finished, from `time.perf_counter`.
+            args (dict | None, optional): Extra details shown with the span.
+        """
+
+        if not self.recording:
+            return
+
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.__start) * 1000000, 3), # Microseconds
+            "dur": round((end - start) * 1000000, 3),
+            "pid": os.getpid(),
+            "tid": self.__get_track()
+        }
+        if args:
+            event["args"] = args
+
+        with self.__lock:
+            if len(self.__events) >= MAX_EVENTS:
+                self.recording = False
+                return
+
+            self.__events.append(event)
+
+    def stop(self):
+        """Stop recording. Spans that finish afterwards are ignored."""
+        self.recording = False
+
+    def get_events(self) -> list[dict]:
+        with self.__lock:
+            return list(self.__events)
+
+    def summarize(self) -> list[tuple[str, int, float, float]]:
+        """Add up the spans with the same name.
+
+        Returns:
+            list[tuple[str, int, float, float]]: The name, number of calls, total milliseconds and longest milliseconds of each kind of span, sorted by name.
+        """
+
+        totals: dict[str, list] = {}
+
+        for event in self.get_events():
+            if event["ph"] != "X":
+                continue
+
+            total = totals.setdefault(event["name"], [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += event["dur"] / 1000
+            total[2] = max(total[2], event["dur"] / 1000)
+
+        return [(name, calls, total_ms, max_ms) for name, (calls, total_ms, max_ms) in sorted(totals.items())]
+
+    def format_summary(self) -> str:
+        """Format the summary as a plain text table, so the tables of two boots can be diffed."""
+        rows = self.summarize()
+        width = max([len(name) for name, *_ in rows] + [len("span")])
+
+        lines = [f"{'span':<{width}}  {'calls':>6}  {'total ms':>10}  {'max ms':>10}"]
+        lines += [f"{name:<{width}}  {calls:>6}  {total_ms:>10.2f}  {max_ms:>10.2f}" for name, calls, total_ms, max_ms in rows]
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, dir: str, keep: int | None = None) -> str:
+        """Write the trace and its summary table to a folder.
+
+        Args:
+            dir (str): The folder.
+            keep (int | None, optional): How many traces to keep in the folder, the oldest are deleted. Defaults to all of them.
+
+        Returns:
+            str: The path to the trace. The summary is next to it, ending in `.summary.txt`.
+        """
+
+        os.makedirs(dir, exist_ok=True)
+
+        name = TRACE_PREFIX + time.strftime("%Y%m%d-%H%M%S")
+        trace_path = os.path.join(dir, name + ".json")
+
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": self.get_events(), "displayTimeUnit": "ms"}, f, separators=(",", ":"))
+        with open(os.path.join(dir, name + ".summary.txt"), "w") as f:
+            f.write(self.format_summary())
+
+        if keep is not None:
+            traces = sorted(file for file in os.listdir(dir) if file.startswith(TRACE_PREFIX) and file.endswith(".json"))
+
+            for old in traces[:-keep] if keep > 0 else traces:
+                for path in (old, old[:-len(".json")] + ".summary.txt"):
+                    try:
+                        os.remove(os.path.join(dir, path))
+                    except FileNotFoundError:
+                        pass
+
+        return trace_path
+
+
+# Boot is traced from the moment the system starts, whether the trace is saved is decided once `boot.ini` has been read
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+def set_tracer(tracer: Tracer):
+    global _tracer
+    _tracer = tracer
+
+
+@contextmanager
+def span(name: str, category: str = "boot", **args):
+    """Time a block of code, e.g. `with span("Parse config"):`.
+
+    Args:
+        name (str): What the block does.
+        category (str, optional): The kind of thing the block does. Defaults to "boot".
+        **args: Extra details shown with the span.
+    """
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _tracer.record(name, category, start, time.perf_counter(), args)
+
+def traced(name: str | None = None, category: str = "boot"):
+    """Time every call of a function, including async functions and generators (like `compose`).
+
+    Args:
+        name (str | None, optional): The name of the span. Defaults to the function's qualified name.
+        category (str, optional): The kind of thing the function does. Defaults to "boot".
+    """
+
+    def decorator(func):
+        span_name = name if name is not None else func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not _tracer.recording:
+                    return await func(*args, **kwargs)
+                with span(span_name, category):
+                    return await func(*args, **kwargs)
+        elif inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _tracer.recording:
+                    return (yield from func(*args, **kwargs))
+                with span(span_name, category):
+                    return (yield from func(*args, **kwargs))
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _tracer.recording:
+                    return func(*args, **kwargs)
+                with span(span_name, category):
+                    return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
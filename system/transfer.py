@@ -0,0 +1,383 @@
+import os
+import time
+import errno
+import stat
+import shutil
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from system import stat_cache
+
+
+CHUNK_SIZE = 8 * 1024 * 1024     # How many bytes are copied between checks for cancellation and progress updates
+FALLBACK_CHUNK_SIZE = shutil.COPY_BUFSIZE
+PROGRESS_INTERVAL = 0.1          # The least number of seconds between progress events
+TRANSFER_WORKERS = 4             # How many files are copied at once
+
+# Errors that mean an in-kernel copy isn't supported between these files, so a slower method has to be used
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM}
+
+
+class TransferCancelledError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__("The transfer was cancelled.")
+
+
+class TransferKind(Enum):
+    COPY = 1
+    MOVE = 2
+
+
+class TransferProgress:
+    def __init__(self, total_files: int = 0, total_bytes: int = 0) -> None:
+        """How far along a transfer is. A new one is given to each progress event, so it's safe to keep.
+
+        Args:
+            total_files (int, optional): How many files are being transferred.
+            total_bytes (int, optional): How many bytes are being transferred.
+        """
+
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.done_bytes = 0
+        self.current_file: str | None = None
+        self.elapsed = 0.0
+        self.throughput = 0.0  # Bytes per second since the last progress event
+        self.finished = False
+
+    @property
+    def average_throughput(self) -> float:
+        """Bytes per second since the transfer started."""
+        return self.done_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def percent(self) -> float:
+        if self.total_bytes == 0:
+            return 100.0 if self.finished else 0.0
+        return self.done_bytes / self.total_bytes * 100
+
+    def copy(self) -> "TransferProgress":
+        progress = TransferProgress(self.total_files, self.total_bytes)
+        progress.__dict__.update(self.__dict__)
+        return progress
+
+    def __str__(self) -> str:
+        return f"(FILES={self.done_files}/{self.total_files}, BYTES={self.done_bytes}/{self.total_bytes}, THROUGHPUT={self.throughput:.0f}B/s)"
+
+
+class _Plan:
+    def __init__(self) -> None:
+        self.dirs: list[tuple[str, str]] = []              # (source, destination), parents before children
+        self.files: list[tuple[str, str, int]] = []        # (source, destination, size)
+        self.links: list[tuple[str, str]] = []             # (source, destination)
+        self.renamed: list[tuple[str, str]] = []           # Moves that were done with a single rename
+        self.moved_sources: list[str] = []                 # Moves that are done by copying, then deleting the source
+
+
+def _check_regular(path: str, path_stat: os.stat_result):
+    # Opening a named pipe, socket or device could block a worker forever, so like `shutil` they aren't copied
+    if not stat.S_ISREG(path_stat.st_mode):
+        raise shutil.SpecialFileError(f"\"{path}\" is a named pipe, socket or device, so it can't be transferred.")
+
+def _scan(source: str, destination: str) -> tuple[list, list, list]:
+    dirs, files, links = [], [], []
+
+    with os.scandir(source) as entries:
+        for entry in entries:
+            target = os.path.join(destination, entry.name)
+
+            if entry.is_symlink():
+                links.append((entry.path, target))
+            elif entry.is_dir(follow_symlinks=False):
+                dirs.append((entry.path, target))
+            else:
+                entry_stat = entry.stat(follow_symlinks=False)
+                _check_regular(entry.path, entry_stat)
+                files.append((entry.path, target, entry_stat.st_size))
+
+    return dirs, files, links
+
+
+class Transfer:
+    def __init__(self, sources: list[str], destination: str, kind: TransferKind = TransferKind.COPY, on_progress=None, overwrite: bool = False, workers: int = TRANSFER_WORKERS, progress_interval: float = PROGRESS_INTERVAL) -> None:
+        """Copies or moves files and folders into a folder, without blocking the event loop.
+
+        Files are copied inside the kernel with `os.copy_file_range` or `os.sendfile` when they
+        can be, and moves on the same drive are a single rename.
+
+        Args:
+            sources (list[str]): The files and folders to transfer.
+            destination (str): The folder they're transferred into.
+            kind (TransferKind, optional): Whether to copy or move. Defaults to TransferKind.COPY.
+            on_progress (Callable[[TransferProgress], Any] | None, optional): Called on the event loop as the transfer progresses, at most once every `progress_interval` seconds.
+            overwrite (bool, optional): Whether to replace files that already exist in the destination. Defaults to False.
+            workers (int, optional): How many files are copied at once. Defaults to TRANSFER_WORKERS.
+            progress_interval (float, optional): The least number of seconds between progress events. Defaults to PROGRESS_INTERVAL.
+        """
+
+        self.sources = [os.path.abspath(source) for source in sources]
+        self.destination = os.path.abspath(destination)
+        self.kind = kind
+        self.on_progress = on_progress
+        self.overwrite = overwrite
+        self.workers = workers
+        self.progress_interval = progress_interval
+
+        self.progress = TransferProgress()
+
+        self.__cancelled = threading.Event()
+        self.__lock = threading.Lock()
+        self.__started_at = 0.0
+        self.__last_report = (0.0, 0) # (time, bytes done) of the last progress event
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+    def cancel(self):
+        """Stop the transfer. Files that were partly copied are removed, and moved files that weren't finished are left where they were."""
+        self.__cancelled.set()
+
+    def __check_cancelled(self):
+        if self.__cancelled.is_set():
+            raise TransferCancelledError()
+
+    def __add_progress(self, done_bytes: int = 0, done_files: int = 0, current_file: str | None = None):
+        with self.__lock:
+            self.progress.done_bytes += done_bytes
+            self.progress.done_files += done_files
+            if current_file is not None:
+                self.progress.current_file = current_file
+
+    def __report(self, finished: bool = False):
+        now = time.perf_counter()
+
+        with self.__lock:
+            last_time, last_bytes = self.__last_report
+
+            self.progress.elapsed = now - self.__started_at
+            if now > last_time:
+                self.progress.throughput = (self.progress.done_bytes - last_bytes) / (now - last_time)
+            self.progress.finished = finished
+            self.__last_report = (now, self.progress.done_bytes)
+
+            progress = self.progress.copy()
+
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    def __check_destination(self, path: str):
+        if os.path.lexists(path) and not self.overwrite:
+            raise FileExistsError(errno.EEXIST, "The file already exists", path)
+
+    def __plan(self, pool: ThreadPoolExecutor) -> _Plan:
+        plan = _Plan()
+        destination_dev = os.stat(self.destination).st_dev
+        to_scan = []
+
+        for source in self.sources:
+            self.__check_cancelled()
+
+            target = os.path.join(self.destination, os.path.basename(source))
+            if target == source:
+                raise shutil.SameFileError(f"\"{source}\" is already in \"{self.destination}\".")
+            if os.path.isdir(source) and not os.path.islink(source) and (self.destination + os.sep).startswith(source + os.sep):
+                raise ValueError(f"\"{source}\" can't be transferred into itself.")
+
+            self.__check_destination(target)
+            source_stat = os.lstat(source)
+
+            if self.kind == TransferKind.MOVE and source_stat.st_dev == destination_dev:
+                plan.renamed.append((source, target))
+                continue
+
+            if self.kind == TransferKind.MOVE:
+                plan.moved_sources.append(source)
+
+            if stat.S_ISLNK(source_stat.st_mode):
+                plan.links.append((source, target))
+            elif stat.S_ISDIR(source_stat.st_mode):
+                plan.dirs.append((source, target))
+                to_scan.append((source, target))
+            else:
+                _check_regular(source, source_stat)
+                plan.files.append((source, target, source_stat.st_size))
+
+        # Each level of the trees is scanned in parallel
+        while to_scan:
+            self.__check_cancelled()
+            results = list(pool.map(lambda dirs: _scan(*dirs), to_scan))
+            to_scan = []
+
+            for dirs, files, links in results:
+                plan.dirs.extend(dirs)
+                plan.files.extend(files)
+                plan.links.extend(links)
+                to_scan.extend(dirs)
+
+        if not self.overwrite:
+            for _, target, _ in plan.files:
+                self.__check_destination(target)
+
+        return plan
+
+    def __copy_file(self, source: str, target: str, size: int):
+        self.__check_cancelled()
+        self.__add_progress(current_file=source)
+
+        try:
+            with open(source, "rb") as source_file, open(target, "wb") as target_file:
+                source_fd, target_fd = source_file.fileno(), target_file.fileno()
+                copied = self.__copy_in_kernel(source_fd, target_fd, size)
+
+                if copied < size:
+                    # The kernel couldn't copy this file, fall back to reading and writing it ourselves
+                    source_file.seek(copied)
+                    target_file.seek(copied)
+
+                    while chunk := source_file.read(FALLBACK_CHUNK_SIZE):
+                        self.__check_cancelled()
+                        target_file.write(chunk)
+                        self.__add_progress(len(chunk))
+
+            shutil.copystat(source, target)
+        except BaseException:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+            raise
+
+        self.__add_progress(done_files=1)
+
+    def __copy_in_kernel(self, source_fd: int, target_fd: int, size: int) -> int:
+        copied = 0
+
+        methods = [self.__sendfile]
+        if hasattr(os, "copy_file_range"): # Linux only, and needs Python 3.8+
+            methods.insert(0, self.__copy_file_range)
+
+        for copy in methods:
+            try:
+                while copied < size:
+                    self.__check_cancelled()
+
+                    sent = copy(source_fd, target_fd, copied, min(CHUNK_SIZE, size - copied))
+                    if sent == 0:
+                        break
+
+                    copied += sent
+                    self.__add_progress(sent)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+
+            if copied >= size:
+                break
+
+        return copied
+
+    @staticmethod
+    def __copy_file_range(source_fd: int, target_fd: int, offset: int, count: int) -> int:
+        return os.copy_file_range(source_fd, target_fd, count, offset, offset)
+
+    @staticmethod
+    def __sendfile(source_fd: int, target_fd: int, offset: int, count: int) -> int:
+        os.lseek(target_fd, offset, os.SEEK_SET)
+        return os.sendfile(target_fd, source_fd, offset, count)
+
+    def __transfer(self) -> TransferProgress:
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="swiftos-transfer") as pool:
+            plan = self.__plan(pool)
+
+            with self.__lock:
+                self.progress.total_files = len(plan.files) + len(plan.links) + len(plan.renamed)
+                self.progress.total_bytes = sum(size for _, _, size in plan.files)
+
+            for source, target in plan.renamed:
+                self.__check_cancelled()
+
+                if self.overwrite and os.path.isdir(target) and not os.path.islink(target):
+                    shutil.rmtree(target)
+                os.replace(source, target)
+
+                self.__add_progress(done_files=1, current_file=source)
+
+            for _, target in plan.dirs:
+                os.makedirs(target, exist_ok=True)
+
+            for source, target in plan.links:
+                self.__check_cancelled()
+
+                if os.path.lexists(target):
+                    os.remove(target)
+                os.symlink(os.readlink(source), target)
+
+                self.__add_progress(done_files=1, current_file=source)
+
+            # Biggest files first, so one big file doesn't end up copying on its own at the end
+            files = sorted(plan.files, key=lambda file: file[2], reverse=True)
+            copies = [pool.submit(self.__copy_file, *file) for file in files]
+
+            try:
+                for copy in copies:
+                    copy.result()
+            except BaseException:
+                self.__cancelled.set()
+                for copy in copies:
+                    copy.cancel()
+                raise
+
+            # Directory times are copied last, since copying files into them changes them
+            for source, target in reversed(plan.dirs):
+                shutil.copystat(source, target)
+
+            for source in plan.moved_sources:
+                if os.path.isdir(source) and not os.path.islink(source):
+                    shutil.rmtree(source)
+                else:
+                    os.remove(source)
+
+        for source in self.sources:
+            stat_cache.invalidate(source)
+        stat_cache.invalidate(self.destination)
+
+        return self.progress
+
+    async def run(self) -> TransferProgress:
+        """Run the transfer.
+
+        Raises:
+            TransferCancelledError: Raised if the transfer was cancelled.
+            FileExistsError: Raised if something being transferred already exists in the destination, and `overwrite` is False.
+            shutil.SpecialFileError: Raised if something being transferred is a named pipe, socket or device. Nothing is transferred.
+
+        Returns:
+            TransferProgress: The final progress of the transfer.
+        """
+
+        loop = asyncio.get_running_loop()
+        self.__started_at = time.perf_counter()
+        self.__last_report = (self.__started_at, 0)
+
+        transfer = loop.run_in_executor(None, self.__transfer)
+
+        try:
+            # Progress is reported from here rather than the copying threads, so the event loop gets one event per interval however fast files are copied
+            while True:
+                done, _ = await asyncio.wait({transfer}, timeout=self.progress_interval)
+                if done:
+                    break
+                self.__report()
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+        transfer.result()
+
+        self.__report(finished=True)
+        return self.progress.copy()
@@ -0,0 +1,208 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+USER_DB_PATH = "system/cache/users.db"
+
+
+class UserDatabase:
+    def __init__(self, db_path: str = USER_DB_PATH, home: str = "home") -> None:
+        """An index of the users on the system, so finding and listing users doesn't list `home` or read every `user.json`.
+
+        The users' `user.json` files are still where their details are kept. The database is brought
+        up to date whenever `home` or a user's `user.json` changes, and whenever the `users` module
+        changes a user's details, before they're written.
+
+        Args:
+            db_path (str, optional): Where the database is stored. Defaults to USER_DB_PATH.
+            home (str, optional): The folder the users' home folders are in. Defaults to "home".
+        """
+
+        self.db_path = db_path
+        self.home = home
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.__lock = threading.RLock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        self.__db.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS users (
+                name TEXT PRIMARY KEY,
+                ready INTEGER NOT NULL,
+                admin INTEGER NOT NULL,
+                valid INTEGER NOT NULL,  -- Whether the user has a user.json that could be read
+                mtime INTEGER,           -- Of their user.json, when it was last read
+                size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS users_by_ready ON users (ready, name);
+            CREATE INDEX IF NOT EXISTS users_by_admin ON users (admin, name);
+        """)
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __stat_user(self, name: str) -> tuple[int | None, int | None]:
+        try:
+            stat_result = os.stat(os.path.join(self.home, name, "user.json"))
+        except OSError:
+            return (None, None)
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def __refresh_user(self, name: str, known: tuple[int | None, int | None] | None) -> bool:
+        # Only read a user.json again if it changed since it was last read
+        if known is not None and self.__stat_user(name) == known:
+            return False
+
+        self.__db.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?)", self.__read_user(name))
+        return True
+
+    def __read_user(self, name: str) -> tuple:
+        path = os.path.join(self.home, name, "user.json")
+
+        try:
+            stat_result = os.stat(path)
+
+            with open(path, "r") as f:
+                details = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return (name, 0, 0, 0, None, None)
+
+        return (name, int(bool(details.get("ready"))), int(bool(details.get("isAdmin"))), 1, stat_result.st_mtime_ns, stat_result.st_size)
+
+    def sync(self, name: str | None = None):
+        """Bring the database up to date with `home`, and with users' `user.json` files.
+
+        Finding added or removed users is a single `stat` of `home`. Editing a file inside a user's
+        folder doesn't change `home`, so each `user.json` is checked with a `stat` too.
+
+        Args:
+            name (str | None, optional): Only check this user's `user.json`. Defaults to checking everyone's.
+        """
+
+        try:
+            mtime = os.stat(self.home).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        with self.__lock:
+            row = self.__db.execute("SELECT value FROM meta WHERE key = 'home_mtime'").fetchone()
+
+            if row is not None and row[0] == mtime:
+                if name is None:
+                    known = self.__db.execute("SELECT name, mtime, size FROM users").fetchall()
+                else:
+                    known = self.__db.execute("SELECT name, mtime, size FROM users WHERE name = ?", (name,)).fetchall()
+
+                changed = [self.__refresh_user(user, (file_mtime, size)) for user, file_mtime, size in known]
+                if any(changed):
+                    self.__db.commit()
+                return
+
+            names = set(os.listdir(self.home)) if mtime is not None else set()
+            known = {user: (file_mtime, size) for user, file_mtime, size in self.__db.execute("SELECT name, mtime, size FROM users")}
+
+            self.__db.executemany("DELETE FROM users WHERE name = ?", ((user,) for user in known.keys() - names))
+
+            for user in names:
+                self.__refresh_user(user, known.get(user))
+
+            self.__db.execute("INSERT OR REPLACE INTO meta VALUES ('home_mtime', ?)", (mtime,))
+            self.__db.commit()
+
+    def update(self, name: str, details: dict, stat_result: os.stat_result | None = None):
+        """Record a user's details when they're changed, and again after they have been written.
+
+        Args:
+            name (str): The user.
+            details (dict): Their details.
+            stat_result (os.stat_result | None, optional): The metadata of their `user.json` after it was written. Defaults to
+                the metadata of the `user.json` that's there now, so the change isn't undone by reading it before it's written.
+        """
+
+        file_mtime, size = (stat_result.st_mtime_ns, stat_result.st_size) if stat_result is not None else self.__stat_user(name)
+
+        with self.__lock:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO users VALUES (?, ?, ?, 1, ?, ?)",
+                (name, int(bool(details.get("ready"))), int(bool(details.get("isAdmin"))), file_mtime, size)
+            )
+            self.__db.commit()
+
+    def exists(self, name: str) -> bool:
+        self.sync(name)
+
+        with self.__lock:
+            return self.__db.execute("SELECT 1 FROM users WHERE name = ?", (name,)).fetchone() is not None
+
+    def is_ready(self, name: str) -> bool | None:
+        """Check whether a user has finished setting up their account.
+
+        Returns:
+            bool | None: Whether the user is ready, or `None` if the user doesn't exist.
+        """
+
+        self.sync(name)
+
+        with self.__lock:
+            row = self.__db.execute("SELECT ready FROM users WHERE name = ?", (name,)).fetchone()
+        return bool(row[0]) if row is not None else None
+
+    def __where(self, ready: bool | None, admin: bool | None) -> tuple[str, list]:
+        conditions = []
+        params = []
+
+        if ready is not None:
+            conditions.append("ready = ?")
+            params.append(int(ready))
+        if admin is not None:
+            conditions.append("admin = ?")
+            params.append(int(admin))
+
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def count(self, ready: bool | None = None, admin: bool | None = None) -> int:
+        """Count the users.
+
+        Args:
+            ready (bool | None, optional): Only count users who have (or haven't) finished setting up their account.
+            admin (bool | None, optional): Only count users who are (or aren't) admins.
+
+        Returns:
+            int: How many users there are.
+        """
+
+        self.sync()
+        where, params = self.__where(ready, admin)
+
+        with self.__lock:
+            return self.__db.execute(f"SELECT COUNT(*) FROM users{where}", params).fetchone()[0]
+
+    def page(self, offset: int = 0, limit: int | None = None, ready: bool | None = None, admin: bool | None = None) -> list[str]:
+        """Get some of the users' names, in alphabetical order.
+
+        Args:
+            offset (int, optional): How many users to skip. Defaults to 0.
+            limit (int | None, optional): The most users to return. Defaults to all of them.
+            ready (bool | None, optional): Only include users who have (or haven't) finished setting up their account.
+            admin (bool | None, optional): Only include users who are (or aren't) admins.
+
+        Returns:
+            list[str]: The users' names.
+        """
+
+        self.sync()
+        where, params = self.__where(ready, admin)
+
+        with self.__lock:
+            rows = self.__db.execute(
+                f"SELECT name FROM users{where} ORDER BY name LIMIT ? OFFSET ?",
+                params + [limit if limit is not None else -1, offset]
+            )
+            return [name for (name,) in rows]
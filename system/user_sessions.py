@@ -0,0 +1,251 @@
+from system import users, default_programs, recycle_bin
+from system.preload import ProfilePreload
+from system.proc_manager import ProcessManager, ResourceLimits
+from system.gui.desktop_screen import Desktop
+from system.util.lazy_import import lazy_import
+
+# Only needed when switching users
+login_screen = lazy_import("system.gui.login_screen")
+
+
+MEMINFO_PATH = "/proc/meminfo"
+MEMORY_CHECK_INTERVAL = 30 # Seconds between checks of how much memory is left, if `low_memory` is set
+
+
+def get_available_memory() -> int | None:
+    """Get how many bytes of memory can be used without swapping.
+
+    Returns:
+        int | None: The available memory, or `None` if it can't be found out on this system.
+    """
+
+    try:
+        with open(MEMINFO_PATH) as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024 # It's in kilobytes
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+
+class UserSession:
+    def __init__(self, username: str, desktop: Desktop, process_manager: ProcessManager) -> None:
+        """A logged in user, with their own desktop and processes.
+
+        Args:
+            username (str): The user.
+            desktop (Desktop): Their desktop.
+            process_manager (ProcessManager): The manager of the apps they started.
+        """
+
+        self.username = username
+        self.desktop = desktop
+        self.process_manager = process_manager
+
+    @property
+    def screen_name(self) -> str:
+        return f"desktop-{self.username}"
+
+    @property
+    def is_suspended(self) -> bool:
+        return self.desktop.is_suspended
+
+    def suspend(self):
+        """Pause the session while another user is using the computer."""
+        self.desktop.suspend()
+        self.process_manager.throttle()
+
+    def resume(self):
+        self.process_manager.unthrottle()
+        self.desktop.resume()
+
+    def drop_caches(self):
+        """Free what can be loaded again later. Only done to suspended sessions, when the computer is low on memory."""
+        if self.desktop.caches_dropped:
+            return
+
+        self.desktop.drop_caches()
+        default_programs.get_program_cache(self.username).invalidate()
+
+    def __str__(self) -> str:
+        return f"(USER={self.username}, SUSPENDED={self.is_suspended}, PROCESSES={self.process_manager.numprocesses})"
+
+
+class SessionManager:
+    def __init__(self, app, limits: ResourceLimits | None = None, low_memory: int | None = None, on_ready=None) -> None:
+        """Keeps every logged in user's desktop in memory, so switching between users is a screen swap rather than logging in again.
+
+        Only one session is active at a time, the rest are suspended: their timers are paused and their apps are throttled.
+
+        Args:
+            app (SwiftOS): The app.
+            limits (ResourceLimits | None, optional): The default resource limits of each session's processes.
+            low_memory (int | None, optional): When there are fewer bytes of memory available than this, the caches of suspended sessions are dropped. Defaults to never.
+            on_ready (Callable[[Desktop], ComposeResult] | None, optional): Adds widgets to each new desktop, see `Desktop.on_ready`.
+        """
+
+        self.app = app
+        self.limits = limits
+        self.low_memory = low_memory
+        self.on_ready = on_ready
+
+        self.sessions: dict[str, UserSession] = {}
+        self.active: UserSession | None = None
+
+        if low_memory is not None:
+            app.set_interval(MEMORY_CHECK_INTERVAL, self.check_memory)
+
+    def get_session(self, username: str) -> UserSession | None:
+        return self.sessions.get(username)
+
+    async def open(self, username: str, preload: ProfilePreload | None = None) -> UserSession:
+        """Start a session for a user, or get their session if they're already logged in. The session isn't shown until it's switched to.
+
+        Args:
+            username (str): The user.
+            preload (ProfilePreload | None, optional): Their profile, if it's already being preloaded.
+
+        Returns:
+            UserSession: The session.
+        """
+
+        if username in self.sessions:
+            return self.sessions[username]
+
+        # Opening the Recycle Bin finishes any purge that was interrupted last time, in the background
+        recycle_bin.get_recycle_bin(username)
+
+        if preload is None:
+            preload = ProfilePreload(username, await users.get_user_details_async(username))
+            preload.start()
+
+        for failure in await preload.wait():
+            self.app.log(f"Failed to preload ({username}): {failure}")
+
+        if username in self.sessions: # It was opened while we were waiting
+            return self.sessions[username]
+
+        desktop = Desktop(username, preload.desktop_entries)
+        if self.on_ready is not None:
+            desktop.on_ready = self.on_ready
+        desktop.session_manager = self
+
+        user_session = UserSession(username, desktop, ProcessManager(desktop, self.limits))
+
+        self.app.install_screen(desktop, user_session.screen_name)
+        self.sessions[username] = user_session
+
+        self.app.log(f"Opened session: {user_session}")
+        return user_session
+
+    async def switch_to(self, username: str) -> UserSession:
+        """Show a user's session, suspending the one that was being used. The user is logged in if they aren't already.
+
+        Args:
+            username (str): The user.
+
+        Returns:
+            UserSession: Their session.
+        """
+
+        user_session = await self.open(username)
+
+        if user_session is self.active:
+            return user_session
+
+        previous = self.active
+
+        if previous is not None:
+            previous.suspend()
+        user_session.resume()
+
+        await self.__apply_theme(username)
+
+        if previous is not None and self.app.screen is previous.desktop:
+            await self.app.switch_screen(user_session.screen_name)
+        else:
+            await self.app.push_screen(user_session.screen_name)
+
+        self.active = user_session
+        self.app.log(f"Switched to session: {user_session}")
+
+        self.check_memory()
+        return user_session
+
+    async def __apply_theme(self, username: str):
+        theme = (await users.get_user_details_async(username))["theme"]
+        self.app.dark = theme != "light"
+
+    async def close(self, username: str):
+        """Log a user out: save their windows, stop their apps and free their desktop.
+
+        Args:
+            username (str): The user.
+
+        Raises:
+            ValueError: Raised if it's the active session, switch to another user first.
+        """
+
+        user_session = self.sessions.get(username)
+
+        if user_session is None:
+            return
+        if user_session is self.active:
+            raise ValueError("The active session can't be closed, switch to another user first.")
+
+        del self.sessions[username]
+
+        user_session.desktop.save_session()
+
+        for process in list(user_session.process_manager.processes):
+            user_session.process_manager.kill(process.id)
+
+        default_programs.get_program_cache(username).invalidate()
+
+        self.app.uninstall_screen(user_session.screen_name)
+        await user_session.desktop.remove()
+
+        self.app.log(f"Closed session: {user_session}")
+
+    async def switch_user(self, log_out: bool = False):
+        """Show the login form and switch to whoever logs in. This has to be ran in a worker.
+        
+        The form can be cancelled, which goes back to the session that was being used.
+
+        Args:
+            log_out (bool, optional): Close the session that was being used, if someone else logs in. Defaults to False.
+        """
+
+        previous = self.active
+
+        login = login_screen.LoginScreen()
+        login_form = login_screen.LoginForm(login, cancellable=previous is not None)
+
+        await self.app.push_screen(login)
+        username = await self.app.push_screen_wait(login_form)
+        self.app.pop_screen()
+
+        if username is None: # Cancelled, the form shows each user's theme so put back the current one
+            await self.__apply_theme(previous.username)
+            return
+
+        await self.switch_to(username)
+
+        if log_out and previous is not None and previous is not self.active:
+            await self.close(previous.username)
+
+    def check_memory(self):
+        """Drop the caches of suspended sessions if the computer is low on memory."""
+        if self.low_memory is None:
+            return
+
+        available = get_available_memory()
+        if available is None or available >= self.low_memory:
+            return
+
+        for user_session in self.sessions.values():
+            if user_session.is_suspended:
+                self.app.log(f"Low on memory ({available} bytes available), dropping caches: {user_session}")
+                user_session.drop_caches()
@@ -1,8 +1,18 @@
 import os
 import json
+import atexit
+import threading
+
+from types import MappingProxyType
 
 from rich_pixels import Pixels
-from hashlib import sha256
+
+from system import stat_cache, fs, auth
+from system.jobs import run_blocking, JobPriority, Lane
+from system.user_db import UserDatabase
+
+
+WRITE_DELAY = 0.5 # How many seconds changes to a user are held for, so several changes are written at once
 
 
 class UserDoesntExistError(Exception):
@@ -22,6 +32,27 @@ class CorruptedUserError(Exception):
         super().__init__(f"The user \"{args[0]}\" is corrupted (their user.json is formatted incorrectly), please recreate this user.")
 
 
+# Functions called with a username whenever that user is created or their details are changed
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """Call a function whenever a user is created or their details are changed.
+
+    Args:
+        listener (Callable[[str], Any]): The function, called with the username.
+    """
+    
+    _change_listeners.append(listener)
+
+def remove_change_listener(listener):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def _notify_changed(username: str):
+    for listener in list(_change_listeners):
+        listener(username)
+
 def get_backgrounds():
     backgrounds = []
     
@@ -31,8 +62,8 @@ def get_backgrounds():
     return backgrounds
 
 def get_user_icon(username: str) -> str: 
-    if os.path.isdir(f"home/{username}"):
-        if os.path.isfile(f"home/{username}/user.png"):
+    if stat_cache.isdir(f"home/{username}"):
+        if stat_cache.isfile(f"home/{username}/user.png"):
             return f"home/{username}/user.png"
         else:
             return "system/assets/images/user/default_user.png"
@@ -45,23 +76,229 @@ def get_user_background(username: str) -> str:
     
     return background
 
-def get_user_details(username: str):
+def _parse_user_details(username: str, contents: str):
+    try:
+        return json.loads(contents)
+    except json.JSONDecodeError:
+        raise CorruptedUserError(username)
+
+def _freeze(value):
+    """Make a read-only copy of parsed JSON. Dicts become `MappingProxyType`s and lists become tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value):
+    """Make an editable copy of details from the user registry."""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _missing_user_error(username: str):
     if os.path.isdir(f"home/{username}"):
-        if os.path.isfile(f"home/{username}/user.json"):
-            contents = open(f"home/{username}/user.json", "r")
+        return InvalidUserError(username)
+    return UserDoesntExistError(username)
+
+
+class UserRegistry:
+    def __init__(self) -> None:
+        """Every user's details, read from their `user.json` once and kept until the file changes.
+        
+        A cached user is checked with a single `stat` of their `user.json`, so it is only read and
+        parsed again if its mtime or size has changed. The details are handed out as read-only views.
+        """
+        
+        # Username -> (mtime, size, details)
+        self.__users: dict[str, tuple[int, int, MappingProxyType]] = {}
+        self.__lock = threading.Lock()
+        
+    def lookup(self, username: str, stat_result: os.stat_result) -> MappingProxyType | None:
+        """Get a user's cached details if they're still up to date with their `user.json`."""
+        with self.__lock:
+            cached = self.__users.get(username)
+        
+        if cached is not None and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+            return cached[2]
+        return None
+    
+    def store(self, username: str, stat_result: os.stat_result, details: dict) -> MappingProxyType:
+        view = _freeze(details)
+        
+        with self.__lock:
+            self.__users[username] = (stat_result.st_mtime_ns, stat_result.st_size, view)
+        return view
+        
+    def update(self, username: str, details: dict) -> MappingProxyType:
+        """Replace a user's cached details before they are written to their `user.json`."""
+        view = _freeze(details)
+        
+        with self.__lock:
+            cached = self.__users.get(username)
+            if cached is not None:
+                self.__users[username] = (cached[0], cached[1], view)
+        return view
+        
+    def get(self, username: str) -> MappingProxyType:
+        """Get a user's details.
+
+        Raises:
+            UserDoesntExistError: Raised if the user doesn't exist.
+            InvalidUserError: Raised if the user has no `user.json`.
+            CorruptedUserError: Raised if the user's `user.json` isn't valid JSON.
+
+        Returns:
+            MappingProxyType: A read-only view of the user's details. Change them with `change_user`.
+        """
+        
+        path = f"home/{username}/user.json"
+        
+        try:
+            stat_result = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            self.invalidate(username)
+            raise _missing_user_error(username)
+        
+        details = self.lookup(username, stat_result)
+        if details is not None:
+            return details
+        
+        with open(path, "r") as f:
+            return self.store(username, stat_result, _parse_user_details(username, f.read()))
+        
+    def invalidate(self, username: str | None = None):
+        """Forget a user's cached details, or everyone's."""
+        with self.__lock:
+            if username is None:
+                self.__users.clear()
+            else:
+                self.__users.pop(username, None)
+
+_registry = UserRegistry()
+
+
+class SettingsWriter:
+    def __init__(self, delay: float = WRITE_DELAY) -> None:
+        """Writes changes to users' details in the background.
+        
+        Changes made within `delay` seconds of each other are written together, and each write
+        replaces the whole `user.json` atomically, so a crash can never leave half a file.
+        The user registry and database are updated straight away, so the changes can be read before they are written.
+
+        Args:
+            delay (float, optional): How many seconds changes are held for. Defaults to WRITE_DELAY.
+        """
+        
+        self.delay = delay
+        
+        self.__pending: dict[str, dict] = {}
+        self.__timers: dict[str, threading.Timer] = {}
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock() # Only one write of a user.json happens at a time
+        
+    def queue(self, username: str, details: dict):
+        """Write a user's new details soon.
+
+        Args:
+            username (str): The user.
+            details (dict): All of the user's details, including the changes.
+        """
+        
+        _registry.update(username, details)
+        
+        if _user_db is not None: # So listing users sees the change before it's written
+            _user_db.update(username, details)
+        
+        with self.__lock:
+            self.__pending[username] = details
             
-            try:
-                details = json.loads(contents.read())
-            except json.JSONDecodeError:
-                raise CorruptedUserError(username)
+            if username not in self.__timers:
+                timer = threading.Timer(self.delay, self.flush, (username,))
+                timer.daemon = True
+                self.__timers[username] = timer
+                timer.start()
+    
+    def has_pending(self, username: str | None = None) -> bool:
+        with self.__lock:
+            return bool(self.__pending) if username is None else username in self.__pending
                 
-            contents.close()
-            
-            return details
-        else:
-            raise InvalidUserError(username)
-    else:
-        raise UserDoesntExistError(username)
+    def flush(self, username: str | None = None):
+        """Write changes that are waiting to be written now.
+
+        Args:
+            username (str | None, optional): Only write this user's changes. Defaults to everyone's.
+        """
+        
+        with self.__lock:
+            usernames = list(self.__pending) if username is None else [username]
+        
+        for username in usernames:
+            with self.__write_lock:
+                with self.__lock:
+                    details = self.__pending.pop(username, None)
+                    timer = self.__timers.pop(username, None)
+                    
+                if timer is not None:
+                    timer.cancel()
+                if details is None: # Someone else already wrote it
+                    continue
+                
+                path = f"home/{username}/user.json"
+                fs.write_atomic_sync(path, json.dumps(details, indent=4))
+                
+                stat_result = os.stat(path)
+                
+                with self.__lock:
+                    # If there were more changes while we were writing, keep them in the registry
+                    _registry.store(username, stat_result, self.__pending.get(username, details))
+                    
+                if _user_db is not None:
+                    _user_db.update(username, details, stat_result)
+
+_writer = SettingsWriter()
+
+# Changes that haven't been written yet are written when SwiftOS exits
+atexit.register(_writer.flush)
+
+
+def flush(username: str | None = None):
+    """Write changes to users' details that are waiting to be written. See `SettingsWriter`.
+
+    Args:
+        username (str | None, optional): Only write this user's changes. Defaults to everyone's.
+    """
+    
+    _writer.flush(username)
+
+async def flush_async(username: str | None = None):
+    """The same as `flush`, but writes without blocking the event loop."""
+    await run_blocking(_writer.flush, username, lane=Lane.IO, priority=JobPriority.HIGH, name="flush-users")
+
+
+_user_db: UserDatabase | None = None
+
+
+def set_user_database(user_db: UserDatabase | None):
+    """Use a user database to find and list users, instead of listing `home`. This is done by the boot process.
+
+    Args:
+        user_db (UserDatabase | None): The user database, or `None` to stop using one.
+    """
+    
+    global _user_db
+    _user_db = user_db
+
+def get_user_database() -> UserDatabase | None:
+    return _user_db
+
+def get_user_registry() -> UserRegistry:
+    return _registry
+
+def get_user_details(username: str):
+    return _registry.get(username)
 
 # TODO: Make an actual way to check if a user is valid
 def is_user_valid(username: str):
@@ -72,6 +309,9 @@ def is_user_valid(username: str):
     return False
 
 def get_valid_users():
+    if _user_db is not None:
+        return _user_db.page(ready=True)
+    
     users = os.listdir("home")
     actual_users = []
     
@@ -82,6 +322,9 @@ def get_valid_users():
     return actual_users
 
 def get_users():
+    if _user_db is not None:
+        return _user_db.page()
+    
     users = os.listdir("home")
     actual_users = []
     
@@ -91,9 +334,66 @@ def get_users():
     return actual_users
 
 def user_exists(username: str):
+    if _user_db is not None:
+        return _user_db.exists(username)
+    
     return username in get_users()
 
+def count_users(ready: bool | None = None) -> int:
+    """Count the users on the system.
+
+    Args:
+        ready (bool | None, optional): Only count users who have (or haven't) finished setting up their account.
+
+    Returns:
+        int: How many users there are.
+    """
+    
+    if _user_db is not None:
+        return _user_db.count(ready)
+    
+    users = get_users() if ready is None else get_valid_users()
+    if ready is False:
+        return len(get_users()) - len(users)
+    return len(users)
+
+def get_users_page(offset: int, limit: int, ready: bool | None = None) -> list[str]:
+    """Get some of the users on the system, in alphabetical order. Used to show long lists of users a page at a time.
+
+    Args:
+        offset (int): How many users to skip.
+        limit (int): The most users to return.
+        ready (bool | None, optional): Only include users who have (or haven't) finished setting up their account.
+
+    Returns:
+        list[str]: The users' names.
+    """
+    
+    if _user_db is not None:
+        return _user_db.page(offset, limit, ready)
+    
+    if ready is None:
+        users = get_users()
+    elif ready:
+        users = get_valid_users()
+    else:
+        users = [user for user in get_users() if not is_user_valid(user)]
+    
+    return sorted(users)[offset:offset + limit]
+
 def create_user(username: str, password: str, admin: bool = False, background: str = "", theme: str = ""):
+    created = _create_user(username, auth.hash_password(password), admin, background, theme)
+    _notify_changed(username)
+    return created
+
+async def create_user_async(username: str, password: str, admin: bool = False, background: str = "", theme: str = ""):
+    """The same as `create_user`, but hashes the password and creates the user's files without blocking the event loop."""
+    password_hash = await auth.hash_password_async(password)
+    created = await run_blocking(_create_user, username, password_hash, admin, background, theme, lane=Lane.IO, name="create-user")
+    _notify_changed(username)
+    return created
+
+def _create_user(username: str, password_hash: str, admin: bool, background: str, theme: str):
     if os.path.isdir(f"home/{username}"):
         raise UserAlreadyExistsError(username)
     
@@ -104,7 +404,7 @@ def create_user(username: str, password: str, admin: bool = False, background: s
     user_json = open(f"home/{username}/user.json", "x")
     json.dump(
         {
-            "password_hash": sha256(password.encode()).hexdigest(),
+            "password_hash": password_hash,
             "isAdmin": admin,
             
             "desktop_background": background,
@@ -135,12 +435,9 @@ def create_user(username: str, password: str, admin: bool = False, background: s
     
     return True
     
-def change_user(username: str, password: str | None = None, admin: bool | None = None, background: str | None = None, theme: str | None = None, ready: bool | None = None):
-    user_details = get_user_details(username)
-    
-    if password != None:
-        hashed_password = sha256(password.encode()).hexdigest()
-        user_details["password_hash"] = hashed_password
+def _apply_user_changes(user_details: dict, password_hash: str | None = None, admin: bool | None = None, background: str | None = None, theme: str | None = None, ready: bool | None = None):
+    if password_hash != None:
+        user_details["password_hash"] = password_hash
     if admin != None:
         user_details["isAdmin"] = admin
     if background != None:
@@ -149,11 +446,43 @@ def change_user(username: str, password: str | None = None, admin: bool | None =
         user_details["theme"] = theme
     if ready != None:
         user_details["ready"] = ready
+        
+    return user_details
+    
+def change_user(username: str, password: str | None = None, admin: bool | None = None, background: str | None = None, theme: str | None = None, ready: bool | None = None):
+    password_hash = auth.hash_password(password) if password is not None else None
+    
+    user_details = _thaw(get_user_details(username))
+    _apply_user_changes(user_details, password_hash, admin, background, theme, ready)
+
+    # Written in the background, along with any other changes made soon after this one
+    _writer.queue(username, user_details)
+    _notify_changed(username)
+
+async def get_user_details_async(username: str):
+    """The same as `get_user_details`, but reads the user's details without blocking the event loop."""
+    path = f"home/{username}/user.json"
+    
+    try:
+        stat_result = await fs.stat(path)
+        
+        details = _registry.lookup(username, stat_result)
+        if details is not None:
+            return details
+        
+        contents = await fs.read_text(path)
+    except (FileNotFoundError, NotADirectoryError):
+        _registry.invalidate(username)
+        raise _missing_user_error(username)
+    
+    return _registry.store(username, stat_result, _parse_user_details(username, contents))
 
-    contents = json.dumps(user_details, indent=4)
+async def change_user_async(username: str, password: str | None = None, admin: bool | None = None, background: str | None = None, theme: str | None = None, ready: bool | None = None):
+    """The same as `change_user`, but reads the user's details and hashes the password without blocking the event loop."""
+    password_hash = await auth.hash_password_async(password) if password is not None else None
     
-    json_file = open(f"home/{username}/user.json", "w")
-    json_file.write(contents)
-    json_file.close()
+    user_details = _thaw(await get_user_details_async(username))
+    _apply_user_changes(user_details, password_hash, admin, background, theme, ready)
     
-    
\ No newline at end of file
+    _writer.queue(username, user_details)
+    _notify_changed(username)
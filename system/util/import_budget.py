@@ -0,0 +1,118 @@
+"""
+Checks how long SwiftOS takes to import, using `python -X importtime`.
+
+Run it from anywhere with `python -m system.util.import_budget` (or `python system/util/import_budget.py`).
+It exits with 1 if importing takes longer than the budget, so it can be ran before a release.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Milliseconds, on top of what Python imports just to start. Everything before the boot log
+# is on screen counts against the first budget, and everything until boot starts against the second.
+# Both are well over what the fastest run takes now (about 170 and 230 ms), so only a real regression goes over.
+FIRST_PIXEL_BUDGET = 300
+BOOT_BUDGET = 400
+
+FIRST_PIXEL_IMPORTS = "import main"
+BOOT_IMPORTS = "import main, system.boot"
+
+
+def measure(code: str) -> dict[str, tuple[int, int, int]]:
+    """Run code in a new Python, and find how long each module it imported took.
+
+    Args:
+        code (str): The code to run, e.g. "import main".
+
+    Raises:
+        RuntimeError: Raised if the code fails.
+
+    Returns:
+        dict[str, tuple[int, int, int]]: The microseconds each module took on its own, the microseconds with everything it imported,
+            and how deep the import was (0 if it wasn't imported by another module), keyed by the module's name.
+    """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"`{code}` failed:\n{result.stderr}")
+
+    modules = {}
+
+    # Each line looks like "import time:  self [us] | cumulative | imported package", indented by how deep the import is
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+
+        if not self_us.strip().isdigit(): # The header
+            continue
+
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+
+    return modules
+
+def measure_total(code: str) -> int:
+    """Find how many microseconds the imports of some code took in total."""
+    return sum(cumulative_us for _, cumulative_us, depth in measure(code).values() if depth == 0)
+
+def measure_fastest(code: str, runs: int, warm_up: int) -> float:
+    """Find the fewest milliseconds the imports of some code took, on top of Python starting up.
+
+    The fastest run is used rather than the average, since the computer being busy can only make a run slower.
+    """
+
+    for _ in range(warm_up): # So the files are in the disk cache, and the first runs aren't slower than the rest
+        measure_total("pass")
+        measure_total(code)
+
+    baseline = min(measure_total("pass") for _ in range(runs))
+    total = min(measure_total(code) for _ in range(runs))
+
+    return (total - baseline) / 1000
+
+def format_slowest(code: str, count: int) -> str:
+    """List the modules that took the longest to import on their own."""
+    modules = measure(code)
+    baseline = measure("pass")
+
+    slowest = sorted(
+        ((name, self_us) for name, (self_us, _, _) in modules.items() if name not in baseline),
+        key=lambda module: module[1],
+        reverse=True
+    )[:count]
+
+    return "\n".join(f"  {self_us / 1000:>8.2f} ms  {name}" for name, self_us in slowest)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that importing SwiftOS stays within budget.")
+    parser.add_argument("--first-pixel-budget", type=float, default=FIRST_PIXEL_BUDGET, help="The most milliseconds importing can take before the boot log shows.")
+    parser.add_argument("--boot-budget", type=float, default=BOOT_BUDGET, help="The most milliseconds importing can take before boot starts.")
+    parser.add_argument("--runs", type=int, default=7, help="How many times to measure, the fastest is used.")
+    parser.add_argument("--warm-up", type=int, default=2, help="How many runs to do before measuring.")
+    parser.add_argument("--slowest", type=int, default=15, help="How many of the slowest modules to list when over budget.")
+    args = parser.parse_args()
+
+    over_budget = False
+
+    for label, code, budget in (("First pixel", FIRST_PIXEL_IMPORTS, args.first_pixel_budget), ("Boot", BOOT_IMPORTS, args.boot_budget)):
+        taken = measure_fastest(code, args.runs, args.warm_up)
+        within = taken <= budget
+
+        print(f"{label}: {taken:.2f} ms of {budget:.2f} ms ({'OK' if within else 'OVER BUDGET'})")
+
+        if not within:
+            over_budget = True
+            print(f"Slowest imports of `{code}`:\n{format_slowest(code, args.slowest)}")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
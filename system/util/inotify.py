@@ -0,0 +1,170 @@
+import os
+import ctypes
+import ctypes.util
+import struct
+import errno
+
+
+# Event masks, see `man 7 inotify`
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Everything that changes what's inside of a directory
+IN_DIR_CHANGES = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+    return _libc
+
+def is_available() -> bool:
+    """Check if inotify can be used on this system.
+
+    Returns:
+        bool: Whether inotify is available.
+    """
+
+    try:
+        return hasattr(_get_libc(), "inotify_init1")
+    except (OSError, TypeError):
+        return False
+
+
+class InotifyEvent:
+    def __init__(self, wd: int, mask: int, cookie: int, name: str) -> None:
+        """An event read from an inotify instance.
+
+        Args:
+            wd (int): The watch the event is for.
+            mask (int): What happened, see the `IN_*` constants.
+            cookie (int): Connects `IN_MOVED_FROM` and `IN_MOVED_TO` events of the same rename.
+            name (str): The name of the file inside the watched directory, or "" if the event is for the directory itself.
+        """
+
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.name = name
+
+    def __str__(self) -> str:
+        return f"(WD={self.wd}, MASK={hex(self.mask)}, NAME={self.name})"
+
+
+class Inotify:
+    def __init__(self) -> None:
+        """A non-blocking inotify instance.
+
+        Raises:
+            OSError: Raised if inotify isn't available.
+        """
+
+        libc = _get_libc()
+
+        self.__fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        self.watches: dict[int, str] = {}
+
+    def fileno(self) -> int:
+        """Get the file descriptor, which becomes readable when there are events to read."""
+        return self.__fd
+
+    def add_watch(self, path: str, mask: int = IN_DIR_CHANGES) -> int:
+        """Start watching a file or directory.
+
+        Args:
+            path (str): The path to watch.
+            mask (int, optional): The events to watch for. Defaults to IN_DIR_CHANGES.
+
+        Raises:
+            OSError: Raised if the path can't be watched, e.g. it doesn't exist or there are too many watches.
+
+        Returns:
+            int: The watch descriptor, used to tell which path an event is for.
+        """
+
+        wd = _get_libc().inotify_add_watch(self.__fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+
+        self.watches[wd] = path
+        return wd
+
+    def remove_watch(self, wd: int):
+        """Stop watching a path.
+
+        Args:
+            wd (int): The watch descriptor returned by `add_watch`.
+        """
+
+        if self.watches.pop(wd, None) is not None:
+            _get_libc().inotify_rm_watch(self.__fd, wd)
+
+    def read_events(self) -> list[InotifyEvent]:
+        """Read every event that is waiting to be read, without blocking.
+
+        Returns:
+            list[InotifyEvent]: The events.
+        """
+
+        events = []
+
+        while True:
+            try:
+                data = os.read(self.__fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_IGNORED: # The watch was removed
+                    self.watches.pop(wd, None)
+
+                events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+            self.watches.clear()
@@ -0,0 +1,47 @@
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str) -> None:
+        """A stand-in for a module that imports it the first time one of its attributes is used. Made by `lazy_import`.
+
+        Args:
+            name (str): The full name of the module, e.g. "system.gui.setup_screen".
+        """
+
+        super().__init__(name)
+
+    def __getattr__(self, attr: str):
+        # Only called for attributes the stand-in doesn't have yet. Importing is thread-safe,
+        # so it doesn't matter which thread uses the module first.
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__name__}'>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Import a module the first time it's used rather than straight away, so it doesn't slow down starting up.
+
+    Use it instead of `import` for modules that are big to import and not always needed, e.g.
+    `setup_screen = lazy_import("system.gui.setup_screen")`. Names can't be imported from it with `from .. import ..`,
+    use them through the module instead.
+
+    Args:
+        name (str): The full name of the module.
+
+    Returns:
+        ModuleType: The module if it has already been imported, otherwise a stand-in for it.
+    """
+
+    module = sys.modules.get(name)
+
+    if module is not None:
+        return module
+
+    return LazyModule(name)
@@ -0,0 +1,45 @@
+import os
+
+
+# Sorts after every other character, so `prefix + MAX_CHAR` is the end of the range of strings starting with `prefix`
+MAX_CHAR = "\U0010ffff"
+
+
+def normalize(path: str) -> str:
+    """Get the absolute path, without any `..` or doubled separators, that paths are stored as in the system's indexes."""
+    return os.path.normpath(os.path.abspath(path))
+
+def dir_prefix(dir: str) -> str:
+    """Get the prefix shared by the paths of everything inside a directory."""
+    return dir if dir.endswith(os.sep) else dir + os.sep
+
+def is_inside(path: str, dir: str) -> bool:
+    """Check if a path is a directory, or is inside it. Both should be normalized."""
+    return path == dir or path.startswith(dir_prefix(dir))
+
+def starts_with(column: str, prefix: str) -> tuple[str, list]:
+    """Get an SQL condition matching values of a column that start with a prefix. It's a range lookup, so it can use the column's index, unlike LIKE.
+
+    Args:
+        column (str): The column.
+        prefix (str): The prefix.
+
+    Returns:
+        tuple[str, list]: The condition and its parameters.
+    """
+
+    return f"({column} >= ? AND {column} < ?)", [prefix, prefix + MAX_CHAR]
+
+def inside(column: str, dir: str) -> tuple[str, list]:
+    """Get an SQL condition matching paths that are a directory, or are inside it. See `starts_with`.
+
+    Args:
+        column (str): The column of paths.
+        dir (str): The directory, normalized.
+
+    Returns:
+        tuple[str, list]: The condition and its parameters.
+    """
+
+    condition, params = starts_with(column, dir_prefix(dir))
+    return f"({column} = ? OR {condition})", [dir] + params
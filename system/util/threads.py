@@ -0,0 +1,10 @@
+import os
+import threading
+
+
+def lower_thread_priority():
+    """Give the calling thread the lowest priority, for background work that shouldn't slow down the desktop."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19) # On Linux this only affects the calling thread
+    except (AttributeError, OSError):
+        pass